@@ -1,48 +1,114 @@
-from flask import Flask, request, render_template, session, redirect, flash, jsonify
+from flask import Flask, Response, request, render_template, session, redirect, flash, jsonify, stream_with_context
 from flask_session import Session
 import os
-import numpy as np
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-from src.utils import *
-from src.llm_service import chat as llm_chat
-from src.health_context import build_health_context
-from werkzeug.security import check_password_hash, generate_password_hash
-import sqlite3
+import threading
+from src.utils import AppAuthenticator, auth_required, is_finalized, login_required, retrieve_data
+from src.warehouse import Warehouse
+from src.prefetch import PrefetchScheduler
+from src.figures import IMMUTABLE_CACHE_CONTROL, PLOTLY_JS, encode_series, install_plotly_js
+from src.fitbit_client import FitbitAuthError, FitbitError, FitbitRateLimitError
+from src.sessions import SESSION_BACKEND, make_session_interface
+from src.chat_store import CHAT_PAGE_SIZE, MAX_PAGE_SIZE, ChatStore
+from src.goals import Goals, get_goal_store
+from src.passwords import PasswordPoolBusy, hash_password, needs_rehash, verify_password
+import requests
 import urllib.parse
 import datetime
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
+from src.db import make_engine
+from src.cache import LRUCache
+import json
 
 app = Flask(__name__)
 
-# Configure session to use filesystem (instead of signed cookies)
+# Sessions are kept on the server (instead of signed cookies), see src/sessions.py
 app.config["SESSION_PERMANENT"] = False
-app.config["SESSION_TYPE"] = "filesystem"
-Session(app)
 
 DB_PATH = os.environ.get('DB_PATH', 'sqlite:///data/users.db')
 TODAY_DATE = datetime.date.today()
 WARNING = "WARNING: You are not connected to Fitbit. Data shown is sample data."
 
-# Database
-engine = create_engine(DB_PATH)
-# create tables if they don't exist
-with engine.connect() as con:
-    con.execute(text("""
-                     CREATE TABLE IF NOT EXISTS users(
-                        username TEXT NOT NULL UNIQUE, 
-                        hash TEXT NOT NULL,
-                        has_fitbit BOOL NOT NULL)
-                     """))
-    con.execute(text("""
-                     CREATE TABLE IF NOT EXISTS profile(
-                        username TEXT NOT NULL UNIQUE, 
-                        step_goal TEXT NOT NULL,
-                        sleep_goal TEXT NOT NULL,
-                        FOREIGN KEY(username) REFERENCES users(username))
-                     """))
-    con.commit()
+# Database (SQLite in WAL mode, or pooled Postgres, see src/db.py)
+engine = make_engine(DB_PATH)
+
+def create_user_tables():
+    """Create the users and profile tables if they don't exist."""
+    with engine.connect() as con:
+        con.execute(text("""
+                         CREATE TABLE IF NOT EXISTS users(
+                            username TEXT NOT NULL UNIQUE, 
+                            hash TEXT NOT NULL,
+                            has_fitbit BOOL NOT NULL)
+                         """))
+        con.execute(text("""
+                         CREATE TABLE IF NOT EXISTS profile(
+                            username TEXT NOT NULL UNIQUE, 
+                            step_goal TEXT NOT NULL,
+                            sleep_goal TEXT NOT NULL,
+                            FOREIGN KEY(username) REFERENCES users(username))
+                         """))
+        con.commit()
+
+# Goals, read from the profile table once per user and kept in memory;
+# set up by init_app
+goal_store = None
+
+# Chat history, kept out of the session so page views don't carry it
+chat_store = ChatStore(engine)
+
+# Fitbit data of connected users, synced incrementally from the API
+warehouse = Warehouse(engine)
+
+# Keep today's data warm for users who were active recently
+prefetcher = PrefetchScheduler(warehouse)
+
+# numpy, pandas and langchain take seconds to import and pages such as /login
+# need none of them, so they are imported by the code paths that use them
+
+def demo_tables():
+    """The process-wide store of demo Fitbit data, indexed by (Id, timestamp)."""
+    from src.demo_store import get_demo_store
+    return get_demo_store(engine, DB_PATH)
+
+def preload_demo_tables():
+    from src.demo_store import DEMO_DIR
+    if DB_PATH.startswith('sqlite') and os.path.isdir(DEMO_DIR):
+        demo_tables().preload()
+
+def init_app():
+    """Set up sessions and goals, write plotly.js, create the tables and start the background threads."""
+    global goal_store
+    if SESSION_BACKEND == 'filesystem':
+        app.config["SESSION_TYPE"] = "filesystem"
+        Session(app)
+    else:
+        app.session_interface = make_session_interface(SESSION_BACKEND, engine)
+    # plotly.js is served once as a versioned static file rather than inlined in every figure
+    install_plotly_js(app.static_folder)
+    create_user_tables()
+    goal_store = get_goal_store(engine)
+    chat_store.create_table()
+    warehouse.create_tables()
+    prefetcher.start()
+    # Load the demo data in the background so worker boot does not wait for it
+    if os.environ.get('DEMO_PRELOAD', '1') != '0':
+        threading.Thread(target=preload_demo_tables, name='demo-preload', daemon=True).start()
+
+# The password hashing processes (src/passwords.py) use the spawn start method,
+# so under `python app.py` each one re-runs this file as __mp_main__. They only
+# hash passwords: everything above is free of I/O, and init_app is skipped
+if __name__ != '__mp_main__':
+    init_app()
+
+# Chart data of dashboard views that can no longer change (every demo date,
+# and Fitbit dates once finalized), so paging through past days skips pandas
+chart_cache = LRUCache(max_bytes=int(os.environ.get('CHART_CACHE_MAX_BYTES', 32 * 1024 * 1024)))
+
+# A day of heart rate is thinned to this many points before it is sent to the
+# browser (see src/downsample.py); ?downsample= and ?points= override per view
+HEART_DOWNSAMPLE = os.environ.get('HEART_DOWNSAMPLE', 'lttb')
+HEART_CHART_POINTS = int(os.environ.get('HEART_CHART_POINTS', 1000))
+MIN_CHART_POINTS, MAX_CHART_POINTS = 10, 20000
 
 # day_steps = pd.read_csv('data/fitbit_apr/hourlySteps_merged.csv')
 # day_steps.to_sql('day_steps', engine, index=False)
@@ -51,14 +117,233 @@ with engine.connect() as con:
 # daily_sleep = pd.read_csv('data/fitbit_apr/sleepDay_merged.csv')
 # daily_sleep.to_sql('daily_sleep', engine, index=False)
 # heart_data = pd.read_csv('data/fitbit_apr/heartrate_seconds_merged.csv')
-# heart_data = heart_data.iloc[:5000]
 # heart_data.to_sql('heart_data', engine, index=False)
 
 
-@app.route("/")
-@login_required
-@auth_required
-def steps():
+@app.before_request
+def track_active_fitbit_user():
+    """Register connected users with the prefetcher."""
+    fitbit_id = session.get('fitbit_id')
+    if fitbit_id and fitbit_id != 'no_fitbit' and session.get('access_token'):
+        prefetcher.touch(fitbit_id, session['access_token'])
+
+@app.context_processor
+def inject_plotly_js():
+    return {'plotly_js': PLOTLY_JS}
+
+@app.after_request
+def cache_versioned_assets(response):
+    """Versioned vendor files never change, so browsers may keep them for a year."""
+    if request.path.startswith('/static/vendor/'):
+        response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    return response
+
+@app.errorhandler(FitbitAuthError)
+def fitbit_auth_error(e):
+    """Token expired or a scope was not granted: re-authenticate."""
+    return redirect('/authenticate')
+
+@app.errorhandler(FitbitError)
+def fitbit_error(e):
+    """Fitbit is rate limiting us or is unavailable."""
+    if isinstance(e, FitbitRateLimitError):
+        return 'Error: Fitbit rate limit reached, please try again later', 429
+    return 'Error: Fitbit is unavailable, please try again later', 503
+
+def cached_charts(key, immutable, build):
+    """Chart data for a view, built once per key if the view can no longer change.
+
+    Goals are not part of the key: goal status is computed per request and the
+    goal line is drawn in the browser, so editing a goal needs no invalidation.
+    """
+    if not immutable:
+        return build()
+    charts = chart_cache.get(key)
+    if charts is None:
+        charts = build()
+        chart_cache.set(key, charts, size=len(json.dumps(charts)))
+    return charts
+
+def synced_charts(fitbit_id, access_token, key, immutable, windows, chart_windows, build):
+    """Sync `windows`, and `chart_windows` unless the view's charts are cached, in one call.
+
+    Everything a page needs from Fitbit is fetched concurrently, so a cache
+    miss costs one round trip, not one for the page and one for its charts.
+    build() then reads the charts from the warehouse.
+    """
+    charts = chart_cache.get(key) if immutable else None
+    warehouse.sync(fitbit_id, access_token, windows + (chart_windows if charts is None else []))
+    if charts is None:
+        charts = cached_charts(key, immutable, build)
+    return charts
+
+def demo_steps_charts(date):
+    """The demo user's total, hourly and weekly steps for a date."""
+    hourly_table = demo_tables().table('hourly_steps')
+    user_id = hourly_table.first_id
+    next_date = date + datetime.timedelta(days=1)
+    hourly_steps = hourly_table.between(user_id, date, next_date)
+    hourly_steps = hourly_steps.rename(columns={'ActivityHour': 'Hour', 'StepTotal': 'Steps'})
+
+    daily_table = demo_tables().table('daily_steps')
+
+    # compute total steps for the chosen date
+    day_total = daily_table.between(user_id, date, next_date)['StepTotal']
+    total_steps = int(day_total.values[0]) if len(day_total) > 0 else 0
+
+    # filter week steps (7 days ending on chosen date)
+    week_start = date - datetime.timedelta(days=6)
+    week_steps = daily_table.between(user_id, week_start, next_date)
+    week_steps = week_steps.rename(columns={'ActivityDay': 'Date', 'StepTotal': 'Steps'})
+    return {'total': total_steps,
+            'hourly': encode_series(hourly_steps['Hour'], hourly_steps['Steps']),
+            'week': encode_series(week_steps['Date'], week_steps['Steps'])}
+
+def fitbit_steps_windows(date):
+    """Warehouse windows of the steps charts: the date by minute and the week ending on it."""
+    import pandas as pd
+    week_start = pd.Timestamp(date).date() - datetime.timedelta(days=6)
+    return [('steps', week_start, date), ('steps-intraday', date, date)]
+
+def fitbit_steps_charts(fitbit_id, date):
+    """A connected user's hourly steps on a date and daily steps for the week ending on it."""
+    import pandas as pd
+    week_start = pd.Timestamp(date).date() - datetime.timedelta(days=6)
+
+    # get steps by hour
+    day_steps = warehouse.intraday(fitbit_id, 'steps', date)
+    day_steps.time = pd.to_datetime(str(date) + ' ' + day_steps.time)
+    hourly_steps = day_steps.groupby(pd.Grouper(key='time', freq='h')).sum().reset_index()
+    hourly_steps = hourly_steps.rename(columns={'time': 'Hour', 'value': 'Steps'})
+
+    # get week's steps
+    week_steps = warehouse.daily_steps(fitbit_id, week_start, date)
+    return {'hourly': encode_series(hourly_steps['Hour'], hourly_steps['Steps']),
+            'week': encode_series(week_steps['Date'], week_steps['Steps'])}
+
+def demo_sleep_charts(date):
+    """The demo user's hours slept on a date and minutes asleep for the week before it."""
+    import numpy as np
+    import pandas as pd
+    sleep_table = demo_tables().table('daily_sleep')
+    user_id = sleep_table.first_id
+    next_date = date + pd.Timedelta('1 day')
+
+    # compute hours slept on the chosen date
+    day_sleep = sleep_table.between(user_id, date, next_date)['TotalMinutesAsleep']
+    hours_slept = np.round(day_sleep.values[0] / 60, 2) if len(day_sleep) > 0 else 0
+
+    # filter week sleep (7 days ending on chosen date)
+    week_start = date - pd.Timedelta('7 days')
+    week_sleep = sleep_table.between(user_id, week_start, next_date)
+    return {'hours_slept': float(hours_slept),
+            'week': encode_series(week_sleep['SleepDay'], week_sleep['TotalMinutesAsleep'])}
+
+def fitbit_sleep_windows(date):
+    """Warehouse window of the sleep chart: the week ending on the date."""
+    import pandas as pd
+    return [('sleep', date - pd.Timedelta('7 days'), date)]
+
+def fitbit_sleep_charts(fitbit_id, date):
+    """A connected user's minutes asleep for each night of the week ending on a date."""
+    import pandas as pd
+    start_date = date - pd.Timedelta('7 days')
+
+    # total the week by night
+    minutes_asleep = dict(warehouse.sleep_minutes(fitbit_id, start_date, date).values.tolist())
+    week_sleep = pd.DataFrame([{'Date': day.date(), 'Total Minutes Asleep': minutes_asleep.get(str(day.date()), 0)}
+                               for day in pd.date_range(start_date, date)])
+    return {'week': encode_series(week_sleep['Date'], week_sleep['Total Minutes Asleep'])}
+
+def demo_heart_rate_charts(date):
+    """The demo user's heart rate on a date (the demo data has no resting heart rate)."""
+    heart_table = demo_tables().table('heart')
+    user_id = heart_table.first_id
+    day_heart = heart_table.day(user_id, date)
+    return {'day': encode_series(day_heart['Time'], day_heart['Value']),
+            'week': None}
+
+def fitbit_heart_rate_charts(fitbit_id, access_token, date):
+    """A connected user's heart rate on a date and resting heart rate for the week ending on it."""
+    import pandas as pd
+    # sync the chosen date by minute and the week ending on it
+    week_start = pd.Timestamp(date).date() - datetime.timedelta(days=6)
+    warehouse.sync(fitbit_id, access_token, [('heart-intraday', date, date),
+                                             ('heart', week_start, date)])
+    day_heart = warehouse.intraday(fitbit_id, 'heart', date)
+
+    # if no data
+    if len(day_heart) == 0:
+        day_heart['time'] = date
+        day_heart['value'] = 0
+    day_heart.time = pd.to_datetime(str(date) + ' ' + day_heart.time)
+
+    # get week's resting heart rate, 0 if none was recorded
+    resting = dict(warehouse.resting_hr(fitbit_id, week_start, date).values.tolist())
+    week_heart = []
+    for day in pd.date_range(week_start, pd.Timestamp(date)):
+        resting_hr = resting.get(str(day.date()))
+        resting_hr = 0 if pd.isna(resting_hr) else int(resting_hr)
+        week_heart.append({'Date': str(day.date()), 'Resting HR': resting_hr})
+    week_heart = pd.DataFrame(week_heart)
+    return {'day': encode_series(day_heart['time'], day_heart['value']),
+            'week': encode_series(week_heart['Date'], week_heart['Resting HR'])}
+
+def heart_downsampling():
+    """(method, points) for the heart-rate day chart from the query string, or the defaults."""
+    from src.downsample import METHODS
+    method = request.args.get('downsample', HEART_DOWNSAMPLE)
+    if method not in METHODS:
+        method = HEART_DOWNSAMPLE
+    points = request.args.get('points', HEART_CHART_POINTS, type=int)
+    return method, min(max(points, MIN_CHART_POINTS), MAX_CHART_POINTS)
+
+def downsampled(charts, method, points):
+    """Heart-rate charts with the day series reduced to `points`."""
+    from src.downsample import downsample_series
+    return {**charts, 'day': downsample_series(charts['day'], points, method)}
+
+def anomaly_available():
+    from src.anomaly import AVAILABLE
+    return AVAILABLE
+
+def anomaly_scores(date):
+    """Anomaly scores of the session user's heart rate on a date, computed once per (user, date)."""
+    from src.anomaly import cached_scores
+    fitbit_id = session['fitbit_id']
+    if fitbit_id == 'no_fitbit':
+        def load():
+            heart_table = demo_tables().table('heart')
+            day_heart = heart_table.day(heart_table.first_id, date)
+            return day_heart['Time'], day_heart['Value']
+        key = ('demo', 'anomaly', date, demo_tables().version('heart'))
+        return cached_scores(key, True, load)
+
+    def load():
+        warehouse.sync(fitbit_id, session['access_token'], [('heart-intraday', date, date)])
+        day_heart = warehouse.intraday(fitbit_id, 'heart', date)
+        return str(date) + ' ' + day_heart['time'], day_heart['value']
+    return cached_scores((fitbit_id, 'anomaly', str(date)), is_finalized(date), load)
+
+def anomaly_report(data):
+    """Anomalies above the posted threshold for the heart-rate page, added to its chart data.
+
+    Changing the threshold re-filters the cached scores without running the model.
+    """
+    from src.anomaly import AnomalyUnavailable, parse_threshold
+    thresh = f"{parse_threshold(request.form.get('thresh')):g}"
+    try:
+        scores = anomaly_scores(datetime.date.fromisoformat(data['date']))
+    except AnomalyUnavailable as e:
+        return {'thresh': thresh, 'error': str(e)}
+    anomalies = scores.above(float(thresh))
+    data['anomalies'] = encode_series(anomalies['Time'], anomalies['Recorded HR'])
+    return {'thresh': thresh,
+            'tables': [anomalies.to_html(index=False, classes='data', header='true')]}
+
+def steps_data():
+    """Steps dashboard data for the date in the request's query string."""
+    import pandas as pd
     warning = ''
 
     # get user ID and access token
@@ -73,50 +358,15 @@ def steps():
         except:
             date = datetime.date(2016, 4, 12)
 
-        if DB_PATH.startswith('sqlite'):
-            day_steps = pd.read_csv('data/fitbit_apr/hourlySteps_merged.csv')
-        else: 
-            day_steps = pd.read_sql_table('day_steps', con=engine)
-        day_steps = day_steps.rename(columns={'ActivityHour': 'Hour', 'StepTotal': 'Steps'})
-        day_steps.Hour = pd.to_datetime(day_steps.Hour)
-        user_id = day_steps.Id.unique()[0]
-        next_date = date + datetime.timedelta(days=1)
-        hourly_steps = day_steps.loc[
-            (day_steps.Id == user_id) &
-            (day_steps.Hour >= str(date)) &
-            (day_steps.Hour < str(next_date))
-        ]
-
-        if DB_PATH.startswith('sqlite'):
-            daily_steps = pd.read_csv('data/fitbit_apr/dailySteps_merged.csv')
-        else:
-            daily_steps = pd.read_sql_table('daily_steps', con=engine)
-        daily_steps = daily_steps.rename(columns={'ActivityDay': 'Date', 'StepTotal': 'Steps'})
-        daily_steps.Date = pd.to_datetime(daily_steps.Date)
-        user_daily = daily_steps.loc[daily_steps.Id == user_id]
-
-        # compute total steps for the chosen date
-        day_total = user_daily.loc[user_daily.Date.dt.date == date, 'Steps']
-        total_steps = int(day_total.values[0]) if len(day_total) > 0 else 0
-
-        # filter week steps (7 days ending on chosen date)
-        week_start = date - datetime.timedelta(days=6)
-        week_steps = user_daily.loc[
-            (user_daily.Date.dt.date >= week_start) &
-            (user_daily.Date.dt.date <= date)
-        ]
+        # demo data never changes, so every date's charts are cached
+        key = ('demo', 'steps', date, demo_tables().version('hourly_steps'), demo_tables().version('daily_steps'))
+        charts = cached_charts(key, True, lambda: demo_steps_charts(date))
+        total_steps = charts['total']
         
     else:
         access_token = session['access_token']
 
-        # retrieve today's data via fitbit API
-        today_json = retrieve_data('steps', fitbit_id, access_token, TODAY_DATE, period='1d')
-        try: 
-            total_steps = today_json['activities-steps'][0]['value']
-        except KeyError:
-            return redirect('/authenticate')
-
-        # retrieve chosen date data via fitbit API
+        # chosen date
         date = request.args.get('date', TODAY_DATE)
         try:
             datetime.datetime.strptime(date, "%Y-%m-%d")
@@ -124,36 +374,23 @@ def steps():
             date = TODAY_DATE
         if pd.Timestamp(date).date() > TODAY_DATE: # if date in the future
             date = TODAY_DATE
-        day_json = retrieve_data('steps', fitbit_id, access_token, date, period='1d', detail='1min')
-
-        # get steps by hour
-        day_steps = pd.DataFrame(day_json['activities-steps-intraday']['dataset'])
-        day_steps.time = pd.to_datetime(str(date) + ' ' + day_steps.time)
-        hourly_steps = day_steps.groupby(pd.Grouper(key='time', freq='h')).sum().reset_index()
-        hourly_steps = hourly_steps.rename(columns={'time': 'Hour', 'value': 'Steps'})
-    
-        # retrieve week data via fitbit API
-        week_json = retrieve_data('steps', fitbit_id, access_token, date, '7d')
 
-        # get week's steps
-        week_steps = pd.DataFrame(week_json['activities-steps'])
-        week_steps['Steps'] = pd.to_numeric(week_steps.value)
-        week_steps = week_steps.rename(columns={'dateTime': 'Date'})
+        # sync today's total with the chosen date by hour and the week ending on it;
+        # the charts are cached once the date is over
+        charts = synced_charts(fitbit_id, access_token, (fitbit_id, 'steps', str(date)), is_finalized(date),
+                               [('steps', TODAY_DATE, TODAY_DATE)], fitbit_steps_windows(date),
+                               lambda: fitbit_steps_charts(fitbit_id, date))
+        today_steps = warehouse.daily_steps(fitbit_id, TODAY_DATE, TODAY_DATE)['Steps']
+        total_steps = int(today_steps.iloc[0]) if len(today_steps) > 0 else 0
 
     # check if target is met
-    with engine.connect() as db:
-        step_goal = db.execute(
-            text("SELECT step_goal FROM profile WHERE username = :username"),
-            {"username": session['user_id']}
-        ).fetchall()
-    step_goal = step_goal[0][0]
-    if step_goal == 'Create one':
+    step_goal = goal_store.get(session['user_id']).step
+    if step_goal is None:
         target = '<p>No goal set. <a href="/profile">Create one!</a></p>'
         step_goal_fmt = ''
         step_goal_status = 'no-goal'
     else:
         step_goal_fmt = '/' + str(step_goal)
-        step_goal = int(step_goal)
         if int(total_steps) >= step_goal:
             target = '<p>Target reached!</p>'
             step_goal_status = 'reached'
@@ -161,34 +398,34 @@ def steps():
             target = '<p>Target not yet reached.</p>'
             step_goal_status = 'not-reached'
 
-    # display steps by hour
-    hourly_fig = px.bar(hourly_steps, x='Hour', y='Steps')
+    # steps by hour, and the week's steps with the goal (drawn by static/charts.js)
+    return {'warning': warning,
+            'date': str(date),
+            'steps': int(total_steps),
+            'step_goal': step_goal_fmt,
+            'step_goal_status': step_goal_status,
+            'target': target,
+            'goal': step_goal,
+            'hourly': charts['hourly'],
+            'week': charts['week']}
 
-    # display week's steps and if target has been met
-    if step_goal == 'Create one':
-        daily_fig = px.bar(week_steps, x='Date', y='Steps')
-    else:
-        week_steps['Target Reached'] = week_steps.Steps > step_goal
-        daily_fig = px.bar(week_steps, x='Date', y='Steps', color='Target Reached', 
-                    color_discrete_map={True: px.colors.qualitative.Plotly[2], 
-                                        False: px.colors.qualitative.Plotly[1]})
-        daily_fig.add_hline(y=step_goal, line_dash="dash")
-        daily_fig.update_layout(showlegend=False)
-    
-    return render_template("steps.html",
-                           warning=warning,
-                           steps=total_steps,
-                           step_goal=step_goal_fmt,
-                           step_goal_status=step_goal_status,
-                           target=target,
-                           date=date,
-                           hourly_fig=hourly_fig.to_html(full_html=False),
-                           daily_fig=daily_fig.to_html(full_html=False))
+@app.route("/")
+@login_required
+@auth_required
+def steps():
+    data = steps_data()
+    return render_template("steps.html", chart=data, **data)
 
-@app.route("/sleep")
+@app.route("/api/steps")
 @login_required
 @auth_required
-def sleep():
+def steps_api():
+    return jsonify(steps_data())
+
+def sleep_data():
+    """Sleep dashboard data for the date in the request's query string."""
+    import numpy as np
+    import pandas as pd
     warning = ''
 
     # get user ID and access token
@@ -203,37 +440,15 @@ def sleep():
         except:
             date = pd.Timestamp('2016-04-17')
 
-        if DB_PATH.startswith('sqlite'):
-            daily_sleep = pd.read_csv('data/fitbit_apr/sleepDay_merged.csv')
-        else:
-            daily_sleep = pd.read_sql_table('daily_sleep', con=engine)
-        daily_sleep = daily_sleep.rename(columns={'SleepDay': 'Date', 'TotalMinutesAsleep': 'Total Minutes Asleep'})
-        daily_sleep.Date = pd.to_datetime(daily_sleep.Date)
-        user_id = daily_sleep.Id.unique()[0]
-        user_sleep = daily_sleep.loc[daily_sleep.Id == user_id]
-
-        # compute hours slept on the chosen date
-        day_sleep = user_sleep.loc[user_sleep.Date.dt.date == date.date(), 'Total Minutes Asleep']
-        hours_slept = np.round(day_sleep.values[0] / 60, 2) if len(day_sleep) > 0 else 0
-
-        # filter week sleep (7 days ending on chosen date)
-        week_start = date - pd.Timedelta('7 days')
-        week_sleep = user_sleep.loc[
-            (user_sleep.Date >= week_start) &
-            (user_sleep.Date <= date)
-        ]
+        # demo data never changes, so every date's charts are cached
+        key = ('demo', 'sleep', date, demo_tables().version('daily_sleep'))
+        charts = cached_charts(key, True, lambda: demo_sleep_charts(date))
+        hours_slept = charts['hours_slept']
         
     else:
         access_token = session['access_token']
 
-        # retrieve today's data via fitbit API
-        today_json = retrieve_data('sleep', fitbit_id, access_token, TODAY_DATE, version=1.2)
-        try: 
-            hours_slept = np.round(today_json['summary']['totalMinutesAsleep'] / 60, 2)
-        except KeyError:
-            return redirect('/authenticate')
-        
-         # retrieve week data via fitbit API
+        # chosen date
         date = request.args.get('date', TODAY_DATE)
         try:
             datetime.datetime.strptime(date, "%Y-%m-%d")
@@ -242,26 +457,23 @@ def sleep():
             date = pd.Timestamp(TODAY_DATE)
         if date.date() > TODAY_DATE: # if in the future
             date = pd.Timestamp(TODAY_DATE)
-        start_date = date - pd.Timedelta('7 days')
-        week_sleep = []
-        for day in pd.date_range(start_date, date):
-            day_json = retrieve_data('sleep', fitbit_id, access_token, day.date(), version=1.2)
-            week_sleep.append({'Date': day.date(), 'Total Minutes Asleep': day_json['summary']['totalMinutesAsleep']})
+
+        # sync today's total with the week ending on the chosen date;
+        # the chart is cached once the date is over
+        charts = synced_charts(fitbit_id, access_token, (fitbit_id, 'sleep', str(date.date())),
+                               is_finalized(date.date()), [('sleep', TODAY_DATE, TODAY_DATE)],
+                               fitbit_sleep_windows(date), lambda: fitbit_sleep_charts(fitbit_id, date))
+        today_sleep = warehouse.sleep_minutes(fitbit_id, TODAY_DATE, TODAY_DATE)['Minutes Asleep']
+        hours_slept = np.round(today_sleep.iloc[0] / 60, 2) if len(today_sleep) > 0 else 0
     
     # check if target is met
-    with engine.connect() as db:
-        sleep_goal = db.execute(text(
-            "SELECT sleep_goal FROM profile WHERE username = :username"), 
-            {"username": session['user_id']}
-        ).fetchall()
-    sleep_goal = sleep_goal[0][0]
-    if sleep_goal == 'Create one':
+    sleep_goal = goal_store.get(session['user_id']).sleep
+    if sleep_goal is None:
         target = '<p>No goal set. <a href="/profile">Create one!</a></p>'
         sleep_goal_fmt = ''
         sleep_goal_status = 'no-goal'
     else:
         sleep_goal_fmt = '/' + str(sleep_goal) + 'h'
-        sleep_goal = float(sleep_goal)
         if hours_slept >= sleep_goal:
             target = '<p>Sleep target reached!</p>'
             sleep_goal_status = 'reached'
@@ -269,32 +481,34 @@ def sleep():
             target = '<p>Sleep target not reached.</p>'
             sleep_goal_status = 'not-reached'
     
-    # display week sleep and whether target has been reached
-    if sleep_goal == 'Create one':
-        fig = px.bar(week_sleep, x='Date', y='Total Minutes Asleep')
-    else:
-        week_sleep = pd.DataFrame(week_sleep)
-        week_sleep['Target Reached'] = week_sleep['Total Minutes Asleep'] > (sleep_goal * 60)
-        fig = px.bar(week_sleep, x='Date', y='Total Minutes Asleep', color='Target Reached', 
-                     color_discrete_map={True: px.colors.qualitative.Plotly[2], 
-                                         False: px.colors.qualitative.Plotly[1]})
-        fig.add_hline(y=sleep_goal*60, line_dash="dash")
-        fig.update_layout(showlegend=False)
-
-    return render_template("sleep.html",
-                           warning=warning,
-                           hours_slept=hours_slept,
-                           sleep_goal=sleep_goal_fmt,
-                           sleep_goal_status=sleep_goal_status,
-                           target=target,
-                           date=str(date.date()),
-                           fig=fig.to_html(full_html=False))
+    # the week's sleep with the goal (drawn by static/charts.js)
+    return {'warning': warning,
+            'date': str(date.date()),
+            'hours_slept': float(hours_slept),
+            'sleep_goal': sleep_goal_fmt,
+            'sleep_goal_status': sleep_goal_status,
+            'target': target,
+            'goal': sleep_goal,
+            'week': charts['week']}
 
-@app.route("/heart-rate", methods=["GET", "POST"])
+@app.route("/sleep")
 @login_required
 @auth_required
-def heart_rate():
+def sleep():
+    data = sleep_data()
+    return render_template("sleep.html", chart=data, **data)
+
+@app.route("/api/sleep")
+@login_required
+@auth_required
+def sleep_api():
+    return jsonify(sleep_data())
+
+def heart_rate_data():
+    """Heart-rate dashboard data for the date in the request's query string."""
+    import pandas as pd
     warning = ''
+    method, points = heart_downsampling()
 
     # get user ID and access token
     fitbit_id = session['fitbit_id']
@@ -308,19 +522,9 @@ def heart_rate():
         except:
             date = datetime.date(2016, 4, 12)
 
-        if DB_PATH.startswith('sqlite'):
-            heart_data = pd.read_csv('data/fitbit_apr/heartrate_seconds_merged.csv')
-        else:
-            heart_data = pd.read_sql_table('heart_data', con=engine)
-        heart_data = heart_data.rename(columns={'Value': 'Heart Rate'})
-        heart_data.Time = pd.to_datetime(heart_data.Time)
-        user_id = heart_data.Id.unique()[0]
-        next_date = date + datetime.timedelta(days=1)
-        day_heart = heart_data.loc[
-            (heart_data.Id == user_id) &
-            (heart_data.Time >= str(date)) &
-            (heart_data.Time < str(next_date))
-        ]
+        # demo data never changes, so every date's charts are cached
+        key = ('demo', 'heart', date, demo_tables().version('heart'), method, points)
+        charts = cached_charts(key, True, lambda: downsampled(demo_heart_rate_charts(date), method, points))
         
     else:
         access_token = session['access_token']
@@ -334,87 +538,50 @@ def heart_rate():
         if pd.Timestamp(date).date() > TODAY_DATE: # if date in the future
             date = TODAY_DATE
         session['heart_date'] = date # store queried date
-        day_json = retrieve_data('heart', fitbit_id, access_token, date, period='1d', detail='1min')
-        try: 
-            day_heart = pd.DataFrame(day_json['activities-heart-intraday']['dataset'])
-        except KeyError:
-            return redirect('/authenticate')
-        
-        # if no data
-        if len(day_heart) == 0:
-            day_heart['time'] = date
-            day_heart['value'] = 0
-        day_heart.time = pd.to_datetime(str(date) + ' ' + day_heart.time)
-        day_heart = day_heart.rename(columns={'time': 'Time', 'value': 'Heart Rate'})
-        
-        # retrieve week data via fitbit API
-        week_json = retrieve_data('heart', fitbit_id, access_token, date, period='7d')
-        week_heart = []
-        for day in range(7):
-            date = week_json['activities-heart'][day]['dateTime']
-            try:
-                resting_hr = week_json['activities-heart'][day]['value']['restingHeartRate']
-            except KeyError: # set to 0 if no resting HR
-                resting_hr = 0
-            week_heart.append({'Date': date, 'Resting HR': resting_hr})
-    
-    # display heart rate on chosen date
-    day_fig = px.line(day_heart, x='Time', y='Heart Rate', markers=True)
 
-    # display week data
-    if fitbit_id == 'no_fitbit':
-        week_fig_html = "Resting heart rate: No data"
-    else:
-        week_fig = px.bar(week_heart, x='Date', y='Resting HR')
-        week_fig_html = week_fig.to_html(full_html=False)
-    
-    # if request.method == "POST":
-    #     from momentfm import MOMENTPipeline
-    #     model = MOMENTPipeline.from_pretrained(
-    #         "AutonLab/MOMENT-1-large", 
-    #         model_kwargs={"task_name": "reconstruction"},  # For anomaly detection, we will load MOMENT in `reconstruction` mode
-    #         local_files_only=True,  # Whether or not to only look at local files (i.e., do not try to download the model).
-    #     )
-    #     # generate anomaly table
-    #     anomalies = get_anomalies(day_heart, model).reset_index(drop=True)
-    #     anomaly_thresh = request.form['thresh']
-    #     try:
-    #         anomaly_thresh = int(anomaly_thresh)
-    #         assert anomaly_thresh > 0
-    #     except:
-    #         anomaly_thresh = 5
-
-    #     # plot anomalies on graph
-    #     anomalies['Anomaly'] = anomalies['Anomaly Score'] > anomaly_thresh
-    #     day_fig = go.Figure()
-    #     day_fig.add_trace(go.Scatter(x=anomalies.Time, y=anomalies['Recorded HR'],
-    #                                  mode='lines+markers',
-    #                                  name='Heart Rate'))
-    #     day_fig.add_trace(go.Scatter(x=anomalies.loc[anomalies.Anomaly, 'Time'], 
-    #                                  y=anomalies.loc[anomalies.Anomaly, 'Recorded HR'],
-    #                                  mode='markers',
-    #                                  name='Anomaly'))
-    #     day_fig.update_layout(showlegend=False)
-
-    #     anomalies = anomalies[anomalies['Anomaly']].drop(columns='Anomaly')
-
-    #     return render_template("heart.html", 
-    #                            tables=[anomalies.to_html(index=False, classes='data', header='true')],
-    #                            date=date,
-    #                            data_exists=True,
-    #                            thresh=anomaly_thresh,
-    #                            day_fig=day_fig.to_html(full_html=False),
-    #                            week_fig=week_fig.to_html(full_html=False))
-    # 
-    # else:
+        # the chosen date by minute and the week ending on it, cached once the date is over
+        charts = cached_charts((fitbit_id, 'heart', str(date), method, points), is_finalized(date),
+                               lambda: downsampled(fitbit_heart_rate_charts(fitbit_id, access_token, date),
+                                                   method, points))
+
+    return {'warning': warning,
+            'date': str(date),
+            'data_exists': len(charts['day']['y']) > 0,
+            'day': charts['day'],
+            'week': charts['week']}
+
+@app.route("/heart-rate", methods=["GET", "POST"])
+@login_required
+@auth_required
+def heart_rate():
+    data = heart_rate_data()
+    report = anomaly_report(data) if request.method == "POST" else {}
     return render_template("heart.html", 
-                            warning=warning,
-                            tables=None, 
-                            date=date,
-                            data_exists=len(day_heart)>0,
-                            thresh='',
-                            day_fig=day_fig.to_html(full_html=False),
-                            week_fig=week_fig_html)
+                            chart=data,
+                            tables=report.get('tables'), 
+                            thresh=report.get('thresh', ''),
+                            anomaly_error=report.get('error'),
+                            anomaly_available=anomaly_available(),
+                            **data)
+
+@app.route("/api/heart-rate")
+@login_required
+@auth_required
+def heart_rate_api():
+    return jsonify(heart_rate_data())
+
+BUSY_MESSAGE = "Too many sign-ins right now, please try again in a moment."
+
+def upgrade_password_hash(username, password):
+    """Replace a user's hash with one made with the current PASSWORD_METHOD."""
+    try:
+        new_hash = hash_password(password)
+    except PasswordPoolBusy:
+        return  # try again at the next login
+    with engine.connect() as db:
+        db.execute(text("UPDATE users SET hash = :hash WHERE username = :username"),
+                   {"hash": new_hash, "username": username})
+        db.commit()
 
 @app.route("/register", methods=["GET", "POST"])
 def register():
@@ -437,7 +604,11 @@ def register():
         elif password != confirmation:
             return render_template("register.html", invalid="Passwords do not match!")
 
-        hash = generate_password_hash(password)
+        # the KDF runs on the bounded hashing pool, see src/passwords.py
+        try:
+            hash = hash_password(password)
+        except PasswordPoolBusy:
+            return render_template("register.html", invalid=BUSY_MESSAGE), 503, {"Retry-After": "1"}
         with engine.connect() as db:
             try:
                 db.execute(text("INSERT INTO users (username, hash, has_fitbit) VALUES (:username, :hash, :has_fitbit)"), 
@@ -479,11 +650,17 @@ def login():
             ).fetchall()
 
         # Ensure username exists and password is correct
-        if len(rows) != 1 or not check_password_hash(
-            rows[0][1], request.form.get("password")
-        ):
+        try:
+            valid = len(rows) == 1 and verify_password(rows[0][1], request.form.get("password"))
+        except PasswordPoolBusy:
+            return render_template("login.html", invalid=BUSY_MESSAGE), 503, {"Retry-After": "1"}
+        if not valid:
             return render_template("login.html", invalid='Invalid username or password!')
 
+        # Store a hash made with the current method and cost
+        if needs_rehash(rows[0][1]):
+            upgrade_password_hash(rows[0][0], request.form.get("password"))
+
         # Remember which user has logged in
         session["user_id"] = rows[0][0]
         session['heart_date'] = TODAY_DATE
@@ -514,44 +691,34 @@ def logout():
 @login_required
 def profile():
     username = session['user_id']
-    with engine.connect() as db:
-        goals = db.execute(
-            text("SELECT * FROM profile WHERE username = :username"),
-            {"username": username}
-        ).fetchall()
-
-        ori_step_goal = goals[0][1]
-        ori_sleep_goal = goals[0][2]
+    goals = goal_store.get(username)
     
     if request.method == "POST":
-        # if goal is "create one", will return empty, otherwise will already be set to original value
-        step_goal = request.form['step'] or ori_step_goal
-        sleep_goal = request.form['sleep'] or ori_sleep_goal
-
-        if step_goal != 'Create one':
+        # an empty field keeps the original goal (None if there is none)
+        step_goal = goals.step
+        if request.form['step']:
             try:
-                step_goal = int(step_goal)
+                step_goal = int(request.form['step'])
                 assert step_goal >= 0
             except:
-                step_goal = 'Create one'
+                step_goal = None
         
-        if sleep_goal != 'Create one':
+        sleep_goal = goals.sleep
+        if request.form['sleep']:
             try:
-                sleep_goal = float(sleep_goal)
+                sleep_goal = float(request.form['sleep'])
                 assert sleep_goal >= 0
             except:
-                sleep_goal = 'Create one'
+                sleep_goal = None
 
-        with engine.connect() as db:
-            db.execute(text("UPDATE profile SET step_goal = :step_goal, sleep_goal = :sleep_goal WHERE username = :username"), 
-                       {"step_goal": step_goal, "sleep_goal": sleep_goal, "username": username})
-            db.commit()
+        # saved and cached in this process; other workers notice the version change
+        goal_store.set(username, Goals(step_goal, sleep_goal))
         return redirect("/profile")
     else:
         return render_template("profile.html", 
                                username=username, 
-                               step_goal=ori_step_goal, 
-                               sleep_goal=ori_sleep_goal)
+                               step_goal=goals.step_text, 
+                               sleep_goal=goals.sleep_text)
 
 CLIENT_ID = '23PQH4'
 REDIRECT_URL = os.environ.get('REDIRECT_URL', 'http://localhost:5000/callback')
@@ -596,6 +763,16 @@ def callback():
 
 # ── Chat API ────────────────────────────────────────────────────────────────
 
+def append_chat_turn(username, user_message, response_text):
+    """Add a question and its answer to the user's chat history."""
+    chat_store.append_turn(username, user_message, response_text)
+
+
+def sse_event(event, data):
+    """One Server-Sent Events message with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
 @app.route("/chat", methods=["POST"])
 @login_required
 def chat_endpoint():
@@ -606,33 +783,106 @@ def chat_endpoint():
     if not user_message:
         return jsonify({"error": "Message cannot be empty."}), 400
 
-    if "chat_history" not in session:
-        session["chat_history"] = []
-
+    username = session["user_id"]
     try:
+        from src.health_context import build_health_context
+        from src.llm_service import answer_key, cached_answer, chat as llm_chat, chat_prompt, store_answer
+        history = chat_store.recent(username)
         health_context = build_health_context(session, engine, DB_PATH, retrieve_data)
-        response_text = llm_chat(session["chat_history"], user_message, health_context)
+        key = answer_key(history, user_message, health_context)
+        response_text = cached_answer(key)
+        if response_text is not None:
+            append_chat_turn(username, user_message, response_text)
+            return jsonify({"response": response_text, "prompt_tokens": 0, "cached": True})
+
+        prompt = chat_prompt(history, user_message, health_context)
+        response_text = llm_chat(prompt)
+        store_answer(key, response_text)
+
+        append_chat_turn(username, user_message, response_text)
+        return jsonify({"response": response_text, "prompt_tokens": prompt.total_tokens, "cached": False})
+
+    except EnvironmentError as e:
+        return jsonify({"error": str(e)}), 503
+    except Exception as e:
+        return jsonify({"error": f"Something went wrong: {str(e)}"}), 500
+
+
+@app.route("/chat/stream", methods=["POST"])
+@login_required
+def chat_stream():
+    """Server-Sent Events version of /chat that sends the answer as it is generated.
 
-        # Keep last 20 messages to limit session size
-        session["chat_history"].append({"role": "user", "content": user_message})
-        session["chat_history"].append({"role": "assistant", "content": response_text})
-        session["chat_history"] = session["chat_history"][-20:]
-        session.modified = True
+    Emits a `token` event ({"text": ...}) per chunk, then `done` with the
+    prompt's token count, or `error` ({"error": ...}) if the model fails part-way.
+    A cached answer is sent as a single `token` event.
+    """
+    data = request.get_json(silent=True) or {}
+    user_message = (data.get("message") or "").strip()
 
-        return jsonify({"response": response_text})
+    if not user_message:
+        return jsonify({"error": "Message cannot be empty."}), 400
 
+    username = session["user_id"]
+    try:
+        from src.health_context import build_health_context
+        from src.llm_service import answer_key, cached_answer, chat_prompt, get_llm, store_answer, stream_chat
+        history = chat_store.recent(username)
+        health_context = build_health_context(session, engine, DB_PATH, retrieve_data)
+        key = answer_key(history, user_message, health_context)
+        answer = cached_answer(key)
+        if answer is None:
+            get_llm()  # fail with a JSON error before the stream starts if chat is not configured
+            prompt = chat_prompt(history, user_message, health_context)
     except EnvironmentError as e:
         return jsonify({"error": str(e)}), 503
     except Exception as e:
         return jsonify({"error": f"Something went wrong: {str(e)}"}), 500
 
+    if answer is not None:
+        append_chat_turn(username, user_message, answer)
+        body = sse_event("token", {"text": answer}) + sse_event("done", {"prompt_tokens": 0, "cached": True})
+        return Response(body, mimetype="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+    def generate():
+        parts = []
+        try:
+            for text in stream_chat(prompt):
+                parts.append(text)
+                yield sse_event("token", {"text": text})
+        except Exception as e:
+            yield sse_event("error", {"error": f"Something went wrong: {str(e)}"})
+            return
+        answer = "".join(parts)
+        store_answer(key, answer)
+        append_chat_turn(username, user_message, answer)
+        yield sse_event("done", {"prompt_tokens": prompt.total_tokens, "cached": False})
+
+    return Response(stream_with_context(generate()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.route("/chat/history")
+@login_required
+def chat_history():
+    """A page of the chat history, oldest message first.
+
+    Without `before` the newest messages are returned; pass the `next` value
+    of a page as `before` to get the messages preceding it. `next` is null
+    once the start of the conversation has been reached.
+    """
+    before = request.args.get("before", type=int)
+    limit = min(max(request.args.get("limit", CHAT_PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+    messages = chat_store.page(session["user_id"], before=before, limit=limit)
+    next_before = messages[0]["id"] if len(messages) == limit else None
+    return jsonify({"messages": messages, "next": next_before})
+
 
 @app.route("/chat/clear", methods=["POST"])
 @login_required
 def chat_clear():
     """Clear the chat history."""
-    session["chat_history"] = []
-    session.modified = True
+    chat_store.clear(session["user_id"])
     return jsonify({"status": "ok"})
 
 
@@ -0,0 +1,96 @@
+"""
+Read and write throughput of the app database under several workers.
+
+Starts worker processes, as gunicorn would, against one SQLite file. Most
+of them read a user's goals from `profile` and the rest update a user's
+goals, each in its own transaction, like the dashboards and /profile do.
+Runs once with a plain create_engine (rollback journal) and once with
+src.db.make_engine (WAL and the other pragmas). Reports reads/s, writes/s
+and the operations that failed with a lock error.
+
+    python -m benchmarks.db_concurrency [--readers 6] [--writers 2] [--seconds 5]
+"""
+
+import argparse
+import multiprocessing
+import random
+import tempfile
+import time
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+from src.db import make_engine
+
+USERS = 1000
+
+ENGINES = {
+    "create_engine": create_engine,
+    "make_engine": make_engine,
+}
+
+
+def setup(url, factory):
+    engine = ENGINES[factory](url)
+    with engine.connect() as db:
+        db.execute(text("""CREATE TABLE profile(
+                           username TEXT NOT NULL UNIQUE,
+                           step_goal TEXT NOT NULL,
+                           sleep_goal TEXT NOT NULL)"""))
+        db.execute(text("INSERT INTO profile VALUES (:u, 'Create one', 'Create one')"),
+                   [{"u": f"user{i}"} for i in range(USERS)])
+        db.commit()
+    engine.dispose()
+
+
+def work(url, factory, write, seconds, start):
+    """(operations, lock errors) of one worker process."""
+    engine = ENGINES[factory](url)
+    done = errors = 0
+    while time.time() < start:
+        time.sleep(0.001)
+    deadline = start + seconds
+    while time.time() < deadline:
+        username = f"user{random.randrange(USERS)}"
+        try:
+            with engine.connect() as db:
+                if write:
+                    db.execute(text("UPDATE profile SET step_goal = :g WHERE username = :u"),
+                               {"g": str(random.randrange(20000)), "u": username})
+                    db.commit()
+                else:
+                    db.execute(text("SELECT step_goal, sleep_goal FROM profile WHERE username = :u"),
+                               {"u": username}).fetchone()
+            done += 1
+        except OperationalError:
+            errors += 1
+    return done, errors
+
+
+def run(factory, readers, writers, seconds):
+    with tempfile.TemporaryDirectory() as workdir:
+        url = f"sqlite:///{workdir}/bench.db"
+        setup(url, factory)
+        start = time.time() + 1  # let every worker import and connect first
+        jobs = [(url, factory, False, seconds, start)] * readers + [(url, factory, True, seconds, start)] * writers
+        with multiprocessing.Pool(len(jobs)) as pool:
+            results = pool.starmap(work, jobs)
+    reads, writes = results[:readers], results[readers:]
+    return (sum(r[0] for r in reads) / seconds, sum(w[0] for w in writes) / seconds,
+            sum(r[1] for r in results))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--readers", type=int, default=6)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--seconds", type=float, default=5)
+    args = parser.parse_args()
+
+    print(f"{args.readers} reader and {args.writers} writer processes, {args.seconds:g}s each")
+    print(f"{'engine':<15}{'reads/s':>10}{'writes/s':>10}{'lock errors':>13}")
+    for factory in ENGINES:
+        reads, writes, errors = run(factory, args.readers, args.writers, args.seconds)
+        print(f"{factory:<15}{reads:>10,.0f}{writes:>10,.0f}{errors:>13}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Login throughput, and the latency of other routes during a login burst.
+
+Several threads post to /login in a loop while one more thread keeps
+requesting a page that needs no hashing (GET /login). This is what a
+threaded worker sees when many users sign in at once. A rejected login
+waits for its Retry-After before trying again. Runs with the KDF
+inline in the request thread (PASSWORD_WORKERS=0) and on the hashing pool
+of src/passwords.py. Reports successful logins/s, rejected logins/s and
+the other page's median and 95th-percentile latency.
+
+    python -m benchmarks.login_throughput [--threads 8] [--seconds 5] [--workers 2] [--queue 2]
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+_db = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+os.environ["DB_PATH"] = f"sqlite:///{_db.name}"
+os.environ["PREFETCH_INTERVAL"] = "0"
+os.environ["DEMO_PRELOAD"] = "0"
+
+import src.passwords as passwords
+from app import app
+
+
+def login_loop(deadline, counts, lock, i):
+    client = app.test_client()
+    data = {"username": f"bench{i}", "password": "benchpass"}
+    while time.time() < deadline:
+        resp = client.post("/login", data=data)
+        with lock:
+            counts[resp.status_code] = counts.get(resp.status_code, 0) + 1
+        if resp.status_code == 503:
+            time.sleep(float(resp.headers.get("Retry-After", 1)))
+
+
+def page_loop(deadline, latencies):
+    client = app.test_client()
+    while time.time() < deadline:
+        start = time.perf_counter()
+        client.get("/login")
+        latencies.append(time.perf_counter() - start)
+
+
+def run(threads, seconds, workers, queue):
+    passwords.shutdown()
+    passwords.PASSWORD_WORKERS, passwords.PASSWORD_QUEUE = workers, queue
+    if workers:
+        passwords.verify_password(passwords.hash_password("warm"), "warm")  # start the processes
+
+    counts, latencies, lock = {}, [], threading.Lock()
+    deadline = time.time() + seconds
+    pool = [threading.Thread(target=login_loop, args=(deadline, counts, lock, i)) for i in range(threads)]
+    pool.append(threading.Thread(target=page_loop, args=(deadline, latencies)))
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    latencies.sort()
+    return (counts.get(302, 0) / seconds, counts.get(503, 0) / seconds,
+            statistics.median(latencies) * 1000, latencies[int(len(latencies) * 0.95)] * 1000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--queue", type=int, default=2)
+    args = parser.parse_args()
+
+    client = app.test_client()
+    for i in range(args.threads):
+        client.post("/register", data={"username": f"bench{i}", "password": "benchpass",
+                                       "confirmation": "benchpass"})
+
+    print(f"{args.threads} login threads, {args.seconds:g}s, {passwords.PASSWORD_METHOD}")
+    print(f"{'hashing':<22}{'logins/s':>10}{'rejected/s':>12}{'page p50 ms':>13}{'page p95 ms':>13}")
+    for label, workers, queue in (("inline", 0, 0), (f"pool ({args.workers}+{args.queue})", args.workers, args.queue)):
+        logins, rejected, p50, p95 = run(args.threads, args.seconds, workers, queue)
+        print(f"{label:<22}{logins:>10.1f}{rejected:>12.1f}{p50:>13.1f}{p95:>13.1f}")
+    passwords.shutdown()
+    os.unlink(_db.name)
+
+
+if __name__ == "__main__":
+    main()
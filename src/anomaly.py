@@ -0,0 +1,194 @@
+"""
+Heart-rate anomaly scores from the MOMENT reconstruction model.
+
+A day of heart rate is put on a 5-second grid (short gaps interpolated)
+and cut into 512-sample windows, MOMENT's input length. Each window is
+reconstructed by the model, and every sample is scored by how far the
+recording is from the reconstruction, as a percentage. Samples scoring
+above the user's threshold are reported as anomalies.
+
+The model is loaded once per process and scores windows in batches of
+ANOMALY_BATCH_SIZE on CPU, without gradients. Scores are cached per
+(user, date) in score_cache, so changing the threshold on the heart-rate
+page filters the cached scores instead of running the model again. Days
+that can still change are re-scored after FITBIT_CACHE_TTL seconds.
+
+torch and momentfm are optional (`uv sync --group ml`). Without them, or
+without the model files, anomaly detection reports that it is unavailable.
+
+Env vars:
+    ANOMALY_MODEL            – Hugging Face model id (default AutonLab/MOMENT-1-large)
+    ANOMALY_LOCAL_ONLY       – 1 loads the model from the local cache only (default 1)
+    ANOMALY_BATCH_SIZE       – windows per forward pass (default 16)
+    ANOMALY_CACHE_MAX_BYTES  – memory for cached scores (default 64 MB)
+"""
+
+import importlib.util
+import os
+import threading
+import numpy as np
+import pandas as pd
+from src.cache import LRUCache
+from src.utils import FITBIT_CACHE_TTL
+
+ANOMALY_MODEL = os.environ.get("ANOMALY_MODEL", "AutonLab/MOMENT-1-large")
+ANOMALY_LOCAL_ONLY = os.environ.get("ANOMALY_LOCAL_ONLY", "1") != "0"
+ANOMALY_BATCH_SIZE = int(os.environ.get("ANOMALY_BATCH_SIZE", 16))
+
+# Threshold used when the form's value is missing or invalid
+DEFAULT_THRESHOLD = 5
+
+# Grid and windows the model is fed
+INTERVAL = pd.Timedelta(seconds=5)
+INTERPOLATION_LIMIT = 11  # samples, so one-minute Fitbit data is filled in
+WINDOW = 512
+MISSING_THRESHOLD = 0.5  # windows with more missing samples are skipped
+
+# Whether torch and momentfm are installed; looked up once, not per request
+AVAILABLE = all(importlib.util.find_spec(name) for name in ("torch", "momentfm"))
+
+# (user key, date) -> Scores
+score_cache = LRUCache(max_entries=256,
+                       max_bytes=int(os.environ.get("ANOMALY_CACHE_MAX_BYTES", 64 * 1024 * 1024)))
+
+
+class AnomalyUnavailable(Exception):
+    """The model or its dependencies cannot be loaded on this server."""
+
+
+def make_windows(times, values):
+    """(windows, masks, times) of a day's heart rate, ready for the model.
+
+    windows and masks are (n, WINDOW) arrays; masks are 1 where a sample was
+    recorded or interpolated. The last window is padded with masked zeros.
+    times are the grid times of every window, flattened.
+    """
+    series = pd.Series(np.asarray(values, dtype=np.float64), index=pd.to_datetime(pd.Series(times)).values)
+    series = series[~series.index.duplicated()].sort_index()
+    if series.empty:
+        return np.empty((0, WINDOW)), np.empty((0, WINDOW)), np.array([], dtype="datetime64[ns]")
+    grid = pd.date_range(series.index.min(), series.index.max(), freq=INTERVAL)
+    filled = series.reindex(grid, method="nearest", tolerance=INTERVAL - pd.Timedelta(seconds=1))
+    filled = filled.interpolate(limit=INTERPOLATION_LIMIT).to_numpy()
+
+    n = -(-len(filled) // WINDOW)
+    padded = np.full(n * WINDOW, np.nan)
+    padded[:len(filled)] = filled
+    grid_times = np.full(n * WINDOW, np.datetime64("NaT"), dtype="datetime64[ns]")
+    grid_times[:len(filled)] = grid.values
+    windows, grid_times = padded.reshape(n, WINDOW), grid_times.reshape(n, WINDOW)
+
+    # the missing share counts only the part of the last window the day covers
+    covered = np.minimum(len(filled) - np.arange(n) * WINDOW, WINDOW)
+    missing = (np.isnan(windows).sum(axis=1) - (WINDOW - covered)) / covered
+    keep = missing <= MISSING_THRESHOLD
+    masks = ~np.isnan(windows[keep])
+    return np.nan_to_num(windows[keep]), masks.astype(np.float32), grid_times[keep].ravel()
+
+
+class _MomentScorer:
+    """MOMENT in reconstruction mode, loaded once."""
+
+    def __init__(self, model_id=ANOMALY_MODEL, local_only=ANOMALY_LOCAL_ONLY):
+        import torch
+        from momentfm import MOMENTPipeline
+        self.torch = torch
+        self.model = MOMENTPipeline.from_pretrained(
+            model_id,
+            model_kwargs={"task_name": "reconstruction"},
+            local_files_only=local_only,
+        )
+        self.model.init()
+        self.model.eval()
+
+    def reconstruct(self, windows, masks, batch_size=ANOMALY_BATCH_SIZE) -> np.ndarray:
+        """The model's reconstruction of each window, same shape as windows."""
+        torch = self.torch
+        out = np.empty_like(windows, dtype=np.float64)
+        with torch.no_grad():
+            for start in range(0, len(windows), batch_size):
+                x = torch.from_numpy(windows[start:start + batch_size].astype(np.float32))[:, None, :]
+                mask = torch.from_numpy(masks[start:start + batch_size])
+                output = self.model(x_enc=x, input_mask=mask)
+                out[start:start + batch_size] = output.reconstruction[:, 0, :].numpy()
+        return out
+
+
+_scorer = None
+_scorer_lock = threading.Lock()
+_score_lock = threading.Lock()  # one scoring run at a time per process; torch uses every core
+
+
+def get_scorer():
+    """The process-wide model, loaded on first use."""
+    global _scorer
+    if _scorer is None:
+        with _scorer_lock:
+            if _scorer is None:
+                if not AVAILABLE:
+                    raise AnomalyUnavailable("Anomaly detection is not installed on this server.")
+                try:
+                    _scorer = _MomentScorer()
+                except (ImportError, OSError) as e:  # broken install, or model files not downloaded
+                    raise AnomalyUnavailable(f"The anomaly model could not be loaded: {e}")
+    return _scorer
+
+
+class Scores:
+    """Recorded and predicted heart rate and the anomaly score of each sample."""
+
+    def __init__(self, times, recorded, predicted):
+        self.times = times
+        self.recorded = recorded
+        self.predicted = predicted
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self.score = np.abs(recorded - predicted) / predicted * 100
+
+    @property
+    def nbytes(self) -> int:
+        return sum(a.nbytes for a in (self.times, self.recorded, self.predicted, self.score))
+
+    def above(self, threshold) -> pd.DataFrame:
+        """The samples whose score exceeds threshold, as the report table."""
+        hit = self.score > threshold
+        return pd.DataFrame({"Time": self.times[hit],
+                             "Recorded HR": self.recorded[hit].round(1),
+                             "Predicted HR": self.predicted[hit].round(1),
+                             "Anomaly Score": self.score[hit].round(1)})
+
+
+def score_day(times, values) -> Scores:
+    """Run the model over a day of heart rate."""
+    windows, masks, grid_times = make_windows(times, values)
+    scorer = get_scorer()
+    predicted = scorer.reconstruct(windows, masks).ravel() if len(windows) else np.empty(0)
+    recorded = windows.ravel()
+    observed = masks.ravel() > 0
+    return Scores(grid_times[observed], recorded[observed], predicted[observed])
+
+
+def cached_scores(key, immutable, load) -> Scores:
+    """Scores for key, computed from load() -> (times, values) when not cached.
+
+    load() may sync from Fitbit, so it runs before taking the scoring lock;
+    only the model run is serialised.
+    """
+    scores = score_cache.get(key)
+    if scores is None:
+        times, values = load()
+        with _score_lock:
+            scores = score_cache.get(key)
+            if scores is None:
+                scores = score_day(times, values)
+                score_cache.set(key, scores, ttl=None if immutable else FITBIT_CACHE_TTL, size=scores.nbytes)
+    return scores
+
+
+def parse_threshold(value) -> float:
+    """The form's threshold, or DEFAULT_THRESHOLD if it is not a positive number."""
+    try:
+        threshold = float(value)
+        assert threshold > 0
+    except (TypeError, ValueError, AssertionError):
+        return DEFAULT_THRESHOLD
+    return threshold
@@ -0,0 +1,167 @@
+"""
+Small key-value caches shared by the data layers.
+
+LRUCache keeps values in process memory; SQLiteCache persists JSON values
+to a SQLite file so they survive restarts and are shared by all workers on
+a node. Both evict least-recently-used entries beyond an entry and a byte
+limit, and both support an optional per-entry TTL.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Thread-safe in-memory LRU cache with optional per-entry TTL."""
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._data = OrderedDict()  # key -> (value, size, expires_at)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            value, size, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                self._pop(key)
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl: float = None, size: int = 0):
+        """Store a value; `ttl` is in seconds (None keeps it until evicted)."""
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            if key in self._data:
+                self._pop(key)
+            self._data[key] = (value, size, expires_at)
+            self._bytes += size
+            while self._data and (
+                len(self._data) > self.max_entries
+                or (self.max_bytes is not None and self._bytes > self.max_bytes)
+            ):
+                self._pop(next(iter(self._data)))
+
+    def _pop(self, key):
+        _, size, _ = self._data.pop(key)
+        self._bytes -= size
+
+    def invalidate(self, predicate):
+        """Remove every entry whose key matches predicate(key)."""
+        with self._lock:
+            for key in [k for k in self._data if predicate(k)]:
+                self._pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteCache:
+    """LRU cache of JSON-serialisable values stored in a SQLite file."""
+
+    def __init__(self, path: str, max_entries: int = 10000, max_bytes: int = None):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._connection = None
+
+    @property
+    def _con(self):
+        # opened on first use (always under self._lock), so merely importing a
+        # module that builds the cache touches no file
+        if self._connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            con = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("""
+                CREATE TABLE IF NOT EXISTS cache(
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    expires_at REAL,
+                    accessed_at REAL NOT NULL)
+            """)
+            con.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache(accessed_at)")
+            self._connection = con
+        return self._connection
+
+    @staticmethod
+    def _key(key) -> str:
+        return json.dumps(key, default=str)
+
+    def get(self, key, default=None):
+        k = self._key(key)
+        now = time.time()
+        with self._lock:
+            row = self._con.execute(
+                "SELECT value, expires_at FROM cache WHERE key = ?", (k,)
+            ).fetchone()
+            if row is None:
+                return default
+            if row[1] is not None and row[1] <= now:
+                self._con.execute("DELETE FROM cache WHERE key = ?", (k,))
+                return default
+            self._con.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (now, k))
+        return json.loads(row[0])
+
+    def set(self, key, value, ttl: float = None, size: int = 0):
+        """Store a value; `ttl` is in seconds (None keeps it until evicted)."""
+        data = json.dumps(value)
+        now = time.time()
+        expires_at = now + ttl if ttl is not None else None
+        with self._lock:
+            self._con.execute(
+                "INSERT OR REPLACE INTO cache (key, value, size, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (self._key(key), data, len(data), expires_at, now),
+            )
+            self._evict()
+
+    def _evict(self):
+        count, total = self._con.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache").fetchone()
+        if count > self.max_entries:
+            self._con.execute(
+                "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY accessed_at LIMIT ?)",
+                (count - self.max_entries,),
+            )
+        if self.max_bytes is not None and total > self.max_bytes:
+            excess = total - self.max_bytes
+            rows = self._con.execute("SELECT key, size FROM cache ORDER BY accessed_at").fetchall()
+            doomed = []
+            for key, size in rows:
+                if excess <= 0:
+                    break
+                doomed.append((key,))
+                excess -= size
+            self._con.executemany("DELETE FROM cache WHERE key = ?", doomed)
+
+    def invalidate(self, predicate):
+        """Remove every entry whose key matches predicate(key)."""
+        with self._lock:
+            keys = [k for (k,) in self._con.execute("SELECT key FROM cache")]
+            doomed = [(k,) for k in keys if predicate(tuple(json.loads(k)))]
+            self._con.executemany("DELETE FROM cache WHERE key = ?", doomed)
+
+    def clear(self):
+        with self._lock:
+            self._con.execute("DELETE FROM cache")
+
+    def __len__(self):
+        with self._lock:
+            return self._con.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
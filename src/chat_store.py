@@ -0,0 +1,78 @@
+"""
+Chat history kept in a `chat_messages` table.
+
+Each question and its answer are appended with one INSERT, and the sidebar
+loads the conversation a page at a time (newest first), so the history can
+grow well past what fits in a session and the session itself stays small.
+The prompt only needs the most recent CHAT_PROMPT_MESSAGES messages; the
+prompt builder trims those further to its token budget.
+
+Env vars:
+    CHAT_PROMPT_MESSAGES  – recent messages read for each prompt (default 40)
+    CHAT_PAGE_SIZE        – messages per /chat/history page (default 30)
+"""
+
+import os
+import time
+from sqlalchemy import text
+
+CHAT_PROMPT_MESSAGES = int(os.environ.get("CHAT_PROMPT_MESSAGES", 40))
+CHAT_PAGE_SIZE = int(os.environ.get("CHAT_PAGE_SIZE", 30))
+
+# Largest page a client may ask for
+MAX_PAGE_SIZE = 200
+
+
+class ChatStore:
+    """Every user's chat messages, in the app database."""
+
+    def __init__(self, engine):
+        self.engine = engine
+
+    def create_table(self):
+        # ids increase with every insert and break ties between the two messages of a turn
+        id_column = "BIGSERIAL PRIMARY KEY" if self.engine.dialect.name == "postgresql" else "INTEGER PRIMARY KEY"
+        with self.engine.connect() as db:
+            db.execute(text(f"""CREATE TABLE IF NOT EXISTS chat_messages(
+                                id {id_column},
+                                username TEXT NOT NULL,
+                                role TEXT NOT NULL,
+                                content TEXT NOT NULL,
+                                created_at REAL NOT NULL)"""))
+            db.execute(text("CREATE INDEX IF NOT EXISTS chat_messages_user ON chat_messages(username, created_at)"))
+            db.commit()
+
+    def append_turn(self, username, user_message, answer):
+        """Store a question and its answer."""
+        now = time.time()
+        with self.engine.connect() as db:
+            db.execute(text("""INSERT INTO chat_messages (username, role, content, created_at)
+                               VALUES (:u, :role, :content, :t)"""),
+                       [{"u": username, "role": "user", "content": user_message, "t": now},
+                        {"u": username, "role": "assistant", "content": answer, "t": now}])
+            db.commit()
+
+    def page(self, username, before=None, limit=CHAT_PAGE_SIZE) -> list[dict]:
+        """Up to `limit` messages older than message id `before` (newest if None), oldest first."""
+        sql = "SELECT id, role, content FROM chat_messages WHERE username = :u"
+        params = {"u": username, "n": limit}
+        if before is not None:
+            sql += " AND id < :before"
+            params["before"] = before
+        sql += " ORDER BY created_at DESC, id DESC LIMIT :n"
+        with self.engine.connect() as db:
+            rows = db.execute(text(sql), params).fetchall()
+        return [{"id": r[0], "role": r[1], "content": r[2]} for r in reversed(rows)]
+
+    def recent(self, username, limit=CHAT_PROMPT_MESSAGES) -> list[dict]:
+        """The last `limit` messages as {role, content}, oldest first, for the prompt."""
+        return [{"role": m["role"], "content": m["content"]} for m in self.page(username, limit=limit)]
+
+    def clear(self, username=None):
+        """Delete a user's messages, or everyone's."""
+        with self.engine.connect() as db:
+            if username is None:
+                db.execute(text("DELETE FROM chat_messages"))
+            else:
+                db.execute(text("DELETE FROM chat_messages WHERE username = :u"), {"u": username})
+            db.commit()
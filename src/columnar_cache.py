@@ -0,0 +1,91 @@
+"""
+On-disk columnar cache for the demo Fitbit CSVs.
+
+The first time a CSV is used it is parsed into typed numpy columns and
+written to CACHE_DIR as one .npy file per column, plus a meta.json. Later
+reads memory-map those files, so every gunicorn worker shares the OS page
+cache instead of each holding a private copy of the parsed table.
+
+Each cache entry lives in a directory named after the table and a version
+of its source (a CSV's mtime and size), so editing or replacing the CSV
+makes the next read rebuild it.
+"""
+
+import json
+import os
+import shutil
+import threading
+import numpy as np
+
+CACHE_DIR = os.environ.get("DEMO_CACHE_DIR", "data/cache")
+
+_build_lock = threading.Lock()
+
+
+def source_version(source_path):
+    """(mtime, size) of source_path, or None if it does not exist."""
+    try:
+        stat = os.stat(source_path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _write(path, columns, meta):
+    os.makedirs(path)
+    for col, arr in columns.items():
+        arr = np.asarray(arr)
+        if arr.dtype == object:
+            arr = arr.astype(str)
+        np.save(os.path.join(path, f"{col}.npy"), arr, allow_pickle=False)
+    with open(os.path.join(path, "meta.json"), "w") as f:
+        json.dump({"columns": list(columns), **meta}, f)
+
+
+def _read(path):
+    with open(os.path.join(path, "meta.json")) as f:
+        meta = json.load(f)
+    columns = {
+        col: np.load(os.path.join(path, f"{col}.npy"), mmap_mode="r", allow_pickle=False)
+        for col in meta.pop("columns")
+    }
+    return columns, meta
+
+
+def _remove_stale(cache_dir, name, keep):
+    """Delete entries left behind by older versions of a table."""
+    for entry in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, entry)
+        if entry.startswith(name + "-") and path != keep and not entry.endswith(".tmp"):
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def cached_columns(name, version, build, cache_dir=CACHE_DIR):
+    """
+    Return (columns, meta) for a table, building the cache entry if needed.
+
+    `version` identifies the current state of the source (for a CSV, its
+    mtime and size); a new version gets a new entry. `build()` must return
+    a dict of numpy columns and a JSON-serialisable dict of extra metadata.
+    Columns of a cached entry are read-only memory maps.
+    """
+    if not cache_dir:
+        return build()
+
+    path = os.path.join(cache_dir, f"{name}-{version}")
+    if not os.path.exists(os.path.join(path, "meta.json")):
+        with _build_lock:
+            if not os.path.exists(os.path.join(path, "meta.json")):
+                columns, meta = build()
+                os.makedirs(cache_dir, exist_ok=True)
+                # Write to a private directory and rename it into place so
+                # other workers never see a half-written entry
+                tmp = f"{path}.{os.getpid()}.tmp"
+                shutil.rmtree(tmp, ignore_errors=True)
+                _write(tmp, columns, meta)
+                try:
+                    os.rename(tmp, path)
+                except OSError:  # another worker got there first
+                    shutil.rmtree(tmp, ignore_errors=True)
+                _remove_stale(cache_dir, name, keep=path)
+    return _read(path)
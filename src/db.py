@@ -0,0 +1,57 @@
+"""
+SQLAlchemy engine for the app database, configured for several workers.
+
+SQLite (the default data/users.db) runs in WAL mode. Readers then no longer
+wait for a writer, and a registration or goal change doesn't stall the
+dashboards of every other worker. Each new connection sets:
+
+    journal_mode=WAL       readers and one writer proceed concurrently
+    synchronous=NORMAL     fsync at checkpoints only; safe with WAL, though
+                           a power cut can lose the last commits
+    busy_timeout           wait for a lock instead of failing at once
+    mmap_size              read pages through memory-mapped I/O
+
+Postgres connections are pooled per worker and checked before use, so a
+connection dropped by the server or a proxy is replaced rather than
+failing a request.
+
+Env vars:
+    DB_BUSY_TIMEOUT_MS  – SQLite lock wait in milliseconds (default 5000)
+    DB_MMAP_SIZE        – SQLite memory-mapped bytes (default 268435456, 0 disables)
+    DB_POOL_SIZE        – Postgres connections kept per worker (default 5)
+    DB_MAX_OVERFLOW     – extra Postgres connections under load (default 10)
+    DB_POOL_RECYCLE     – seconds before a Postgres connection is replaced (default 1800)
+"""
+
+import os
+from sqlalchemy import create_engine, event
+
+DB_BUSY_TIMEOUT_MS = int(os.environ.get("DB_BUSY_TIMEOUT_MS", 5000))
+DB_MMAP_SIZE = int(os.environ.get("DB_MMAP_SIZE", 256 * 1024 * 1024))
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", 10))
+DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", 1800))
+
+
+def _sqlite_pragmas(in_memory):
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        if not in_memory:  # an in-memory database has no journal file to share
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}")
+        cursor.execute(f"PRAGMA mmap_size={DB_MMAP_SIZE}")
+        cursor.close()
+    return on_connect
+
+
+def make_engine(url, **kwargs):
+    """create_engine(url) with the settings above for SQLite or Postgres."""
+    if url.startswith("postgresql"):
+        kwargs = {"pool_size": DB_POOL_SIZE, "max_overflow": DB_MAX_OVERFLOW,
+                  "pool_recycle": DB_POOL_RECYCLE, "pool_pre_ping": True, **kwargs}
+    engine = create_engine(url, **kwargs)
+    if engine.dialect.name == "sqlite":
+        database = engine.url.database
+        event.listen(engine, "connect", _sqlite_pragmas(not database or database == ":memory:"))
+    return engine
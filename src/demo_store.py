@@ -0,0 +1,236 @@
+"""
+In-process store for the demo Fitbit dataset (data/fitbit_apr).
+
+Each table is read once per process, its timestamp column parsed and its
+rows sorted by (Id, timestamp), so every (user, day) is a contiguous row
+range. A small day-offset index maps each (user, day) partition to its
+rows: a day view is one dictionary lookup and reads only that day's rows,
+and week slices use a binary search within the user's rows. The cost of a
+page view no longer grows with the size of the sample files.
+
+Tables are read through src.columnar_cache, so after the first run each
+worker memory-maps the parsed columns and index instead of parsing the
+CSVs (or SQL tables) again.
+"""
+
+import os
+import threading
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+from src.columnar_cache import CACHE_DIR, cached_columns, source_version
+
+DEMO_DIR = "data/fitbit_apr"
+
+# name -> (CSV file, SQL table, timestamp column)
+TABLES = {
+    "hourly_steps": ("hourlySteps_merged.csv", "day_steps", "ActivityHour"),
+    "daily_steps": ("dailySteps_merged.csv", "daily_steps", "ActivityDay"),
+    "daily_sleep": ("sleepDay_merged.csv", "daily_sleep", "SleepDay"),
+    "heart": ("heartrate_seconds_merged.csv", "heart_data", "Time"),
+}
+
+# Columns stored with the smallest integer type that fits (heart rate in bpm
+# fits in a byte, which keeps a day of 5-second samples small)
+COMPACT_COLUMNS = {"heart": ["Value"]}
+
+_INDEX_PREFIX = "_day_"
+
+# Timestamp layouts used by the Fitbit export; an explicit format is parsed
+# in C, whereas inference falls back to dateutil one string at a time
+TIME_FORMATS = ("%m/%d/%Y %I:%M:%S %p", "%m/%d/%Y")
+
+
+def _to_datetime64(value):
+    """Convert a date, datetime, Timestamp or string to numpy datetime64[ns]."""
+    return np.datetime64(pd.Timestamp(value), "ns")
+
+
+def _parse_times(values) -> pd.Series:
+    for fmt in TIME_FORMATS:
+        try:
+            return pd.to_datetime(values, format=fmt)
+        except (ValueError, TypeError):
+            continue
+    return pd.to_datetime(values)
+
+
+def _build_day_index(ids, times) -> dict:
+    """Row ranges of each (Id, day) partition in columns sorted by (Id, timestamp)."""
+    if not len(ids):
+        empty = np.array([], dtype=np.int64)
+        return {"id": empty, "day": np.array([], dtype="datetime64[D]"), "start": empty, "stop": empty}
+    days = times.astype("datetime64[D]")
+    change = (ids[1:] != ids[:-1]) | (days[1:] != days[:-1])
+    starts = np.concatenate(([0], np.flatnonzero(change) + 1))
+    stops = np.append(starts[1:], len(ids))
+    return {"id": ids[starts], "day": days[starts], "start": starts, "stop": stops}
+
+
+class DemoTable:
+    """One demo table held as numpy columns sorted by (Id, timestamp)."""
+
+    def __init__(self, columns: dict, time_col: str, first_id=None, day_index: dict = None):
+        self.columns = columns
+        self.time_col = time_col
+        # The dashboards have always shown the first user in file order
+        self.first_id = first_id
+        self._times = columns[time_col]
+        if day_index is None:
+            day_index = _build_day_index(columns["Id"], self._times)
+        self.day_index = day_index
+
+        ids = np.asarray(day_index["id"]).tolist()
+        days = np.asarray(day_index["day"]).tolist()
+        starts = np.asarray(day_index["start"]).tolist()
+        stops = np.asarray(day_index["stop"]).tolist()
+        self._days = {(uid, day): (start, stop) for uid, day, start, stop in zip(ids, days, starts, stops)}
+        self._offsets = {}
+        for uid, start, stop in zip(ids, starts, stops):
+            first = self._offsets.get(uid, (start, stop))[0]
+            self._offsets[uid] = (first, stop)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, time_col: str, compact=()) -> "DemoTable":
+        """Parse the timestamp column of a raw table and sort it by (Id, timestamp)."""
+        df = df.copy()
+        df[time_col] = _parse_times(df[time_col])
+        for col in compact:
+            df[col] = pd.to_numeric(df[col], downcast="unsigned")
+        first_id = df.Id.iloc[0].item() if len(df) else None
+        df = df.sort_values(["Id", time_col], kind="stable")
+        columns = {col: df[col].to_numpy() for col in df.columns}
+        return cls(columns, time_col, first_id)
+
+    @property
+    def user_ids(self) -> list:
+        return list(self._offsets)
+
+    def _frame(self, start: int, stop: int) -> pd.DataFrame:
+        return pd.DataFrame({col: arr[start:stop] for col, arr in self.columns.items()})
+
+    def user_rows(self, user_id) -> pd.DataFrame:
+        """All rows for one user, sorted by timestamp."""
+        start, stop = self._offsets.get(user_id, (0, 0))
+        return self._frame(start, stop)
+
+    def day(self, user_id, date) -> pd.DataFrame:
+        """Rows for one user on one calendar day, read from that day's partition only."""
+        start, stop = self._days.get((user_id, pd.Timestamp(date).date()), (0, 0))
+        return self._frame(start, stop)
+
+    def between(self, user_id, start, end) -> pd.DataFrame:
+        """Rows for one user with start <= timestamp < end."""
+        lo, hi = self._offsets.get(user_id, (0, 0))
+        times = self._times[lo:hi]
+        left = lo + int(np.searchsorted(times, _to_datetime64(start), side="left"))
+        right = lo + int(np.searchsorted(times, _to_datetime64(end), side="left"))
+        return self._frame(left, right)
+
+    def daily_stats(self, user_id, col: str) -> pd.DataFrame:
+        """Mean, min and max of a column for each day a user has data."""
+        mask = np.asarray(self.day_index["id"]) == user_id
+        starts = np.asarray(self.day_index["start"])[mask]
+        if not len(starts):
+            return pd.DataFrame(columns=["Date", "mean", "min", "max"])
+        lo, hi = self._offsets[user_id]
+        values = np.asarray(self.columns[col][lo:hi])
+        bounds = starts - lo
+        counts = np.diff(np.append(bounds, len(values)))
+        return pd.DataFrame({
+            "Date": pd.to_datetime(np.asarray(self.day_index["day"])[mask]),
+            "mean": np.add.reduceat(values, bounds, dtype=np.float64) / counts,
+            "min": np.minimum.reduceat(values, bounds),
+            "max": np.maximum.reduceat(values, bounds),
+        })
+
+
+class DemoStore:
+    """Lazily loaded, process-wide cache of the demo tables."""
+
+    def __init__(self, engine, db_path: str, data_dir: str = DEMO_DIR, cache_dir: str = CACHE_DIR):
+        self.engine = engine
+        self.db_path = db_path
+        self.data_dir = data_dir
+        self.cache_dir = cache_dir
+        self._tables = {}
+        self._lock = threading.Lock()
+
+    def _csv_path(self, name: str) -> str:
+        return os.path.join(self.data_dir, TABLES[name][0])
+
+    def _build(self, name: str, df: pd.DataFrame):
+        """Flatten a parsed table and its day index into cacheable columns."""
+        table = DemoTable.from_frame(df, TABLES[name][2], COMPACT_COLUMNS.get(name, ()))
+        arrays = dict(table.columns)
+        arrays.update({_INDEX_PREFIX + key: arr for key, arr in table.day_index.items()})
+        return arrays, {"first_id": table.first_id}
+
+    def _load(self, name: str) -> DemoTable:
+        """Read from the CSV if sqlite, otherwise from SQL table, through the columnar cache."""
+        csv_file, sql_table, time_col = TABLES[name]
+        if self.db_path.startswith("sqlite"):
+            csv_path = self._csv_path(name)
+            version = source_version(csv_path)
+            if version is None:
+                # Nothing to cache; let pandas read (or report) it directly
+                return DemoTable.from_frame(pd.read_csv(csv_path), time_col, COMPACT_COLUMNS.get(name, ()))
+            entry = os.path.splitext(csv_file)[0]
+            version = "%d-%d" % version
+            build = lambda: self._build(name, pd.read_csv(csv_path))
+        else:
+            # The sample tables are loaded once and never updated, so the row
+            # count is enough to tell whether a cached copy is current
+            with self.engine.connect() as db:
+                count = db.execute(text(f"SELECT COUNT(*) FROM {sql_table}")).scalar()
+            entry = sql_table
+            version = f"rows{count}"
+            build = lambda: self._build(name, pd.read_sql_table(sql_table, con=self.engine))
+
+        arrays, meta = cached_columns(entry, version, build, self.cache_dir)
+        columns = {k: v for k, v in arrays.items() if not k.startswith(_INDEX_PREFIX)}
+        day_index = {k[len(_INDEX_PREFIX):]: v for k, v in arrays.items() if k.startswith(_INDEX_PREFIX)}
+        return DemoTable(columns, time_col, meta["first_id"], day_index)
+
+    def _current_version(self, name: str):
+        if self.db_path.startswith("sqlite"):
+            return source_version(self._csv_path(name))
+        return None
+
+    def version(self, name: str):
+        """Version of a table's source (CSV mtime and size); None for SQL tables."""
+        return self._current_version(name)
+
+    def table(self, name: str) -> DemoTable:
+        """Return the named table, loading it on first use or when its CSV changes."""
+        version = self._current_version(name)
+        loaded = self._tables.get(name)
+        if loaded is None or loaded[0] != version:
+            with self._lock:
+                loaded = self._tables.get(name)
+                if loaded is None or loaded[0] != version:
+                    loaded = self._tables[name] = (version, self._load(name))
+        return loaded[1]
+
+    def preload(self):
+        """Load every table up front (e.g. at worker startup)."""
+        for name in TABLES:
+            self.table(name)
+
+    def clear(self):
+        """Drop all loaded tables so the next access reloads them."""
+        with self._lock:
+            self._tables.clear()
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_demo_store(engine, db_path: str) -> DemoStore:
+    """Return the shared DemoStore for this database."""
+    with _stores_lock:
+        store = _stores.get(db_path)
+        if store is None:
+            store = _stores[db_path] = DemoStore(engine, db_path)
+        return store
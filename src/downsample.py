@@ -0,0 +1,94 @@
+"""
+Reduce a time series to a target number of points for charting.
+
+A day of heart rate is 1,440 one-minute samples from Fitbit, or up to
+17,280 five-second samples in the demo data. Far fewer points draw the same
+line at chart width, so the series is thinned on the server before it is
+sent to the browser.
+
+Methods:
+    lttb    – largest-triangle-three-buckets: one point per bucket, the one
+              forming the largest triangle with its neighbours, which keeps
+              the visual shape including single-sample peaks
+    minmax  – the lowest and highest sample of each bucket, which keeps
+              every bucket's extremes exactly
+    none    – every sample
+
+Both keep the first and last samples and return points in time order.
+"""
+
+import numpy as np
+
+METHODS = ("lttb", "minmax", "none")
+
+
+def _bucket_edges(length, buckets):
+    """Start indices of `buckets` equal buckets over points 1 .. length-2, plus the end."""
+    return np.linspace(1, length - 1, buckets + 1).astype(np.int64)
+
+
+def lttb_indices(x, y, n) -> np.ndarray:
+    """Indices of the n points LTTB keeps from (x, y)."""
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    length = len(x)
+    if n >= length:
+        return np.arange(length)
+    if n < 3:
+        return np.array([0, length - 1][:max(n, 0)], dtype=np.int64)
+
+    edges = _bucket_edges(length, n - 2)
+    # the average point of each bucket, and of the last point as a final bucket
+    sums_x = np.add.reduceat(x[1:length - 1], edges[:-1] - 1)
+    sums_y = np.add.reduceat(y[1:length - 1], edges[:-1] - 1)
+    counts = np.diff(edges)
+    avg_x = np.append(sums_x / counts, x[-1])
+    avg_y = np.append(sums_y / counts, y[-1])
+
+    kept = np.empty(n, dtype=np.int64)
+    kept[0], kept[-1] = 0, length - 1
+    a = 0
+    # each choice depends on the point kept before it, so buckets are visited
+    # in order; the work inside a bucket is vectorised
+    for i in range(n - 2):
+        start, end = edges[i], edges[i + 1]
+        bx, by = x[start:end], y[start:end]
+        area = np.abs((x[a] - avg_x[i + 1]) * (by - y[a]) - (x[a] - bx) * (avg_y[i + 1] - y[a]))
+        a = start + int(np.argmax(area))
+        kept[i + 1] = a
+    return kept
+
+
+def minmax_indices(y, n) -> np.ndarray:
+    """Indices of the lowest and highest sample in each of (n - 2) // 2 buckets (at least one).
+
+    Fewer than n points come back when a bucket's extremes coincide.
+    """
+    y = np.asarray(y, dtype=np.float64)
+    length = len(y)
+    if n >= length:
+        return np.arange(length)
+    buckets = max((n - 2) // 2, 1)
+    edges = _bucket_edges(length, buckets)
+    bucket = np.repeat(np.arange(buckets), np.diff(edges))
+    inner = np.arange(1, length - 1)
+    # sorting by (bucket, value) puts each bucket's minimum first and maximum last
+    order = inner[np.lexsort((y[1:length - 1], bucket))]
+    starts = edges[:-1] - 1
+    ends = edges[1:] - 2
+    return np.unique(np.concatenate(([0], order[starts], order[ends], [length - 1])))
+
+
+def downsample_series(series: dict, n: int, method: str = "lttb") -> dict:
+    """An encode_series dict ({t0, dt, y}) reduced to at most n points."""
+    if method == "none" or len(series["y"]) <= n:
+        return series
+    dt = np.asarray(series["dt"], dtype=np.int64)
+    y = np.asarray(series["y"], dtype=np.int64)
+    if method == "lttb":
+        kept = lttb_indices(dt, y, n)
+    elif method == "minmax":
+        kept = minmax_indices(y, n)
+    else:
+        raise ValueError(f"Unknown downsampling method: {method}")
+    return {"t0": series["t0"], "dt": dt[kept].tolist(), "y": y[kept].tolist()}
@@ -0,0 +1,53 @@
+"""
+Request-scoped planner for a page's Fitbit calls.
+
+A route declares every resource it needs up front, then runs the plan
+once. The planner drops duplicate requests and runs the rest in parallel
+on a bounded, process-wide thread pool. Page latency becomes the slowest
+single call instead of the sum of all of them. Overlapping date windows
+are merged before they are planned (see src.warehouse.Warehouse.sync).
+
+Env vars:
+    FITBIT_FETCH_WORKERS  – threads shared by all plans (default 8)
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from src.utils import retrieve_data
+
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("FITBIT_FETCH_WORKERS", 8)),
+    thread_name_prefix="fitbit-fetch",
+)
+
+
+class FetchPlan:
+    """The Fitbit calls one page needs, deduplicated and fetched concurrently."""
+
+    def __init__(self, user_id, access_token, retrieve=retrieve_data):
+        self.user_id = user_id
+        self.access_token = access_token
+        self.retrieve = retrieve
+        self._requests = {}  # name -> (data_type, date, period, detail, version)
+
+    def add(self, name, data_type, date, period="", detail="", version=1) -> "FetchPlan":
+        """Declare a resource; its response is returned under `name` by run()."""
+        self._requests[name] = (data_type, str(date), str(period), detail, version)
+        return self
+
+    def __len__(self):
+        return len(self._requests)
+
+    def run(self) -> dict:
+        """Fetch everything in the plan; returns {name: response JSON}.
+
+        The first Fitbit error raised by any call is re-raised here.
+        """
+        unique = list(dict.fromkeys(self._requests.values()))
+        futures = {
+            request: _executor.submit(self.retrieve, request[0], self.user_id, self.access_token,
+                                      request[1], period=request[2], detail=request[3], version=request[4])
+            for request in unique
+        }
+        responses = {request: future.result() for request, future in futures.items()}
+        return {name: responses[request] for name, request in self._requests.items()}
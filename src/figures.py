@@ -0,0 +1,54 @@
+"""
+Charts on the dashboard pages.
+
+The dashboards are drawn in the browser by static/charts.js from compact
+chart data (see encode_series), which the pages embed and /api/* returns,
+so the server builds no Plotly figures.
+
+plotly.js (several MB) is written once to static/vendor/ under a name that
+carries the plotly version and served with a year-long cache lifetime, so
+browsers download it once per release.
+
+plotly itself is only imported to write the bundle, so app startup does
+not pay for it once the file exists.
+"""
+
+import os
+from importlib.metadata import version
+
+# Path of the bundle relative to the static folder; the version in the name
+# means a plotly upgrade gets a new URL instead of a stale cached copy
+PLOTLY_JS = f"vendor/plotly-{version('plotly')}.min.js"
+
+# Cache-Control for versioned static assets
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def install_plotly_js(static_folder: str) -> str:
+    """Write the plotly.js bundle shipped with the plotly package to the static folder."""
+    path = os.path.join(static_folder, PLOTLY_JS)
+    if not os.path.exists(path):
+        from plotly.offline import get_plotlyjs
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(get_plotlyjs())
+        os.replace(tmp, path)
+    return path
+
+
+def encode_series(times, values) -> dict:
+    """Columnar chart data: epoch seconds of the first point, offsets from it and integer values.
+
+    A day of minute-level heart rate is ~16 KB of JSON this way, against
+    ~44 KB as a Plotly figure with ISO timestamps.
+    """
+    import numpy as np
+    import pandas as pd
+    seconds = pd.to_datetime(pd.Series(times)).to_numpy("datetime64[s]").astype(np.int64)
+    t0 = int(seconds[0]) if len(seconds) else 0
+    return {
+        "t0": t0,
+        "dt": (seconds - t0).tolist(),
+        "y": np.rint(np.asarray(values, dtype=np.float64)).astype(np.int64).tolist(),
+    }
@@ -0,0 +1,133 @@
+"""
+Pooled HTTP client for the Fitbit Web API.
+
+One FitbitClient is shared by the whole process, so every route and the
+chat context reuse keep-alive connections instead of paying a TLS
+handshake per call. Requests have connect and read timeouts, 429 and 5xx
+responses are retried with jittered exponential backoff (honouring a short
+Retry-After), and failures surface as typed FitbitError subclasses rather
+than as an error body that breaks later with a KeyError.
+
+Env vars:
+    FITBIT_CONNECT_TIMEOUT  – seconds to establish a connection (default 3.05)
+    FITBIT_READ_TIMEOUT     – seconds to wait for a response (default 10)
+    FITBIT_MAX_RETRIES      – retries after the first attempt (default 2)
+"""
+
+import os
+import random
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+
+FITBIT_API_URL = "https://api.fitbit.com"
+
+
+class FitbitError(Exception):
+    """A Fitbit API request failed."""
+
+    def __init__(self, message, status=None, payload=None):
+        super().__init__(message)
+        self.status = status
+        self.payload = payload
+
+
+class FitbitAuthError(FitbitError):
+    """The access token is invalid, expired or lacks a required scope (401/403)."""
+
+
+class FitbitRateLimitError(FitbitError):
+    """The per-user rate limit is exhausted (429)."""
+
+    def __init__(self, message, status=429, payload=None, retry_after=None):
+        super().__init__(message, status, payload)
+        self.retry_after = retry_after
+
+
+class FitbitServerError(FitbitError):
+    """Fitbit returned a 5xx response or could not be reached."""
+
+
+def _retry_after(response):
+    try:
+        return float(response.headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+class FitbitClient:
+    """Thread-safe Fitbit API client with a keep-alive connection pool."""
+
+    def __init__(self, connect_timeout=3.05, read_timeout=10.0, max_retries=2,
+                 backoff=0.5, max_backoff=8.0, pool_size=10):
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+
+    def _delay(self, attempt, retry_after=None):
+        """Seconds to wait before the next attempt (full jitter)."""
+        if retry_after is not None:
+            return retry_after + random.uniform(0, self.backoff)
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def get(self, path: str, access_token: str) -> dict:
+        """GET a Web API path (e.g. '/1/user/-/profile.json') and return its JSON body."""
+        url = FITBIT_API_URL + path
+        headers = {"Authorization": "Bearer " + access_token}
+        for attempt in range(self.max_retries + 1):
+            last = attempt == self.max_retries
+            try:
+                response = self.session.get(url, headers=headers, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if last:
+                    raise FitbitServerError(f"Fitbit API unreachable: {e}") from e
+                time.sleep(self._delay(attempt))
+                continue
+
+            status = response.status_code
+            if status == 429 or status >= 500:
+                retry_after = _retry_after(response)
+                # A long Retry-After means the hourly quota is spent; waiting
+                # inside the request would only tie up the worker
+                if last or (retry_after is not None and retry_after > self.max_backoff):
+                    if status == 429:
+                        raise FitbitRateLimitError("Fitbit rate limit reached", payload=_json_or_none(response),
+                                                   retry_after=retry_after)
+                    raise FitbitServerError(f"Fitbit API error {status}", status, _json_or_none(response))
+                time.sleep(self._delay(attempt, retry_after))
+                continue
+            if status in (401, 403):
+                raise FitbitAuthError("Fitbit authorisation failed", status, _json_or_none(response))
+            if status >= 400:
+                raise FitbitError(f"Fitbit API error {status}", status, _json_or_none(response))
+            return response.json()
+
+
+def _json_or_none(response):
+    try:
+        return response.json()
+    except ValueError:
+        return None
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_fitbit_client() -> FitbitClient:
+    """Return the process-wide FitbitClient, creating it on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = FitbitClient(
+                    connect_timeout=float(os.environ.get("FITBIT_CONNECT_TIMEOUT", 3.05)),
+                    read_timeout=float(os.environ.get("FITBIT_READ_TIMEOUT", 10)),
+                    max_retries=int(os.environ.get("FITBIT_MAX_RETRIES", 2)),
+                )
+    return _client
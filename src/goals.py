@@ -0,0 +1,140 @@
+"""
+Per-process cache of users' step and sleep goals.
+
+The steps and sleep pages, the profile page and the chat context all need
+the user's goals. Goals are read from the `profile` table once per user,
+parsed (the 'Create one' placeholder becomes None) and then served from
+memory. /profile writes through the cache, so the worker that saved a goal
+sees it at once.
+
+Every goal write also increments a counter in the `goal_version` table.
+Each process compares that counter with the value it last saw at most
+every GOAL_VERSION_CHECK seconds, and drops its cached goals when another
+worker has changed any of them. A goal saved through one gunicorn worker
+therefore shows on the others within that interval.
+
+Env vars:
+    GOAL_VERSION_CHECK  – seconds between checks of the shared version (default 1; 0 checks every read)
+"""
+
+import os
+import threading
+import time
+from typing import NamedTuple, Optional
+from sqlalchemy import text
+
+GOAL_VERSION_CHECK = float(os.environ.get("GOAL_VERSION_CHECK", 1))
+
+# Stored in the profile table when a goal has not been set
+NO_GOAL = "Create one"
+
+
+def _parse(value, kind):
+    if value is None or value == NO_GOAL:
+        return None
+    return kind(value)
+
+
+class Goals(NamedTuple):
+    """A user's daily goals; None when not set."""
+
+    step: Optional[int]
+    sleep: Optional[float]  # hours
+
+    @classmethod
+    def from_row(cls, step_goal, sleep_goal):
+        return cls(_parse(step_goal, int), _parse(sleep_goal, float))
+
+    @property
+    def step_text(self) -> str:
+        """The step goal as stored and shown on the profile page."""
+        return NO_GOAL if self.step is None else str(self.step)
+
+    @property
+    def sleep_text(self) -> str:
+        return NO_GOAL if self.sleep is None else str(self.sleep)
+
+
+class GoalStore:
+    """Goals of every user, cached in memory over the profile table."""
+
+    def __init__(self, engine, check_interval=GOAL_VERSION_CHECK):
+        self.engine = engine
+        self.check_interval = check_interval
+        self._goals = {}  # username -> Goals
+        self._version = None  # goal_version last seen
+        self._checked_at = float("-inf")
+        self._lock = threading.Lock()
+
+    def create_table(self):
+        with self.engine.connect() as db:
+            db.execute(text("""CREATE TABLE IF NOT EXISTS goal_version(
+                               id INTEGER PRIMARY KEY,
+                               version INTEGER NOT NULL)"""))
+            db.execute(text("INSERT INTO goal_version (id, version) VALUES (0, 0) ON CONFLICT (id) DO NOTHING"))
+            db.commit()
+
+    def _check_version(self):
+        """Drop the cached goals if another process has changed any since they were read."""
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return
+        with self.engine.connect() as db:
+            version = db.execute(text("SELECT version FROM goal_version WHERE id = 0")).scalar()
+        with self._lock:
+            if version != self._version:
+                self._goals.clear()
+                self._version = version
+            self._checked_at = now
+
+    def get(self, username) -> Optional[Goals]:
+        """The user's goals, or None if they have no profile."""
+        self._check_version()
+        goals = self._goals.get(username)
+        if goals is None:
+            with self.engine.connect() as db:
+                row = db.execute(text("SELECT step_goal, sleep_goal FROM profile WHERE username = :u"),
+                                 {"u": username}).fetchone()
+            if row is None:
+                return None
+            goals = Goals.from_row(*row)
+            with self._lock:
+                self._goals[username] = goals
+        return goals
+
+    def set(self, username, goals: Goals):
+        """Save the user's goals and tell other processes they changed."""
+        with self.engine.connect() as db:
+            db.execute(text("UPDATE profile SET step_goal = :s, sleep_goal = :z WHERE username = :u"),
+                       {"s": goals.step_text, "z": goals.sleep_text, "u": username})
+            db.execute(text("UPDATE goal_version SET version = version + 1 WHERE id = 0"))
+            version = db.execute(text("SELECT version FROM goal_version WHERE id = 0")).scalar()
+            db.commit()
+        with self._lock:
+            if self._version is None or version != self._version + 1:
+                # someone else wrote in between; their changes are not cached here
+                self._goals.clear()
+            self._version = version
+            self._goals[username] = goals
+
+    def clear(self):
+        """Forget all cached goals (the next read loads them again)."""
+        with self._lock:
+            self._goals.clear()
+            self._version = None
+            self._checked_at = float("-inf")
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_goal_store(engine) -> GoalStore:
+    """Return the shared GoalStore for this database."""
+    key = str(engine.url)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = GoalStore(engine)
+            store.create_table()
+        return store
@@ -3,24 +3,48 @@ Build a health-data context string from the user's session
 to inject into the LLM system prompt.
 
 Handles both demo users (CSV data) and Fitbit-connected users (live API).
+
+The steps, sleep and heart-rate sections are built in parallel and each
+rendered section is cached per user and day, so follow-up chat messages
+reuse it instead of fetching and summarising the data again. Demo sections
+are also keyed by their table's version; live sections expire after
+CONTEXT_CACHE_TTL seconds so newly synced data shows up. Goals come from
+the goal cache on every call, so a goal change is reflected immediately.
+
+Env vars:
+    HEALTH_CONTEXT_TTL      – seconds a live section is reused (default FITBIT_CACHE_TTL)
+    HEALTH_CONTEXT_WORKERS  – threads shared by all context builds (default 6)
 """
 
 import datetime
-import numpy as np
+import os
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
-from sqlalchemy import text
+from src.cache import LRUCache
+from src.demo_store import get_demo_store
+from src.goals import get_goal_store
+from src.utils import FITBIT_CACHE_TTL, retrieve_data
+from src.warehouse import Warehouse
+
+CONTEXT_CACHE_TTL = int(os.environ.get("HEALTH_CONTEXT_TTL", FITBIT_CACHE_TTL))
+
+# (username, fitbit_id, section, day, data version) -> rendered section text
+context_cache = LRUCache(max_entries=1024)
+
+# Separate from the Fitbit fetch pool so a section may itself plan fetches
+# without waiting on threads held by its siblings
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("HEALTH_CONTEXT_WORKERS", 6)),
+    thread_name_prefix="health-context",
+)
 
 
 def _get_goals(engine, username: str) -> dict:
-    """Fetch step_goal and sleep_goal from the profile table."""
-    with engine.connect() as db:
-        row = db.execute(
-            text("SELECT step_goal, sleep_goal FROM profile WHERE username = :u"),
-            {"u": username},
-        ).fetchone()
+    """step_goal and sleep_goal as shown on the profile page."""
+    goals = get_goal_store(engine).get(username)
     return {
-        "step_goal": row[0] if row else "Not set",
-        "sleep_goal": row[1] if row else "Not set",
+        "step_goal": goals.step_text if goals else "Not set",
+        "sleep_goal": goals.sleep_text if goals else "Not set",
     }
 
 
@@ -37,113 +61,132 @@ def _last_week_with_data(df, date_col="Date"):
     return df[(df[date_col] >= start) & (df[date_col] <= last_date)]
 
 
+def _period(df):
+    """Human-readable date range of a df, or 'No data'."""
+    return f"{df['Date'].min().date()} to {df['Date'].max().date()}" if not df.empty else "No data"
+
+
 # ── Demo data (CSV or SQL) ───────────────────────────────────────────────────
 
-def _load_table(csv_path, sql_table, engine, db_path):
-    """Read from CSV if sqlite, otherwise from SQL table."""
-    if db_path.startswith("sqlite"):
-        return pd.read_csv(csv_path)
-    else:
-        return pd.read_sql_table(sql_table, con=engine)
+def _demo_rows(engine, db_path, name):
+    """All rows of a demo table for the first user, sorted by date."""
+    table = get_demo_store(engine, db_path).table(name)
+    return table.user_rows(table.first_id)
 
 
 def _demo_steps(engine, db_path):
-    df = _load_table("data/fitbit_apr/dailySteps_merged.csv", "daily_steps", engine, db_path)
-    df = df.rename(columns={"ActivityDay": "Date", "StepTotal": "Steps"})
-    df.Date = pd.to_datetime(df.Date)
-    uid = df.Id.unique()[0]
-    df = df[df.Id == uid].sort_values("Date")[["Date", "Steps"]]
+    df = _demo_rows(engine, db_path, "daily_steps")
+    df = df.rename(columns={"ActivityDay": "Date", "StepTotal": "Steps"})[["Date", "Steps"]]
     df = df[df["Steps"] > 0]
     df = _last_week_with_data(df)
-    period = f"{df['Date'].min().date()} to {df['Date'].max().date()}" if not df.empty else "No data"
-    return df, period
+    return df, _period(df)
 
 
 def _demo_sleep(engine, db_path):
-    df = _load_table("data/fitbit_apr/sleepDay_merged.csv", "daily_sleep", engine, db_path)
-    df = df.rename(columns={"SleepDay": "Date", "TotalMinutesAsleep": "Minutes Asleep"})
-    df.Date = pd.to_datetime(df.Date)
-    uid = df.Id.unique()[0]
-    df = df[df.Id == uid].sort_values("Date")[["Date", "Minutes Asleep"]]
+    df = _demo_rows(engine, db_path, "daily_sleep")
+    df = df.rename(columns={"SleepDay": "Date", "TotalMinutesAsleep": "Minutes Asleep"})[["Date", "Minutes Asleep"]]
     df = df[df["Minutes Asleep"] > 0]
     df = _last_week_with_data(df)
-    period = f"{df['Date'].min().date()} to {df['Date'].max().date()}" if not df.empty else "No data"
-    return df, period
+    return df, _period(df)
 
 
 def _demo_heart(engine, db_path):
-    df = _load_table("data/fitbit_apr/heartrate_seconds_merged.csv", "heart_data", engine, db_path)
-    df = df.rename(columns={"Value": "Heart Rate"})
-    df.Time = pd.to_datetime(df.Time)
-    uid = df.Id.unique()[0]
-    daily = (
-        df[df.Id == uid]
-        .set_index("Time")["Heart Rate"]
-        .resample("D")
-        .agg(["mean", "min", "max"])
-        .dropna()
-        .round(1)
-        .reset_index()
-    )
+    table = get_demo_store(engine, db_path).table("heart")
+    daily = table.daily_stats(table.first_id, "Value").round(1)
     daily.columns = ["Date", "Avg HR", "Min HR", "Max HR"]
     daily = _last_week_with_data(daily)
-    period = f"{daily['Date'].min().date()} to {daily['Date'].max().date()}" if not daily.empty else "No data"
-    return daily, period
+    return daily, _period(daily)
 
 
-# ── Live Fitbit data ─────────────────────────────────────────────────────────
+# ── Live Fitbit data (synced into the warehouse) ─────────────────────────────
+
+# Windows tried in order, in days: most users synced recently, so a month is
+# usually enough and a full year is only synced otherwise
+LOOKBACK = (30, 365)
 
-def _live_steps(fitbit_id, access_token, date, retrieve_data):
-    # Fetch 1 year, filter to non-zero, take the last week with data
-    j = retrieve_data("steps", fitbit_id, access_token, date, "1y")
-    df = pd.DataFrame(j.get("activities-steps", []))
-    if df.empty:
-        return pd.DataFrame(columns=["Date", "Steps"]), "No data"
-    df = df.rename(columns={"dateTime": "Date", "value": "Steps"})
-    df["Steps"] = pd.to_numeric(df["Steps"])
-    df = df[df["Steps"] > 0]
-    df = _last_week_with_data(df)
-    period = f"{df['Date'].min().date()} to {df['Date'].max().date()}" if not df.empty else "No data"
-    return df[["Date", "Steps"]], period
 
+def _recent_week(read, date):
+    """Last week with data, widening the window until it holds that week.
 
-def _live_sleep(fitbit_id, access_token, date, retrieve_data):
-    # Range-based: fetch 1 year of sleep in one call
+    `read(start)` syncs and returns a df with a Date column for [start, date].
+    """
     end = pd.Timestamp(date)
-    start = end - pd.Timedelta("365 days")
-    j = retrieve_data("sleep", fitbit_id, access_token, start.date(),
-                       period=str(end.date()), version=1.2)
-    records = j.get("sleep", [])
-    if not records:
-        return pd.DataFrame(columns=["Date", "Minutes Asleep"]), "No data"
-    rows = []
-    for r in records:
-        rows.append({
-            "Date": r.get("dateOfSleep", r.get("startTime", "")[:10]),
-            "Minutes Asleep": r.get("minutesAsleep", 0),
-        })
-    df = pd.DataFrame(rows)
-    df = df[df["Minutes Asleep"] > 0]
-    # Aggregate by date in case of multiple sleep records per day
-    df["Date"] = pd.to_datetime(df["Date"])
-    df = df.groupby("Date", as_index=False)["Minutes Asleep"].sum()
-    df = _last_week_with_data(df)
-    period = f"{df['Date'].min().date()} to {df['Date'].max().date()}" if not df.empty else "No data"
-    return df, period
-
-
-def _live_heart(fitbit_id, access_token, date, retrieve_data):
-    # Fetch 1 year, keep only days with resting HR, take last week
-    j = retrieve_data("heart", fitbit_id, access_token, date, period="1y")
-    rows = []
-    for day in j.get("activities-heart", []):
-        resting = day.get("value", {}).get("restingHeartRate", None)
-        if resting:
-            rows.append({"Date": day["dateTime"], "Resting HR": resting})
-    df = pd.DataFrame(rows) if rows else pd.DataFrame(columns=["Date", "Resting HR"])
-    df = _last_week_with_data(df)
-    period = f"{df['Date'].min().date()} to {df['Date'].max().date()}" if not df.empty else "No data"
-    return df, period
+    for days in LOOKBACK:
+        start = end - pd.Timedelta(days=days - 1)
+        df = _last_week_with_data(read(start.date()))
+        if not df.empty and df["Date"].min() >= start:
+            break
+    return df
+
+
+def _live_steps(engine, fitbit_id, access_token, date, retrieve_data):
+    warehouse = Warehouse(engine)
+
+    def read(start):
+        warehouse.sync(fitbit_id, access_token, [("steps", start, date)], retrieve=retrieve_data)
+        df = warehouse.daily_steps(fitbit_id, start, date)
+        return df[df["Steps"] > 0]
+
+    df = _recent_week(read, date)
+    return df, _period(df)
+
+
+def _live_sleep(engine, fitbit_id, access_token, date, retrieve_data):
+    warehouse = Warehouse(engine)
+
+    def read(start):
+        # Range-based: one call per 100 nights; all logs of a night are summed
+        warehouse.sync(fitbit_id, access_token, [("sleep", start, date)], retrieve=retrieve_data)
+        df = warehouse.sleep_minutes(fitbit_id, start, date)
+        return df[df["Minutes Asleep"] > 0]
+
+    df = _recent_week(read, date)
+    return df, _period(df)
+
+
+def _live_heart(engine, fitbit_id, access_token, date, retrieve_data):
+    warehouse = Warehouse(engine)
+
+    def read(start):
+        # Keep only days with resting HR
+        warehouse.sync(fitbit_id, access_token, [("heart", start, date)], retrieve=retrieve_data)
+        df = warehouse.resting_hr(fitbit_id, start, date)
+        return df[df["Resting HR"].notna()]
+
+    df = _recent_week(read, date)
+    return df, _period(df)
+
+
+# ── Sections ─────────────────────────────────────────────────────────────────
+
+# (title, demo table, demo builder, live builder)
+SECTIONS = (
+    ("Steps", "daily_steps", _demo_steps, _live_steps),
+    ("Sleep", "daily_sleep", _demo_sleep, _live_sleep),
+    ("Heart Rate", "heart", _demo_heart, _live_heart),
+)
+
+
+def _render_section(title, build, *args):
+    """Render one section; returns (text, ok) and never raises."""
+    try:
+        df, period = build(*args)
+    except Exception:
+        return f"\n### {title}\nData unavailable.", False
+    # CSV takes about half the tokens of a space-padded table
+    rows = df.to_csv(index=False, date_format="%Y-%m-%d", float_format="%g").strip()
+    return f"\n### {title} (data from {period})\n" + rows, True
+
+
+def _cached_section(key, ttl, title, build, *args) -> str:
+    """Return a rendered section from the cache, building and storing it on a miss."""
+    cached = context_cache.get(key)
+    if cached is not None:
+        return cached
+    rendered, ok = _render_section(title, build, *args)
+    if ok:  # retry failures on the next message
+        context_cache.set(key, rendered, ttl=ttl, size=len(rendered))
+    return rendered
 
 
 # ── Public API ───────────────────────────────────────────────────────────────
@@ -170,37 +213,17 @@ def build_health_context(session, engine, db_path, retrieve_data_fn=None) -> str
         + (" hours" if goals["sleep_goal"] not in ("Not set", "Create one") else ""),
     ]
 
-    # Steps
-    try:
-        if is_demo:
-            df, period = _demo_steps(engine, db_path)
-        else:
-            df, period = _live_steps(fitbit_id, access_token, today, retrieve_data_fn)
-        parts.append(f"\n### Steps (data from {period})")
-        parts.append(df.to_string(index=False))
-    except Exception:
-        parts.append("\n### Steps\nData unavailable.")
-
-    # Sleep
-    try:
+    futures = []
+    for title, table, demo_build, live_build in SECTIONS:
         if is_demo:
-            df, period = _demo_sleep(engine, db_path)
+            version = get_demo_store(engine, db_path).version(table)
+            key = (username, fitbit_id, title, today, version)
+            args = (key, None, title, demo_build, engine, db_path)
         else:
-            df, period = _live_sleep(fitbit_id, access_token, today, retrieve_data_fn)
-        parts.append(f"\n### Sleep (data from {period})")
-        parts.append(df.to_string(index=False))
-    except Exception:
-        parts.append("\n### Sleep\nData unavailable.")
-
-    # Heart rate
-    try:
-        if is_demo:
-            df, period = _demo_heart(engine, db_path)
-        else:
-            df, period = _live_heart(fitbit_id, access_token, today, retrieve_data_fn)
-        parts.append(f"\n### Heart Rate (data from {period})")
-        parts.append(df.to_string(index=False))
-    except Exception:
-        parts.append("\n### Heart Rate\nData unavailable.")
+            key = (username, fitbit_id, title, today, None)
+            args = (key, CONTEXT_CACHE_TTL, title, live_build,
+                    engine, fitbit_id, access_token, today, retrieve_data_fn or retrieve_data)
+        futures.append(_executor.submit(_cached_section, *args))
+    parts.extend(future.result() for future in futures)
 
     return "\n".join(parts)
@@ -4,13 +4,36 @@ LLM service layer using LangChain with GitHub Models API.
 GitHub Models exposes an OpenAI-compatible endpoint, so we use
 langchain-openai's ChatOpenAI with a custom base_url.
 
+One ChatOpenAI client is shared by the whole process and keeps its HTTP
+connections alive, so a chat turn does not pay for client construction or
+a TLS handshake. It is rebuilt only when LLM_MODEL or GITHUB_TOKEN change.
+
 Required env vars:
     GITHUB_TOKEN  – GitHub personal access token with Models access
     LLM_MODEL     – model name (default: gpt-4o-mini)
+
+Answers can be cached (CHAT_ANSWER_TTL) by the normalised question, a
+fingerprint of the health context (which includes the user, today's date,
+goals and data) and the last few messages before the question. Turns that
+asked the same question just before are left out of that window, so a
+repeated question is answered without a model call, while a follow-up such
+as "why?" is only reused after the same conversation.
+
+Optional env vars:
+    LLM_TIMEOUT         – seconds to wait for a response (default 30)
+    LLM_MAX_RETRIES     – retries of failed or rate-limited calls (default 2)
+    LLM_POOL_SIZE       – keep-alive connections to the API (default 10)
+    CHAT_ANSWER_TTL     – seconds an answer is reused; 0 disables the cache (default 0)
+    CHAT_ANSWER_WINDOW  – recent messages that are part of the cache key (default 2)
 """
 
+import hashlib
+import json
 import os
-from langchain_openai import ChatOpenAI
+import re
+import threading
+from src.cache import LRUCache
+from src.prompt_builder import Prompt, build_prompt
 
 GITHUB_MODELS_URL = "https://models.inference.ai.azure.com"
 DEFAULT_MODEL = "gpt-4o-mini"
@@ -28,30 +51,108 @@ SYSTEM_PROMPT = (
 )
 
 
-def get_llm() -> ChatOpenAI:
-    """Return a ChatOpenAI instance pointed at GitHub Models."""
-    token = os.environ.get("GITHUB_TOKEN", "")
-    model = os.environ.get("LLM_MODEL", DEFAULT_MODEL)
-    if not token:
-        raise EnvironmentError(
-            "GITHUB_TOKEN is not set. Add it to your .env or environment variables."
-        )
+_llm = None
+_llm_key = None
+_http_client = None  # the connection pool of _llm
+_llm_lock = threading.Lock()
+
+
+def _build_llm(model: str, token: str):
+    """(ChatOpenAI, its httpx.Client) for a model and token."""
+    # langchain_openai takes over a second to import; only chat needs it
+    import httpx
+    from langchain_openai import ChatOpenAI
+
+    timeout = float(os.environ.get("LLM_TIMEOUT", 30))
+    pool_size = int(os.environ.get("LLM_POOL_SIZE", 10))
+    http_client = httpx.Client(
+        timeout=httpx.Timeout(timeout, connect=5.0),
+        limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+    )
     return ChatOpenAI(
         model=model,
         api_key=token,
         base_url=GITHUB_MODELS_URL,
         temperature=0.7,
         max_tokens=1024,
-    )
+        timeout=timeout,
+        max_retries=int(os.environ.get("LLM_MAX_RETRIES", 2)),
+        http_client=http_client,
+    ), http_client
+
+
+def get_llm():
+    """Return the process-wide ChatOpenAI instance pointed at GitHub Models."""
+    global _llm, _llm_key, _http_client
+    token = os.environ.get("GITHUB_TOKEN", "")
+    model = os.environ.get("LLM_MODEL", DEFAULT_MODEL)
+    if not token:
+        raise EnvironmentError(
+            "GITHUB_TOKEN is not set. Add it to your .env or environment variables."
+        )
+    key = (model, token)
+    if _llm_key != key:
+        with _llm_lock:
+            if _llm_key != key:
+                old_client = _http_client
+                _llm, _http_client = _build_llm(model, token)
+                _llm_key = key
+                if old_client is not None:
+                    old_client.close()  # release the replaced client's connections
+    return _llm
+
+
+CHAT_ANSWER_TTL = int(os.environ.get("CHAT_ANSWER_TTL", 0))
+CHAT_ANSWER_WINDOW = int(os.environ.get("CHAT_ANSWER_WINDOW", 2))
+
+# answer key -> answer text
+answer_cache = LRUCache(max_entries=1024, max_bytes=8 * 1024 * 1024)
+
+
+def _normalise(question: str) -> str:
+    return re.sub(r"\s+", " ", question).strip().lower().rstrip("?!. ")
+
+
+def _history_window(chat_history: list[dict], question: str) -> list:
+    """The last CHAT_ANSWER_WINDOW messages, without trailing turns that asked `question`."""
+    history = list(chat_history)
+    while len(history) >= 2 and history[-2]["role"] == "user" and _normalise(history[-2]["content"]) == question:
+        history = history[:-2]
+    return [[m["role"], m["content"]] for m in history[-CHAT_ANSWER_WINDOW:]] if CHAT_ANSWER_WINDOW > 0 else []
+
+
+def answer_key(chat_history: list[dict], user_message: str, health_context: str):
+    """Cache key of an answer, or None when the answer cache is disabled."""
+    if CHAT_ANSWER_TTL <= 0:
+        return None
+    question = _normalise(user_message)
+    payload = json.dumps([question, _history_window(chat_history, question)])
+    fingerprint = hashlib.sha256(health_context.encode()).hexdigest()
+    return fingerprint, hashlib.sha256(payload.encode()).hexdigest()
+
+
+def cached_answer(key):
+    """The stored answer for a key, or None."""
+    return answer_cache.get(key) if key is not None else None
+
+
+def store_answer(key, answer: str):
+    if key is not None and answer:
+        answer_cache.set(key, answer, ttl=CHAT_ANSWER_TTL, size=len(answer))
+
+
+def chat_prompt(chat_history: list[dict], user_message: str, health_context: str = "") -> Prompt:
+    """The messages for a chat turn, fitted to the token budget (see src.prompt_builder)."""
+    return build_prompt(SYSTEM_PROMPT, chat_history, user_message, health_context)
+
+
+def chat(prompt: Prompt) -> str:
+    """Send a prompt to the LLM and return the response text."""
+    return get_llm().invoke(prompt.messages).content
 
 
-def chat(chat_history: list[dict], user_message: str, health_context: str = "") -> str:
-    """Send a message to the LLM and return the response text."""
-    llm = get_llm()
-    system = SYSTEM_PROMPT
-    if health_context:
-        system += "\n\n---\n\n" + health_context
-    messages = [("system", system)]
-    messages += [(msg["role"], msg["content"]) for msg in chat_history]
-    messages.append(("user", user_message))
-    return llm.invoke(messages).content
+def stream_chat(prompt: Prompt):
+    """Send a prompt to the LLM and yield the response text as it is generated."""
+    for chunk in get_llm().stream(prompt.messages):
+        if chunk.content:
+            yield chunk.content
@@ -0,0 +1,105 @@
+"""
+Password hashing on a small, bounded process pool.
+
+Hashing and checking a password runs a deliberately slow KDF (scrypt by
+default). Run inline, a burst of logins holds every request thread of the
+worker and stalls all other routes. Here the KDF runs in
+PASSWORD_WORKERS separate processes instead. At most PASSWORD_QUEUE more
+requests may wait for them. Beyond that, PasswordPoolBusy is raised at
+once, so the route can answer 503 instead of piling up work it cannot
+finish in time.
+
+PASSWORD_METHOD sets the KDF and its cost in werkzeug's format, e.g.
+"scrypt:32768:8:1" or "pbkdf2:sha256:600000". Hashes made with other
+settings still verify. needs_rehash() reports them, so login can store a
+new hash while it has the plain password.
+
+Env vars:
+    PASSWORD_METHOD   – werkzeug hash method and cost (default scrypt:32768:8:1)
+    PASSWORD_WORKERS  – hashing processes; 0 hashes in the request thread (default 2)
+    PASSWORD_QUEUE    – requests that may wait for a free process (default 8)
+    PASSWORD_TIMEOUT  – seconds to wait for a result (default 10)
+"""
+
+import functools
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from werkzeug.security import check_password_hash, generate_password_hash
+
+PASSWORD_METHOD = os.environ.get("PASSWORD_METHOD", "scrypt:32768:8:1")
+PASSWORD_WORKERS = int(os.environ.get("PASSWORD_WORKERS", 2))
+PASSWORD_QUEUE = int(os.environ.get("PASSWORD_QUEUE", 8))
+PASSWORD_TIMEOUT = float(os.environ.get("PASSWORD_TIMEOUT", 10))
+
+
+class PasswordPoolBusy(Exception):
+    """Every hashing process is busy and the wait queue is full."""
+
+
+_pool = None
+_slots = None  # running + waiting jobs still allowed
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool, _slots
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _slots = threading.BoundedSemaphore(PASSWORD_WORKERS + PASSWORD_QUEUE)
+                # spawn: forking a worker that already runs threads (prefetch, demo preload) is
+                # unsafe. Spawned (and forkserver) processes re-run a script's main module as
+                # __mp_main__, so app.py skips its setup there (see init_app)
+                _pool = ProcessPoolExecutor(PASSWORD_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool, _slots
+
+
+def _run(fn, *args):
+    if PASSWORD_WORKERS <= 0:
+        return fn(*args)
+    pool, slots = _get_pool()
+    if not slots.acquire(blocking=False):
+        raise PasswordPoolBusy("Too many sign-ins at once")
+    try:
+        future = pool.submit(fn, *args)
+    except BaseException:
+        slots.release()
+        raise
+    future.add_done_callback(lambda _: slots.release())
+    try:
+        return future.result(timeout=PASSWORD_TIMEOUT)
+    except TimeoutError:
+        future.cancel()
+        raise PasswordPoolBusy("Password check timed out")
+
+
+def hash_password(password: str) -> str:
+    """A new hash of password with PASSWORD_METHOD."""
+    return _run(generate_password_hash, password, PASSWORD_METHOD)
+
+
+def verify_password(pwhash: str, password: str) -> bool:
+    """Whether password matches pwhash, whatever method made it."""
+    return _run(check_password_hash, pwhash, password)
+
+
+@functools.lru_cache(maxsize=None)
+def _method_prefix(method: str) -> str:
+    # werkzeug fills in default parameters, e.g. "scrypt" -> "scrypt:32768:8:1"
+    return generate_password_hash("", method, salt_length=1).split("$", 1)[0]
+
+
+def needs_rehash(pwhash: str) -> bool:
+    """Whether pwhash was made with a method or cost other than PASSWORD_METHOD."""
+    return pwhash.split("$", 1)[0] != _method_prefix(PASSWORD_METHOD)
+
+
+def shutdown():
+    """Stop the hashing processes; the next call starts new ones."""
+    global _pool, _slots
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+        _pool = _slots = None
@@ -0,0 +1,152 @@
+"""
+Background refresh of active Fitbit users' current-day data.
+
+Every request from a connected user marks them active. A daemon thread
+syncs today's steps, heart rate and sleep for users seen within the last
+PREFETCH_ACTIVE_WINDOW seconds every PREFETCH_INTERVAL seconds, so the
+first dashboard view of the day finds the warehouse already warm instead
+of waiting on the Fitbit API inside the request.
+
+Prefetching spends the same per-user Fitbit quota (150 calls an hour) as
+page views, so each user gets at most PREFETCH_HOURLY_BUDGET background
+calls an hour, a user who is rate limited is left alone until their
+Retry-After has passed, and a user whose token is rejected is dropped.
+
+The budget is a per-process limit: it is kept in memory, counts only this
+process's background calls (not page views), and each gunicorn worker that
+has seen a user keeps its own. Size PREFETCH_HOURLY_BUDGET so that the
+number of workers times the budget, plus page views, stays under quota.
+
+Env vars:
+    PREFETCH_INTERVAL       – seconds between runs; 0 disables (default 300)
+    PREFETCH_ACTIVE_WINDOW  – seconds a user stays active after a request (default 1800)
+    PREFETCH_HOURLY_BUDGET  – background Fitbit calls per user per hour (default 30)
+"""
+
+import datetime
+import logging
+import os
+import threading
+import time
+from collections import deque
+from src.fitbit_client import FitbitAuthError, FitbitError, FitbitRateLimitError
+from src.utils import FINALIZE_LAG_DAYS, retrieve_data
+
+log = logging.getLogger(__name__)
+
+PREFETCH_INTERVAL = int(os.environ.get("PREFETCH_INTERVAL", 300))
+PREFETCH_ACTIVE_WINDOW = int(os.environ.get("PREFETCH_ACTIVE_WINDOW", 1800))
+PREFETCH_HOURLY_BUDGET = int(os.environ.get("PREFETCH_HOURLY_BUDGET", 30))
+
+
+def current_day_windows(today=None) -> list:
+    """Warehouse windows that may still change: today's series and the unfinalized days."""
+    today = today or datetime.date.today()
+    recent = today - datetime.timedelta(days=FINALIZE_LAG_DAYS)
+    return [
+        ("steps", recent, today),
+        ("steps-intraday", today, today),
+        ("heart", recent, today),
+        ("heart-intraday", today, today),
+        ("sleep", recent, today),
+    ]
+
+
+class _ActiveUser:
+    def __init__(self, access_token, seen_at):
+        self.access_token = access_token
+        self.seen_at = seen_at
+        self.calls = deque()  # monotonic times of background calls in the last hour
+        self.paused_until = 0.0
+
+
+class PrefetchScheduler:
+    """Keeps today's warehouse data fresh for recently active users."""
+
+    def __init__(self, warehouse, interval=PREFETCH_INTERVAL, active_window=PREFETCH_ACTIVE_WINDOW,
+                 hourly_budget=PREFETCH_HOURLY_BUDGET, retrieve=retrieve_data):
+        self.warehouse = warehouse
+        self.interval = interval
+        self.active_window = active_window
+        self.hourly_budget = hourly_budget
+        self.retrieve = retrieve
+        self._users = {}  # fitbit_id -> _ActiveUser
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def touch(self, fitbit_id, access_token):
+        """Mark a connected user as active (called on each of their requests)."""
+        now = time.monotonic()
+        with self._lock:
+            user = self._users.get(fitbit_id)
+            if user is None:
+                self._users[fitbit_id] = _ActiveUser(access_token, now)
+            else:
+                user.access_token = access_token
+                user.seen_at = now
+
+    def active_users(self) -> list:
+        """Fitbit IDs seen within the active window; older users are forgotten."""
+        cutoff = time.monotonic() - self.active_window
+        with self._lock:
+            for fitbit_id in [f for f, u in self._users.items() if u.seen_at < cutoff]:
+                del self._users[fitbit_id]
+            return list(self._users)
+
+    def _budgeted_retrieve(self, user):
+        """retrieve_data that records each call against the user's hourly budget."""
+        def retrieve(*args, **kwargs):
+            with self._lock:
+                user.calls.append(time.monotonic())
+            return self.retrieve(*args, **kwargs)
+        return retrieve
+
+    def _has_budget(self, user, needed) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            while user.calls and user.calls[0] <= now - 3600:
+                user.calls.popleft()
+            return now >= user.paused_until and len(user.calls) + needed <= self.hourly_budget
+
+    def run_once(self, today=None):
+        """Refresh today's data for every active user that has quota to spare."""
+        windows = current_day_windows(today)
+        active = self.active_users()
+        with self._lock:  # request threads update _users concurrently
+            users = [(f, self._users[f], self._users[f].access_token) for f in active if f in self._users]
+        for fitbit_id, user, access_token in users:
+            if not self._has_budget(user, len(windows)):
+                continue
+            try:
+                self.warehouse.sync(fitbit_id, access_token, windows,
+                                    retrieve=self._budgeted_retrieve(user))
+            except FitbitAuthError:
+                # the token expired; the user's next page view re-authenticates
+                with self._lock:
+                    self._users.pop(fitbit_id, None)
+            except FitbitRateLimitError as e:
+                with self._lock:
+                    user.paused_until = time.monotonic() + (e.retry_after or 3600)
+            except FitbitError as e:
+                log.warning("Prefetch for %s failed: %s", fitbit_id, e)
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception:
+                log.exception("Prefetch run failed")
+
+    def start(self):
+        """Run in a daemon thread until stop(); does nothing if the interval is 0."""
+        if self.interval <= 0 or (self._thread and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="fitbit-prefetch", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
@@ -0,0 +1,153 @@
+"""
+Token-budgeted assembly of the chat prompt.
+
+The system prompt, the user's goals and the new message are always sent.
+The health data sections and the conversation history each get a fixed
+share of tokens on top of that. Sections are kept in order while they fit.
+History is kept newest-first. Turns that no longer fit are replaced by a
+one-line summary of the questions they asked, so the prompt (and so LLM
+latency and cost) stays bounded however long the conversation gets.
+
+Tokens are counted with tiktoken when its encoding can be loaded, and
+estimated at four characters per token otherwise.
+
+Env vars:
+    CHAT_METRICS_TOKENS  – tokens for health data sections (default 1200)
+    CHAT_HISTORY_TOKENS  – tokens for earlier turns (default 1500)
+    CHAT_MESSAGE_TOKENS  – longest user message sent, longer ones are cut (default 500)
+"""
+
+import functools
+import logging
+import os
+
+log = logging.getLogger(__name__)
+
+CHAT_METRICS_TOKENS = int(os.environ.get("CHAT_METRICS_TOKENS", 1200))
+CHAT_HISTORY_TOKENS = int(os.environ.get("CHAT_HISTORY_TOKENS", 1500))
+CHAT_MESSAGE_TOKENS = int(os.environ.get("CHAT_MESSAGE_TOKENS", 500))
+
+# Tokens the chat format adds around each message
+MESSAGE_OVERHEAD = 4
+
+# Health context sections start with this heading marker (see health_context)
+SECTION_MARKER = "\n### "
+
+
+@functools.lru_cache(maxsize=1)
+def _encoding():
+    """The tiktoken encoding for the chat model, or None if it is unavailable."""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("o200k_base")
+    except Exception as e:  # not installed, or the encoding file cannot be downloaded
+        log.info("Estimating prompt tokens, tiktoken unavailable: %s", e)
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Number of tokens in text."""
+    encoding = _encoding()
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def clip(text: str, budget: int) -> str:
+    """text cut down to at most `budget` tokens."""
+    if count_tokens(text) <= budget:
+        return text
+    if budget <= 1:
+        return ""
+    # leave a token for the ellipsis
+    encoding = _encoding()
+    if encoding is None:
+        return text[:(budget - 1) * 4].rstrip() + "…"
+    return encoding.decode(encoding.encode(text, disallowed_special=())[:budget - 1]).rstrip() + "…"
+
+
+def _split_context(health_context: str):
+    """(goals header, [data sections]) of a health context string."""
+    header, *sections = health_context.split(SECTION_MARKER)
+    return header, [SECTION_MARKER + section for section in sections]
+
+
+def _fit_sections(sections, budget):
+    """Sections in order while they fit; returns (text, tokens)."""
+    kept, used = [], 0
+    for section in sections:
+        tokens = count_tokens(section)
+        if used + tokens > budget:
+            kept.append(f"{SECTION_MARKER}(further data omitted)")
+            break
+        kept.append(section)
+        used += tokens
+    return "".join(kept), used
+
+
+def _summary(turns) -> str:
+    questions = [clip(msg["content"], 20) for msg in turns if msg["role"] == "user"]
+    return "Earlier in this conversation the user asked: " + "; ".join(questions)
+
+
+def _fit_history(chat_history, budget):
+    """The most recent turns that fit, preceded by a summary of the dropped ones."""
+    kept, used, start = [], 0, len(chat_history)
+    while start > 0:
+        msg = chat_history[start - 1]
+        tokens = count_tokens(msg["content"]) + MESSAGE_OVERHEAD
+        if used + tokens > budget:
+            break
+        kept.append((msg["role"], msg["content"]))
+        used += tokens
+        start -= 1
+    if start == 0:
+        return kept[::-1], used
+
+    # the summary gets at most a quarter of the budget, taken from the oldest kept turns
+    summary_budget = budget // 4
+    while kept and used + summary_budget > budget:
+        _, content = kept.pop()
+        used -= count_tokens(content) + MESSAGE_OVERHEAD
+        start += 1
+    summary = clip(_summary(chat_history[:start]), min(summary_budget, budget - used) - MESSAGE_OVERHEAD)
+    if summary:
+        kept.append(("system", summary))
+        used += count_tokens(summary) + MESSAGE_OVERHEAD
+    return kept[::-1], used
+
+
+class Prompt:
+    """Chat messages ready for the LLM and the tokens each part uses."""
+
+    def __init__(self, messages, tokens):
+        self.messages = messages
+        self.tokens = tokens  # part -> tokens
+
+    @property
+    def total_tokens(self) -> int:
+        return sum(self.tokens.values())
+
+
+def build_prompt(system_prompt: str, chat_history: list[dict], user_message: str,
+                 health_context: str = "", metrics_budget=None, history_budget=None) -> Prompt:
+    """Assemble the chat messages within the token budget."""
+    metrics_budget = CHAT_METRICS_TOKENS if metrics_budget is None else metrics_budget
+    history_budget = CHAT_HISTORY_TOKENS if history_budget is None else history_budget
+
+    system, tokens = system_prompt, {}
+    tokens["system"] = count_tokens(system_prompt) + MESSAGE_OVERHEAD
+    if health_context:
+        goals, sections = _split_context(health_context)
+        metrics, tokens["metrics"] = _fit_sections(sections, metrics_budget)
+        system += "\n\n---\n\n" + goals + metrics
+        tokens["goals"] = count_tokens(goals) + 2  # and the separator
+
+    history, tokens["history"] = _fit_history(chat_history, history_budget)
+    user_message = clip(user_message, CHAT_MESSAGE_TOKENS)
+    tokens["message"] = count_tokens(user_message) + MESSAGE_OVERHEAD
+
+    messages = [("system", system)] + history + [("user", user_message)]
+    prompt = Prompt(messages, tokens)
+    log.info("Chat prompt: %d tokens %s", prompt.total_tokens, tokens)
+    return prompt
@@ -0,0 +1,195 @@
+"""
+Server-side sessions kept in a SQL table or in process memory.
+
+The cookie carries only a random session ID. At the end of a request a
+modified session is serialised and written back only if it differs from
+what was loaded, so the many requests that just read the session (page
+views, chart API calls) do no serialisation or storage writes. Stored
+sessions expire after PERMANENT_SESSION_LIFETIME; an unchanged session is
+rewritten only once half of that has passed, to push its expiry back.
+
+Backends (SESSION_BACKEND):
+    sql         – a `sessions` table in the app database (default); shared by
+                  every worker and node that uses the database
+    memory      – an in-process LRU; fastest, but each worker process has its
+                  own sessions, so only for single-worker deployments
+    filesystem  – Flask-Session's files in flask_session/ (previous behaviour)
+
+Env vars:
+    SESSION_BACKEND      – sql, memory or filesystem (default sql)
+    SESSION_MEMORY_SIZE  – sessions kept by the memory backend (default 10000)
+"""
+
+import datetime
+import os
+import secrets
+import time
+from flask.json.tag import JSONTag, TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from sqlalchemy import text
+from werkzeug.datastructures import CallbackDict
+from src.cache import LRUCache
+
+SESSION_BACKEND = os.environ.get("SESSION_BACKEND", "sql")
+SESSION_MEMORY_SIZE = int(os.environ.get("SESSION_MEMORY_SIZE", 10000))
+
+# Expired rows are deleted on every this many writes
+_PURGE_EVERY = 100
+
+
+class _TagDate(JSONTag):
+    """Dates (e.g. the heart-rate page's chosen day); datetimes keep Flask's own tag."""
+
+    key = " date"
+
+    def check(self, value):
+        return isinstance(value, datetime.date) and not isinstance(value, datetime.datetime)
+
+    def to_json(self, value):
+        return value.isoformat()
+
+    def to_python(self, value):
+        return datetime.date.fromisoformat(value)
+
+
+def _serializer():
+    serializer = TaggedJSONSerializer()
+    serializer.register(_TagDate, index=0)
+    return serializer
+
+
+class StoredSession(CallbackDict, SessionMixin):
+    """A session whose data lives in a SessionStore under `sid`."""
+
+    def __init__(self, initial=None, sid=None, loaded=None, expires_at=None):
+        def on_update(self):
+            self.modified = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = loaded is None
+        self.loaded = loaded  # serialised data as read from the store
+        self.expires_at = expires_at
+        self.modified = False
+
+
+class SQLSessionStore:
+    """Sessions in a table of the app database."""
+
+    def __init__(self, engine, table="sessions"):
+        self.engine = engine
+        self.table = table
+        self._writes = 0
+
+    def create_table(self):
+        with self.engine.connect() as db:
+            db.execute(text(f"""CREATE TABLE IF NOT EXISTS {self.table}(
+                                sid TEXT PRIMARY KEY,
+                                data TEXT NOT NULL,
+                                expires_at REAL NOT NULL)"""))
+            db.commit()
+
+    def load(self, sid):
+        """(data, expires_at) of a live session, or None."""
+        with self.engine.connect() as db:
+            row = db.execute(text(f"SELECT data, expires_at FROM {self.table} WHERE sid = :sid AND expires_at > :now"),
+                             {"sid": sid, "now": time.time()}).fetchone()
+        return tuple(row) if row else None
+
+    def save(self, sid, data, expires_at):
+        self._writes += 1
+        with self.engine.connect() as db:
+            db.execute(text(f"""INSERT INTO {self.table} (sid, data, expires_at) VALUES (:sid, :data, :exp)
+                                ON CONFLICT (sid) DO UPDATE SET data = excluded.data, expires_at = excluded.expires_at"""),
+                       {"sid": sid, "data": data, "exp": expires_at})
+            if self._writes % _PURGE_EVERY == 0:
+                db.execute(text(f"DELETE FROM {self.table} WHERE expires_at <= :now"), {"now": time.time()})
+            db.commit()
+
+    def delete(self, sid):
+        with self.engine.connect() as db:
+            db.execute(text(f"DELETE FROM {self.table} WHERE sid = :sid"), {"sid": sid})
+            db.commit()
+
+    def clear(self):
+        with self.engine.connect() as db:
+            db.execute(text(f"DELETE FROM {self.table}"))
+            db.commit()
+
+
+class MemorySessionStore:
+    """Sessions in an in-process LRU cache."""
+
+    def __init__(self, max_entries=SESSION_MEMORY_SIZE):
+        self._cache = LRUCache(max_entries=max_entries)
+
+    def load(self, sid):
+        return self._cache.get(sid)
+
+    def save(self, sid, data, expires_at):
+        self._cache.set(sid, (data, expires_at), ttl=expires_at - time.time())
+
+    def delete(self, sid):
+        self._cache.invalidate(lambda key: key == sid)
+
+    def clear(self):
+        self._cache.clear()
+
+
+class StoredSessionInterface(SessionInterface):
+    """Flask session interface over a SQLSessionStore or MemorySessionStore."""
+
+    serializer = _serializer()
+
+    def __init__(self, store):
+        self.store = store
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        stored = self.store.load(sid) if sid else None
+        if stored is None:
+            return StoredSession(sid=secrets.token_urlsafe(32))
+        data, expires_at = stored
+        return StoredSession(self.serializer.loads(data), sid=sid, loaded=data, expires_at=expires_at)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        if not session:
+            if not session.new:
+                self.store.delete(session.sid)
+                session.new, session.loaded = True, None
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        now = time.time()
+        lifetime = app.permanent_session_lifetime.total_seconds()
+        stale = session.expires_at is None or session.expires_at - now < lifetime / 2
+        # As with Flask's cookie sessions, in-place changes to nested values
+        # must set session.modified; reassigning an equal value writes nothing
+        if session.modified or stale:
+            data = self.serializer.dumps(dict(session))
+            if data != session.loaded or stale:
+                session.expires_at = now + lifetime
+                self.store.save(session.sid, data, session.expires_at)
+                session.loaded = data
+            session.modified = False
+
+        if session.new or (session.permanent and app.config["SESSION_REFRESH_EACH_REQUEST"]):
+            response.set_cookie(name, session.sid, expires=self.get_expiration_time(app, session),
+                                httponly=self.get_cookie_httponly(app), secure=self.get_cookie_secure(app),
+                                samesite=self.get_cookie_samesite(app), domain=domain, path=path)
+            session.new = False
+
+
+def make_session_interface(backend, engine):
+    """Session interface for SESSION_BACKEND 'sql' or 'memory'."""
+    if backend == "sql":
+        store = SQLSessionStore(engine)
+        store.create_table()
+    elif backend == "memory":
+        store = MemorySessionStore()
+    else:
+        raise ValueError(f"Unknown SESSION_BACKEND: {backend}")
+    return StoredSessionInterface(store)
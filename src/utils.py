@@ -1,14 +1,14 @@
-import numpy as np
-import pandas as pd
-# import torch
-# from torch.utils.data import Dataset, DataLoader
 from flask import session, redirect
 from functools import wraps
-import requests
 import sqlite3
 import secrets
 import hashlib
 import base64
+import datetime
+import json
+import os
+from src.cache import LRUCache, SQLiteCache
+from src.fitbit_client import get_fitbit_client
 
 def login_required(f):
     """
@@ -40,96 +40,56 @@ def auth_required(f):
 
     return decorated_function
 
-# class TimeSeriesDataset(Dataset):
-#     def __init__(self, data, value_col='Heart Rate', time_col='Time', 
-#                  interval_value=5, interval_unit='s', interpolation_limit=11,
-#                  kernel_size=512, stride=512, missing_thresh=0.5):
-#         self.data = data
-#         self.value_col = value_col
-#         self.time_col = time_col
-#         self.data[self.time_col] = pd.to_datetime(self.data[self.time_col])
-#         self.data = self._construct_dataset(interval_value, interval_unit, interpolation_limit)
-
-#         self.seqs = []
-#         self.masks = []
-#         self.times = []
-#         self._create_seq(kernel_size, stride, missing_thresh)
-
-#     def _construct_dataset(self, interval_value, interval_unit, interpolation_limit):
-#         '''Reindexes data using pd.date_range with a frequency of interval_value interval_unit.
-#         Interpolates data with a limit of interpolation_limit'''
-#         df = self.data.copy()
-#         df = df.set_index(self.time_col)
-        
-#         # Create time index with interval
-#         min_time = df.index.min()
-#         max_time = df.index.max()
-#         new_time_index = pd.date_range(min_time, max_time, freq=str(interval_value)+interval_unit)
-
-#         # Reindex with new time index
-#         reindex_df = df.reindex(new_time_index, method='nearest', tolerance=pd.Timedelta(interval_value-1, unit=interval_unit))
-
-#         # Reset index
-#         reindex_df.reset_index(inplace=True)
-#         reindex_df.rename(columns={'index': self.time_col}, inplace=True)
-
-#         return reindex_df.reset_index(drop=True).interpolate(limit=interpolation_limit)
-    
-#     def _create_seq(self, kernel_size, stride, missing_thresh):
-#         '''Constructs sequences of length kernel_size, moving by stride for each sequence.
-#         Only append sequence to self.seqs if the threshold for missingness is not exceeded.'''
-#         df = self.data
-#         data_len = len(df)
-#         for i in range(0, data_len, stride):
-#             seq = df[self.value_col][i:i+kernel_size]
-#             time = df[self.time_col][i:i+kernel_size]
-#             if seq.isna().mean() <= missing_thresh:
-#                 self.seqs.append(np.array(seq))
-#                 self.masks.append(np.array(seq.notna()))
-#                 self.times.extend(list(time))
-
-#     def __len__(self):
-#         return len(self.seqs)
-    
-#     def __getitem__(self, idx):
-#         seq = torch.tensor(self.seqs[idx], dtype=torch.float32)
-#         return seq, self.masks[idx]
-    
-
-# def get_anomalies(data, model):
-#     '''Construct TimeSeriesDataset and feed into model. 
-#     Anomaly score is calculated from the mean absolute percentage error compared to the true signal.
-#     Output: a dataframe with timestamps where the anomaly score exceeds the anomaly threshold.'''
-#     dataset = TimeSeriesDataset(data)
-#     batch_size = dataset.__len__() - 1
-#     dataloader = DataLoader(dataset, batch_size=batch_size, drop_last=True)
-#     x, mask = next(iter(dataloader))
-#     x = x[:, None, :]
-
-#     with torch.no_grad():
-#         output = model(x_enc=x, input_mask=mask)
-
-#     preds = output.reconstruction.squeeze().numpy().flatten().astype('float64')
-#     trues = x.squeeze().numpy().flatten().astype('float64')
-#     anomaly_scores = np.abs(trues - preds) / preds * 100
-
-#     anomalies = pd.DataFrame({'Time': dataset.times[:len(trues)],
-#                               'Recorded HR': trues.round(1), 
-#                               'Predicted HR': preds.round(1), 
-#                               'Anomaly Score': anomaly_scores.round(1)})
-#     return anomalies
+# Fitbit responses for days that are over never change, so they are kept
+# until evicted; anything that covers the last FINALIZE_LAG_DAYS days (the
+# device may not have synced yet) expires after FITBIT_CACHE_TTL seconds.
+FITBIT_CACHE_TTL = int(os.environ.get('FITBIT_CACHE_TTL', 300))
+FINALIZE_LAG_DAYS = 1
+
+def make_response_cache():
+    """Build the Fitbit response cache selected by FITBIT_CACHE (memory or sqlite)."""
+    max_entries = int(os.environ.get('FITBIT_CACHE_MAX_ENTRIES', 2048))
+    max_bytes = int(os.environ.get('FITBIT_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+    if os.environ.get('FITBIT_CACHE', 'memory') == 'sqlite':
+        return SQLiteCache(os.environ.get('FITBIT_CACHE_PATH', 'data/fitbit_cache.db'),
+                           max_entries=max_entries, max_bytes=max_bytes)
+    return LRUCache(max_entries=max_entries, max_bytes=max_bytes)
+
+response_cache = make_response_cache()
+
+def is_finalized(date, period='', today=None):
+    '''Whether every day covered by a request ended before the finalization lag.'''
+    today = today or datetime.date.today()
+    try:
+        # a date-range request ends on its second date; period requests end on `date`
+        end = datetime.date.fromisoformat(str(period)) if period else None
+    except ValueError:
+        end = None
+    try:
+        end = end or datetime.date.fromisoformat(str(date))
+    except ValueError:
+        return False
+    return end < today - datetime.timedelta(days=FINALIZE_LAG_DAYS)
 
 def retrieve_data(data_type, user_id, access_token, date, period='', detail='', version=1):
-    '''Retrieve Fitbit data using GET.'''
+    '''Retrieve Fitbit data using GET, served from the response cache when possible.'''
+    key = (str(user_id), data_type, str(date), str(period), str(detail), str(version))
+    cached = response_cache.get(key)
+    if cached is not None:
+        return cached
+
+    url_type = data_type
     if data_type in ['steps', 'heart']:
-        data_type = 'activities/' + data_type
-    if period:
-        period = '/' + period
-    if detail:
-        detail = '/' + detail
-    response = requests.get(f'https://api.fitbit.com/{version}/user/{user_id}/{data_type}/date/{date}{period}{detail}.json',
-                            headers={'Authorization': 'Bearer ' + access_token})
-    return response.json()
+        url_type = 'activities/' + data_type
+    url_period = '/' + str(period) if period else ''
+    url_detail = '/' + detail if detail else ''
+    data = get_fitbit_client().get(f'/{version}/user/{user_id}/{url_type}/date/{date}{url_period}{url_detail}.json',
+                                   access_token)
+
+    # failed requests raise a FitbitError, so only successful responses are cached
+    ttl = None if is_finalized(date, period) else FITBIT_CACHE_TTL
+    response_cache.set(key, data, ttl=ttl, size=len(json.dumps(data)))
+    return data
 
 class AppAuthenticator:
     '''Generate PKCE values and state.'''
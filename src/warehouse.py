@@ -0,0 +1,257 @@
+"""
+Local per-user store of Fitbit data.
+
+Dashboard routes and the chat context read Fitbit data from these tables
+instead of calling the API on every view. Before reading a window of days
+the caller syncs it, and only days Fitbit may still change are requested:
+
+* days that were never synced, i.e. after the user's high-water mark (or
+  before the oldest day they have viewed), and
+* days that were not finalized when last synced (today and yesterday, see
+  src.utils.is_finalized) once their copy is FITBIT_CACHE_TTL seconds old.
+
+The sync log keeps one row per (user, resource, day), so a finalized day is
+downloaded once per user. Missing days of all windows in one sync are merged
+per resource, grouped into contiguous date-range requests and fetched
+together on a FetchPlan.
+"""
+
+from __future__ import annotations
+
+import datetime
+import time
+from sqlalchemy import text
+from src.fetch_planner import FetchPlan
+from src.utils import FITBIT_CACHE_TTL, is_finalized, retrieve_data
+
+# resource -> (Fitbit data type, API version, intraday)
+RESOURCES = {
+    "steps": ("steps", 1, False),
+    "sleep": ("sleep", 1.2, False),
+    "heart": ("heart", 1, False),
+    "steps-intraday": ("steps", 1, True),
+    "heart-intraday": ("heart", 1, True),
+}
+
+# Longest date range Fitbit accepts (sleep logs); longer gaps are split
+MAX_RANGE_DAYS = 100
+
+TABLES = ("fitbit_sync", "fitbit_daily_steps", "fitbit_resting_hr", "fitbit_sleep", "fitbit_intraday")
+
+_SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS fitbit_sync(
+        fitbit_id TEXT NOT NULL,
+        resource TEXT NOT NULL,
+        date TEXT NOT NULL,
+        finalized BOOL NOT NULL,
+        synced_at REAL NOT NULL,
+        PRIMARY KEY(fitbit_id, resource, date))""",
+    """CREATE TABLE IF NOT EXISTS fitbit_daily_steps(
+        fitbit_id TEXT NOT NULL,
+        date TEXT NOT NULL,
+        steps INTEGER NOT NULL,
+        PRIMARY KEY(fitbit_id, date))""",
+    """CREATE TABLE IF NOT EXISTS fitbit_resting_hr(
+        fitbit_id TEXT NOT NULL,
+        date TEXT NOT NULL,
+        resting_hr INTEGER,
+        PRIMARY KEY(fitbit_id, date))""",
+    """CREATE TABLE IF NOT EXISTS fitbit_sleep(
+        fitbit_id TEXT NOT NULL,
+        log_id TEXT NOT NULL,
+        date TEXT NOT NULL,
+        minutes_asleep INTEGER NOT NULL,
+        time_in_bed INTEGER,
+        is_main_sleep BOOL,
+        PRIMARY KEY(fitbit_id, log_id))""",
+    "CREATE INDEX IF NOT EXISTS fitbit_sleep_date ON fitbit_sleep(fitbit_id, date)",
+    """CREATE TABLE IF NOT EXISTS fitbit_intraday(
+        fitbit_id TEXT NOT NULL,
+        data_type TEXT NOT NULL,
+        date TEXT NOT NULL,
+        time TEXT NOT NULL,
+        value REAL NOT NULL,
+        PRIMARY KEY(fitbit_id, data_type, date, time))""",
+)
+
+
+def _as_date(value) -> datetime.date:
+    import pandas as pd
+    return pd.Timestamp(value).date()
+
+
+def _days(start, end) -> list:
+    start, end = _as_date(start), _as_date(end)
+    return [start + datetime.timedelta(days=i) for i in range((end - start).days + 1)]
+
+
+def _ranges(days) -> list:
+    """Group sorted days into contiguous (start, end) ranges of at most MAX_RANGE_DAYS."""
+    ranges = []
+    for day in days:
+        if ranges and (day - ranges[-1][1]).days == 1 and (day - ranges[-1][0]).days < MAX_RANGE_DAYS:
+            ranges[-1][1] = day
+        else:
+            ranges.append([day, day])
+    return [tuple(r) for r in ranges]
+
+
+class Warehouse:
+    """Fitbit data for every connected user, kept in SQL and synced incrementally."""
+
+    def __init__(self, engine):
+        self.engine = engine
+
+    def create_tables(self):
+        with self.engine.connect() as db:
+            for statement in _SCHEMA:
+                db.execute(text(statement))
+            db.commit()
+
+    def clear(self):
+        """Delete all synced data (the next read fetches everything again)."""
+        with self.engine.connect() as db:
+            for table in TABLES:
+                db.execute(text(f"DELETE FROM {table}"))
+            db.commit()
+
+    # ── Sync ────────────────────────────────────────────────────────────────
+
+    def _missing_days(self, db, fitbit_id, resource, start, end) -> list:
+        """Days in [start, end] that have never been synced or are stale and unfinalized."""
+        synced = db.execute(
+            text("""SELECT date FROM fitbit_sync
+                    WHERE fitbit_id = :f AND resource = :r AND date BETWEEN :s AND :e
+                    AND (finalized OR synced_at > :fresh)"""),
+            {"f": fitbit_id, "r": resource, "s": str(_as_date(start)), "e": str(_as_date(end)),
+             "fresh": time.time() - FITBIT_CACHE_TTL},
+        ).fetchall()
+        synced = {row[0] for row in synced}
+        return [day for day in _days(start, end) if str(day) not in synced]
+
+    def sync(self, fitbit_id, access_token, windows, retrieve=retrieve_data):
+        """Bring the given (resource, start, end) windows up to date.
+
+        Windows may overlap. All missing ranges are fetched concurrently;
+        FitbitErrors propagate.
+        """
+        # overlapping windows of a resource (e.g. today and the week ending
+        # today) are merged, so each missing day is requested once
+        missing = {}
+        with self.engine.connect() as db:
+            for resource, start, end in windows:
+                missing.setdefault(resource, set()).update(
+                    self._missing_days(db, fitbit_id, resource, start, end))
+
+        plan = FetchPlan(fitbit_id, access_token, retrieve=retrieve)
+        for resource, days in missing.items():
+            data_type, version, intraday = RESOURCES[resource]
+            if intraday:
+                for day in sorted(days):
+                    plan.add((resource, day, day), data_type, day, period="1d", detail="1min")
+            else:
+                for first, last in _ranges(sorted(days)):
+                    plan.add((resource, first, last), data_type, first, period=str(last), version=version)
+        if not plan:
+            return
+
+        responses = plan.run()
+        now = time.time()
+        store = {
+            "steps": self._store_steps,
+            "sleep": self._store_sleep,
+            "heart": self._store_heart,
+            "steps-intraday": lambda *args: self._store_intraday("steps", *args),
+            "heart-intraday": lambda *args: self._store_intraday("heart", *args),
+        }
+        with self.engine.connect() as db:
+            for (resource, first, last), data in responses.items():
+                store[resource](db, fitbit_id, first, last, data)
+                db.execute(
+                    text("""INSERT INTO fitbit_sync (fitbit_id, resource, date, finalized, synced_at)
+                            VALUES (:f, :r, :d, :fin, :t)
+                            ON CONFLICT (fitbit_id, resource, date)
+                            DO UPDATE SET finalized = excluded.finalized, synced_at = excluded.synced_at"""),
+                    [{"f": fitbit_id, "r": resource, "d": str(day), "fin": is_finalized(day), "t": now}
+                     for day in _days(first, last)],
+                )
+            db.commit()
+
+    def _store_steps(self, db, fitbit_id, first, last, data):
+        rows = [{"f": fitbit_id, "d": e["dateTime"], "v": int(float(e["value"]))}
+                for e in data.get("activities-steps", [])]
+        if rows:
+            db.execute(text("""INSERT INTO fitbit_daily_steps (fitbit_id, date, steps) VALUES (:f, :d, :v)
+                               ON CONFLICT (fitbit_id, date) DO UPDATE SET steps = excluded.steps"""), rows)
+
+    def _store_heart(self, db, fitbit_id, first, last, data):
+        rows = [{"f": fitbit_id, "d": e["dateTime"], "v": e.get("value", {}).get("restingHeartRate")}
+                for e in data.get("activities-heart", [])]
+        if rows:
+            db.execute(text("""INSERT INTO fitbit_resting_hr (fitbit_id, date, resting_hr) VALUES (:f, :d, :v)
+                               ON CONFLICT (fitbit_id, date) DO UPDATE SET resting_hr = excluded.resting_hr"""), rows)
+
+    def _store_sleep(self, db, fitbit_id, first, last, data):
+        # Logs can be edited or deleted on the device, so replace the whole range
+        db.execute(text("DELETE FROM fitbit_sleep WHERE fitbit_id = :f AND date BETWEEN :s AND :e"),
+                   {"f": fitbit_id, "s": str(first), "e": str(last)})
+        rows = []
+        for i, record in enumerate(data.get("sleep", [])):
+            day = record.get("dateOfSleep", record.get("startTime", "")[:10])
+            rows.append({"f": fitbit_id, "l": str(record.get("logId", f"{day}-{i}")), "d": day,
+                         "m": record.get("minutesAsleep", 0), "b": record.get("timeInBed"),
+                         "main": record.get("isMainSleep")})
+        if rows:
+            db.execute(text("""INSERT INTO fitbit_sleep
+                               (fitbit_id, log_id, date, minutes_asleep, time_in_bed, is_main_sleep)
+                               VALUES (:f, :l, :d, :m, :b, :main)
+                               ON CONFLICT (fitbit_id, log_id) DO UPDATE SET
+                               date = excluded.date, minutes_asleep = excluded.minutes_asleep,
+                               time_in_bed = excluded.time_in_bed, is_main_sleep = excluded.is_main_sleep"""),
+                       rows)
+
+    def _store_intraday(self, data_type, db, fitbit_id, day, _, data):
+        db.execute(text("DELETE FROM fitbit_intraday WHERE fitbit_id = :f AND data_type = :t AND date = :d"),
+                   {"f": fitbit_id, "t": data_type, "d": str(day)})
+        dataset = data.get(f"activities-{data_type}-intraday", {}).get("dataset", [])
+        rows = [{"f": fitbit_id, "t": data_type, "d": str(day), "time": p["time"], "v": p["value"]}
+                for p in dataset]
+        if rows:
+            db.execute(text("""INSERT INTO fitbit_intraday (fitbit_id, data_type, date, time, value)
+                               VALUES (:f, :t, :d, :time, :v)"""), rows)
+
+    # ── Reads ───────────────────────────────────────────────────────────────
+
+    def _query(self, sql, columns, **params) -> pd.DataFrame:
+        import pandas as pd
+        with self.engine.connect() as db:
+            rows = db.execute(text(sql), params).fetchall()
+        return pd.DataFrame([tuple(r) for r in rows], columns=columns)
+
+    def daily_steps(self, fitbit_id, start, end) -> pd.DataFrame:
+        """Date and Steps for each synced day in [start, end]."""
+        return self._query(
+            """SELECT date, steps FROM fitbit_daily_steps
+               WHERE fitbit_id = :f AND date BETWEEN :s AND :e ORDER BY date""",
+            ["Date", "Steps"], f=fitbit_id, s=str(_as_date(start)), e=str(_as_date(end)))
+
+    def resting_hr(self, fitbit_id, start, end) -> pd.DataFrame:
+        """Date and Resting HR (None when not recorded) for each synced day in [start, end]."""
+        return self._query(
+            """SELECT date, resting_hr FROM fitbit_resting_hr
+               WHERE fitbit_id = :f AND date BETWEEN :s AND :e ORDER BY date""",
+            ["Date", "Resting HR"], f=fitbit_id, s=str(_as_date(start)), e=str(_as_date(end)))
+
+    def sleep_minutes(self, fitbit_id, start, end) -> pd.DataFrame:
+        """Date and total Minutes Asleep (all logs of that night) for nights in [start, end]."""
+        return self._query(
+            """SELECT date, SUM(minutes_asleep) FROM fitbit_sleep
+               WHERE fitbit_id = :f AND date BETWEEN :s AND :e GROUP BY date ORDER BY date""",
+            ["Date", "Minutes Asleep"], f=fitbit_id, s=str(_as_date(start)), e=str(_as_date(end)))
+
+    def intraday(self, fitbit_id, data_type, day) -> pd.DataFrame:
+        """One day's intraday series ('steps' or 'heart') as time and value columns."""
+        return self._query(
+            """SELECT time, value FROM fitbit_intraday
+               WHERE fitbit_id = :f AND data_type = :t AND date = :d ORDER BY time""",
+            ["time", "value"], f=fitbit_id, t=data_type, d=str(_as_date(day)))
@@ -0,0 +1,65 @@
+// Dashboard charts, drawn in the browser from the compact data that the
+// pages embed and /api/steps, /api/sleep and /api/heart-rate return.
+const HealthCharts = (function () {
+    // Plotly's default colours, as the server-rendered charts used
+    const COLORS = {bar: '#636efa', reached: '#00cc96', missed: '#ef553b'};
+    const LAYOUT = {margin: {t: 20, r: 20, b: 50, l: 60}, showlegend: false};
+    const CONFIG = {responsive: true};
+
+    // {t0, dt, y} -> x as 'YYYY-MM-DD HH:MM:SS' (times are naive, so no time zone shift)
+    function decode(series) {
+        const x = series.dt.map(d => new Date((series.t0 + d) * 1000).toISOString().slice(0, 19).replace('T', ' '));
+        return {x: x, y: series.y};
+    }
+
+    function axes(xTitle, yTitle) {
+        return {xaxis: {title: {text: xTitle}}, yaxis: {title: {text: yTitle}}};
+    }
+
+    function bar(el, series, xTitle, yTitle, goal, reached) {
+        const {x, y} = decode(series);
+        const colors = goal == null ? COLORS.bar : y.map(v => reached(v) ? COLORS.reached : COLORS.missed);
+        const layout = Object.assign({}, LAYOUT, axes(xTitle, yTitle));
+        if (goal != null) {
+            layout.shapes = [{type: 'line', xref: 'paper', x0: 0, x1: 1, y0: goal, y1: goal,
+                              line: {dash: 'dash'}}];
+        }
+        Plotly.react(el, [{type: 'bar', x: x, y: y, marker: {color: colors}}], layout, CONFIG);
+    }
+
+    // `highlight` (optional, same encoding) is drawn as markers over the line
+    function line(el, series, xTitle, yTitle, highlight) {
+        const {x, y} = decode(series);
+        const layout = Object.assign({}, LAYOUT, axes(xTitle, yTitle));
+        // markers only while they can be told apart
+        const mode = y.length > 300 ? 'lines' : 'lines+markers';
+        const traces = [{type: 'scatter', mode: mode, x: x, y: y}];
+        if (highlight) {
+            const h = decode(highlight);
+            traces.push({type: 'scatter', mode: 'markers', x: h.x, y: h.y, marker: {color: COLORS.missed}});
+        }
+        Plotly.react(el, traces, layout, CONFIG);
+    }
+
+    // Redraw from /api/<view> when the date form is submitted, without
+    // reloading the page; fall back to a normal submit if the request fails
+    function bindDateForm(form, api, render) {
+        form.addEventListener('submit', async e => {
+            e.preventDefault();
+            const date = new FormData(form).get('date');
+            try {
+                const r = await fetch(api + '?date=' + encodeURIComponent(date),
+                                      {headers: {Accept: 'application/json'}});
+                if (!r.ok || !(r.headers.get('Content-Type') || '').includes('json')) throw new Error(r.status);
+                const data = await r.json();
+                render(data);
+                form.elements.date.value = data.date;
+                history.replaceState(null, '', form.getAttribute('action').replace(/\?.*$/, '') + '?date=' + data.date);
+            } catch (err) {
+                form.submit();
+            }
+        });
+    }
+
+    return {bar: bar, line: line, bindDateForm: bindDateForm};
+})();
@@ -1,6 +1,7 @@
 """Shared fixtures for all tests."""
 
 import os
+import re
 import tempfile
 
 # Use a temporary file-based SQLite DB for tests — must be set BEFORE importing
@@ -8,11 +9,19 @@ import tempfile
 _test_db = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
 os.environ["DB_PATH"] = f"sqlite:///{_test_db.name}"
 _test_db.close()
+# Tests run prefetches explicitly instead of on a background thread
+os.environ["PREFETCH_INTERVAL"] = "0"
+os.environ["DEMO_PRELOAD"] = "0"
 
 import pandas as pd
 import pytest
-from app import app as flask_app, engine
+from app import app as flask_app, chart_cache, chat_store, engine, goal_store
 from sqlalchemy import text
+from src.anomaly import score_cache
+from src.health_context import context_cache
+from src.llm_service import answer_cache
+from src.utils import response_cache
+from src.warehouse import Warehouse
 from werkzeug.security import generate_password_hash
 
 
@@ -124,6 +133,18 @@ def app(tmp_path):
         )
         db.commit()
 
+    # Fitbit responses, chat context and answers, chart data, anomaly scores and synced Fitbit data persist; start every test cold
+    response_cache.clear()
+    context_cache.clear()
+    chart_cache.clear()
+    answer_cache.clear()
+    chat_store.clear()
+    goal_store.clear()
+    score_cache.clear()
+    if hasattr(flask_app.session_interface, "store"):
+        flask_app.session_interface.store.clear()
+    Warehouse(engine).clear()
+
     yield flask_app
 
     # Clean up
@@ -164,88 +185,85 @@ def fitbit_client(app):
 
 
 # ---------------------------------------------------------------------------
-# Canned Fitbit API responses used by mock_fitbit_api
+# Canned Fitbit API data used by mock_fitbit_api
 # ---------------------------------------------------------------------------
+# Responses are built per requested day, so single-day, period ('7d') and
+# date-range URLs all agree. Days not listed use the *_DEFAULT value.
+
+STEPS_DEFAULT = 8500
+STEPS_BY_DAY = {f"2025-01-{d:02d}": 1000 * d for d in range(9, 16)}
+
+STEPS_INTRADAY = [{"time": f"{h:02d}:00:00", "value": 350} for h in range(24)]
+
+# One main sleep per night; Jan 8 to Jan 15 are 400-minute nights and
+# Jan 15 also has a 30-minute nap
+SLEEP_DEFAULT = 420
+SLEEP_BY_DAY = {f"2025-01-{d:02d}": [400] for d in range(8, 16)}
+SLEEP_BY_DAY["2025-01-15"] = [400, 30]
+
+RESTING_HR_DEFAULT = 62
+RESTING_HR_BY_DAY = {f"2025-01-{d:02d}": 60 + d for d in range(9, 16)}
+
+HEART_INTRADAY = [{"time": f"{h:02d}:00:00", "value": 70 + h} for h in range(24)]
 
-STEPS_TODAY_JSON = {
-    "activities-steps": [{"dateTime": "2025-01-15", "value": "8500"}],
-}
-
-STEPS_INTRADAY_JSON = {
-    "activities-steps": [{"dateTime": "2025-01-15", "value": "8500"}],
-    "activities-steps-intraday": {
-        "dataset": [{"time": f"{h:02d}:00:00", "value": 350} for h in range(24)],
-    },
-}
-
-STEPS_WEEK_JSON = {
-    "activities-steps": [
-        {"dateTime": f"2025-01-{d:02d}", "value": str(1000 * d)}
-        for d in range(9, 16)
-    ],
-}
-
-SLEEP_TODAY_JSON = {
-    "sleep": [],
-    "summary": {"totalMinutesAsleep": 420, "totalTimeInBed": 480},
-}
-
-SLEEP_DAY_JSON = {
-    "sleep": [],
-    "summary": {"totalMinutesAsleep": 400, "totalTimeInBed": 460},
-}
-
-HEART_INTRADAY_JSON = {
-    "activities-heart": [
-        {
-            "dateTime": "2025-01-15",
-            "value": {"restingHeartRate": 62},
-        }
-    ],
-    "activities-heart-intraday": {
-        "dataset": [{"time": f"{h:02d}:00:00", "value": 70 + h} for h in range(24)],
-    },
-}
-
-HEART_WEEK_JSON = {
-    "activities-heart": [
-        {
-            "dateTime": f"2025-01-{d:02d}",
-            "value": {"restingHeartRate": 60 + d},
-        }
-        for d in range(9, 16)
-    ],
-}
+
+def _requested_days(url):
+    """Days covered by a /date/{date}[/{end}|/{period}] URL."""
+    m = re.search(r"/date/(\d{4}-\d{2}-\d{2})(?:/(\d{4}-\d{2}-\d{2})|/(\d+)d)?", url)
+    first = last = pd.Timestamp(m.group(1))
+    if m.group(2):
+        last = pd.Timestamp(m.group(2))
+    elif m.group(3):
+        first = last - pd.Timedelta(days=int(m.group(3)) - 1)
+    return [str(d.date()) for d in pd.date_range(first, last)]
 
 
 def _fake_fitbit_get(url, **kwargs):
     """Return canned JSON for any Fitbit API GET request."""
 
     class FakeResponse:
+        status_code = 200
+        headers = {}
+
         def __init__(self, data):
             self._data = data
 
         def json(self):
             return self._data
 
+    days = _requested_days(url)
     if "activities/steps" in url:
+        data = {"activities-steps": [{"dateTime": d, "value": str(STEPS_BY_DAY.get(d, STEPS_DEFAULT))}
+                                     for d in days]}
         if "1min" in url:
-            return FakeResponse(STEPS_INTRADAY_JSON)
-        if "7d" in url:
-            return FakeResponse(STEPS_WEEK_JSON)
-        return FakeResponse(STEPS_TODAY_JSON)
+            data["activities-steps-intraday"] = {"dataset": STEPS_INTRADAY}
+        return FakeResponse(data)
     if "sleep" in url:
-        return FakeResponse(SLEEP_TODAY_JSON)
+        sleep = [{"logId": f"{d}-{i}", "dateOfSleep": d, "minutesAsleep": minutes, "isMainSleep": i == 0}
+                 for d in days for i, minutes in enumerate(SLEEP_BY_DAY.get(d, [SLEEP_DEFAULT]))]
+        return FakeResponse({"sleep": sleep})
     if "activities/heart" in url:
+        data = {"activities-heart": [{"dateTime": d,
+                                      "value": {"restingHeartRate": RESTING_HR_BY_DAY.get(d, RESTING_HR_DEFAULT)}}
+                                     for d in days]}
         if "1min" in url:
-            return FakeResponse(HEART_INTRADAY_JSON)
-        if "7d" in url:
-            return FakeResponse(HEART_WEEK_JSON)
+            data["activities-heart-intraday"] = {"dataset": HEART_INTRADAY}
+        return FakeResponse(data)
     return FakeResponse({})
 
 
 @pytest.fixture()
 def mock_fitbit_api(monkeypatch):
-    """Patch requests.get so Fitbit API calls return canned data."""
-    import src.utils
-    monkeypatch.setattr(src.utils, "requests", type("mod", (), {"get": staticmethod(_fake_fitbit_get)})())
+    """Patch the shared Fitbit client's HTTP session so API calls return canned data.
+
+    Returns the list of requested URLs, in order, so tests can count calls.
+    """
+    from src.fitbit_client import get_fitbit_client
+    urls = []
+
+    def _recording_get(url, **kwargs):
+        urls.append(url)
+        return _fake_fitbit_get(url, **kwargs)
+
+    monkeypatch.setattr(get_fitbit_client().session, "get", _recording_get)
+    return urls
@@ -0,0 +1,126 @@
+"""Tests: heart-rate anomaly scores are computed once per user and date and re-thresholded from the cache."""
+
+import re
+
+import numpy as np
+import pandas as pd
+import pytest
+import app as app_module
+import src.anomaly as anomaly
+from src.anomaly import WINDOW, Scores, make_windows
+
+
+class _FakeScorer:
+    """Predicts a flat 70 bpm and counts the windows it is given."""
+
+    def __init__(self):
+        self.calls = 0
+        self.windows = 0
+
+    def reconstruct(self, windows, masks):
+        self.calls += 1
+        self.windows += len(windows)
+        return np.full(windows.shape, 70.0)
+
+
+@pytest.fixture()
+def scorer(monkeypatch):
+    fake = _FakeScorer()
+    monkeypatch.setattr(anomaly, "_scorer", fake)
+    monkeypatch.setattr(anomaly, "AVAILABLE", True)
+    return fake
+
+
+@pytest.fixture()
+def dense_day(monkeypatch):
+    """Ten minutes of 5 s demo heart rate: 70 bpm, a few 75s and one 85."""
+    values = np.full(120, 70)
+    values[[20, 40, 60]] = 75
+    values[90] = 85
+    day = pd.DataFrame({"Time": pd.date_range("2016-04-12 08:00", periods=120, freq="5s"), "Value": values})
+    monkeypatch.setattr(app_module.demo_tables().table("heart"), "day", lambda user_id, date: day)
+
+
+def _report_rows(resp):
+    """Recorded HR values in the anomaly report table."""
+    body = resp.get_data(as_text=True).split("<tbody>", 1)[1].split("</tbody>", 1)[0]
+    rows = re.findall(r"<tr>(.*?)</tr>", body, re.S)
+    return [float(re.findall(r"<td>(.*?)</td>", row)[1]) for row in rows]
+
+
+class TestWindows:
+    """The day is put on a 5 s grid and cut into WINDOW-sample windows."""
+
+    def test_minute_data_filled(self):
+        times = pd.date_range("2025-01-15", periods=1440, freq="1min")
+        windows, masks, grid = make_windows(times, np.full(1440, 65))
+        assert windows.shape[1] == WINDOW
+        assert len(grid) == windows.size
+        assert masks[:-1].all()  # one-minute gaps are interpolated
+
+    def test_last_window_padded_and_masked(self):
+        times = pd.date_range("2025-01-15", periods=WINDOW + 10, freq="5s")
+        windows, masks, _ = make_windows(times, np.full(WINDOW + 10, 65))
+        assert windows.shape == (2, WINDOW)
+        assert masks[1].sum() == 10
+
+    def test_sparse_window_skipped(self):
+        # hourly samples leave most of every window empty
+        times = pd.date_range("2025-01-15", periods=24, freq="1h")
+        windows, _, _ = make_windows(times, np.full(24, 65))
+        assert len(windows) == 0
+
+
+class TestScores:
+    def test_above_threshold(self):
+        scores = Scores(np.arange(3).astype("datetime64[s]"), np.array([70.0, 77.0, 84.0]), np.full(3, 70.0))
+        assert scores.above(15)["Recorded HR"].tolist() == [84.0]
+        assert scores.above(5)["Anomaly Score"].tolist() == [10.0, 20.0]
+
+    def test_load_runs_outside_scoring_lock(self, scorer):
+        """A slow Fitbit sync in load() must not hold up other users' scoring."""
+        held = []
+
+        def load():
+            held.append(anomaly._score_lock.locked())
+            return pd.date_range("2025-01-15", periods=WINDOW, freq="5s"), np.full(WINDOW, 70)
+
+        anomaly.cached_scores(("U1", "anomaly", "2025-01-15"), True, load)
+        anomaly.cached_scores(("U1", "anomaly", "2025-01-15"), True, load)
+        assert held == [False]
+        assert scorer.calls == 1
+
+
+class TestHeartRatePage:
+    """Posting the threshold form scores the day once; new thresholds reuse the scores."""
+
+    def test_report_lists_anomalies(self, no_fitbit_client, scorer, dense_day):
+        resp = no_fitbit_client.post("/heart-rate?date=2016-04-12", data={"thresh": "12"})
+        assert b"Anomaly Report" in resp.data
+        assert _report_rows(resp) == [85.0]
+
+    def test_new_threshold_uses_cached_scores(self, no_fitbit_client, scorer, dense_day):
+        no_fitbit_client.post("/heart-rate?date=2016-04-12", data={"thresh": "12"})
+        resp = no_fitbit_client.post("/heart-rate?date=2016-04-12", data={"thresh": "5"})
+        assert _report_rows(resp) == [75.0, 75.0, 75.0, 85.0]
+        assert scorer.calls == 1
+
+    def test_invalid_threshold_defaults(self, no_fitbit_client, scorer):
+        resp = no_fitbit_client.post("/heart-rate?date=2016-04-12", data={"thresh": "-3"})
+        assert b"Threshold: <strong>5</strong>" in resp.data
+
+    def test_anomalies_added_to_chart(self, no_fitbit_client, scorer, dense_day):
+        resp = no_fitbit_client.post("/heart-rate?date=2016-04-12", data={"thresh": "12"})
+        assert b'"anomalies": {' in resp.data
+
+    def test_fitbit_day_scored(self, fitbit_client, mock_fitbit_api, scorer):
+        resp = fitbit_client.post("/heart-rate?date=2025-01-15", data={"thresh": "5"})
+        assert b"Anomaly Report" in resp.data
+
+    def test_not_installed(self, no_fitbit_client, monkeypatch):
+        monkeypatch.setattr(anomaly, "AVAILABLE", False)
+        resp = no_fitbit_client.get("/heart-rate?date=2016-04-12")
+        assert b"not installed" in resp.data
+        resp = no_fitbit_client.post("/heart-rate?date=2016-04-12", data={"thresh": "5"})
+        assert b"Anomaly detection is not installed" in resp.data
+        assert b"Anomaly Report" not in resp.data
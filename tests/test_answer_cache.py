@@ -0,0 +1,89 @@
+"""Tests: repeated chat questions are answered from the cache while nothing has changed."""
+
+import json
+
+import pytest
+import src.llm_service as llm_service
+from app import chat_store
+
+
+class _Reply:
+    def __init__(self, content):
+        self.content = content
+
+
+class _CountingLLM:
+    """Answers every prompt with a numbered reply."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def invoke(self, messages):
+        self.calls += 1
+        return _Reply(f"answer {self.calls}")
+
+    def stream(self, messages):
+        yield self.invoke(messages)
+
+
+@pytest.fixture()
+def llm(monkeypatch):
+    """A counting fake LLM, with the answer cache turned on."""
+    fake = _CountingLLM()
+    monkeypatch.setattr(llm_service, "get_llm", lambda: fake)
+    monkeypatch.setattr(llm_service, "CHAT_ANSWER_TTL", 600)
+    return fake
+
+
+def _ask(client, message):
+    return client.post("/chat", json={"message": message}).get_json()
+
+
+class TestAnswerCache:
+    """Hits skip the model; a change to the question, the conversation or the data misses."""
+
+    def test_repeat_question_served_from_cache(self, no_fitbit_client, llm):
+        first = _ask(no_fitbit_client, "How did I sleep this week?")
+        second = _ask(no_fitbit_client, "  how did I   sleep this week ")
+        assert second["response"] == first["response"] == "answer 1"
+        assert second["cached"] and not first["cached"]
+        assert second["prompt_tokens"] == 0
+        assert llm.calls == 1
+
+    def test_hit_recorded_in_history(self, no_fitbit_client, llm):
+        _ask(no_fitbit_client, "How did I sleep?")
+        _ask(no_fitbit_client, "How did I sleep?")
+        assert chat_store.recent("testuser")[-1] == {"role": "assistant", "content": "answer 1"}
+
+    def test_different_history_misses(self, no_fitbit_client, llm):
+        """A follow-up is not answered from a different conversation."""
+        _ask(no_fitbit_client, "How did I sleep?")
+        _ask(no_fitbit_client, "Why?")
+        no_fitbit_client.post("/chat/clear")
+        _ask(no_fitbit_client, "How many steps did I take?")
+        assert _ask(no_fitbit_client, "Why?")["cached"] is False
+        assert llm.calls == 4
+
+    def test_different_question_misses(self, no_fitbit_client, llm):
+        _ask(no_fitbit_client, "How did I sleep?")
+        assert _ask(no_fitbit_client, "How did I sleep last night?")["cached"] is False
+        assert llm.calls == 2
+
+    def test_context_change_misses(self, no_fitbit_client, llm):
+        _ask(no_fitbit_client, "Am I meeting my step goal?")
+        no_fitbit_client.post("/profile", data={"step": "12000", "sleep": ""})
+        assert _ask(no_fitbit_client, "Am I meeting my step goal?")["response"] == "answer 2"
+
+    def test_disabled_with_zero_ttl(self, no_fitbit_client, llm, monkeypatch):
+        monkeypatch.setattr(llm_service, "CHAT_ANSWER_TTL", 0)
+        _ask(no_fitbit_client, "How did I sleep?")
+        _ask(no_fitbit_client, "How did I sleep?")
+        assert llm.calls == 2
+
+    def test_stream_shares_cache(self, no_fitbit_client, llm):
+        _ask(no_fitbit_client, "How did I sleep?")
+        body = no_fitbit_client.post("/chat/stream", json={"message": "How did I sleep?"}).get_data(as_text=True)
+        frames = [frame.splitlines() for frame in body.strip().split("\n\n")]
+        assert frames[0] == ["event: token", 'data: {"text": "answer 1"}']
+        assert json.loads(frames[1][1][len("data: "):])["cached"] is True
+        assert llm.calls == 1
@@ -0,0 +1,74 @@
+"""Tests: /api/steps, /api/sleep and /api/heart-rate return compact chart data."""
+
+import datetime
+
+import pandas as pd
+from src.figures import encode_series
+
+
+def _times(series):
+    return [datetime.datetime.fromtimestamp(series["t0"] + d, datetime.timezone.utc).replace(tzinfo=None)
+            for d in series["dt"]]
+
+
+class TestEncodeSeries:
+    """Timestamps become an epoch offset plus integer arrays."""
+
+    def test_round_trip(self):
+        times = pd.date_range("2025-01-15 08:00", periods=3, freq="min")
+        series = encode_series(times, [70.4, 71.6, 72])
+        assert series["dt"] == [0, 60, 120]
+        assert series["y"] == [70, 72, 72]
+        assert _times(series) == list(times.to_pydatetime())
+
+    def test_empty(self):
+        assert encode_series([], []) == {"t0": 0, "dt": [], "y": []}
+
+
+class TestDemoChartApi:
+    """Demo users get their chosen date's data as JSON."""
+
+    def test_steps(self, no_fitbit_client):
+        data = no_fitbit_client.get("/api/steps?date=2016-04-13").get_json()
+        assert data["date"] == "2016-04-13"
+        assert data["steps"] == 10500
+        assert data["step_goal_status"] == "no-goal"
+        assert data["goal"] is None
+        assert data["week"]["y"] == [13162, 10500]
+        assert data["week"]["dt"] == [0, 86400]
+
+    def test_steps_goal(self, no_fitbit_client):
+        no_fitbit_client.post("/profile", data={"step": "11000", "sleep": ""})
+        data = no_fitbit_client.get("/api/steps?date=2016-04-12").get_json()
+        assert data["goal"] == 11000
+        assert data["step_goal_status"] == "reached"
+        assert sum(data["hourly"]["y"]) == 500 * 24
+
+    def test_sleep(self, no_fitbit_client):
+        data = no_fitbit_client.get("/api/sleep?date=2016-04-15").get_json()
+        assert data["date"] == "2016-04-15"
+        assert data["week"]["y"] == [420, 380, 450]
+
+    def test_heart_rate(self, no_fitbit_client):
+        data = no_fitbit_client.get("/api/heart-rate?date=2016-04-12").get_json()
+        assert data["day"]["y"] == [72, 75, 68, 80, 71, 74, 69, 77, 73, 76]
+        assert _times(data["day"])[0] == datetime.datetime(2016, 4, 12, 8, 0)
+        assert data["week"] is None
+
+    def test_login_required(self, client):
+        resp = client.get("/api/steps")
+        assert resp.status_code == 302
+
+
+class TestFitbitChartApi:
+    """Fitbit users' chart data comes from the warehouse."""
+
+    def test_heart_rate_week(self, fitbit_client, mock_fitbit_api):
+        data = fitbit_client.get("/api/heart-rate?date=2025-01-15").get_json()
+        assert data["week"]["y"] == [69, 70, 71, 72, 73, 74, 75]
+        assert len(data["day"]["y"]) == 24
+
+    def test_page_embeds_chart_data(self, fitbit_client, mock_fitbit_api):
+        resp = fitbit_client.get("/?date=2025-01-15")
+        assert b"renderSteps({" in resp.data
+        assert b'"y": [9000, 10000, 11000, 12000, 13000, 14000, 15000]' in resp.data
@@ -0,0 +1,72 @@
+"""Tests: chart data of past dates is built once and served from chart_cache."""
+
+import datetime
+
+import pytest
+import app as app_module
+from app import chart_cache
+
+
+def _fail(*args, **kwargs):
+    raise AssertionError("chart data was rebuilt")
+
+
+class TestDemoChartCache:
+    """Demo data never changes, so each date is built once."""
+
+    def test_repeat_view_skips_demo_store(self, no_fitbit_client, monkeypatch):
+        first = no_fitbit_client.get("/api/steps?date=2016-04-13").get_json()
+        monkeypatch.setattr(app_module.demo_tables(), "table", _fail)
+        assert no_fitbit_client.get("/api/steps?date=2016-04-13").get_json() == first
+
+    @pytest.mark.parametrize("url", ["/api/sleep?date=2016-04-15", "/api/heart-rate?date=2016-04-12"])
+    def test_other_views_cached(self, no_fitbit_client, monkeypatch, url):
+        first = no_fitbit_client.get(url).get_json()
+        monkeypatch.setattr(app_module.demo_tables(), "table", _fail)
+        assert no_fitbit_client.get(url).get_json() == first
+
+    def test_goal_change_reflected(self, no_fitbit_client):
+        no_fitbit_client.get("/api/steps?date=2016-04-12")
+        no_fitbit_client.post("/profile", data={"step": "20000", "sleep": ""})
+        data = no_fitbit_client.get("/api/steps?date=2016-04-12").get_json()
+        assert data["goal"] == 20000
+        assert data["step_goal_status"] == "not-reached"
+
+
+class TestFitbitChartCache:
+    """Connected users' charts are cached once their date is finalized."""
+
+    def test_past_date_skips_warehouse(self, fitbit_client, mock_fitbit_api, monkeypatch):
+        first = fitbit_client.get("/api/heart-rate?date=2025-01-15").get_json()
+        monkeypatch.setattr(app_module.warehouse, "intraday", _fail)
+        monkeypatch.setattr(app_module.warehouse, "resting_hr", _fail)
+        assert fitbit_client.get("/api/heart-rate?date=2025-01-15").get_json() == first
+
+    def test_today_not_cached(self, fitbit_client, mock_fitbit_api):
+        today = str(datetime.date.today())
+        fitbit_client.get(f"/api/steps?date={today}")
+        assert chart_cache.get(("FAKE_FITBIT_ID", "steps", today)) is None
+
+    def test_todays_total_still_read(self, fitbit_client, mock_fitbit_api, monkeypatch):
+        fitbit_client.get("/api/steps?date=2025-01-15")
+        reads = []
+        daily_steps = app_module.warehouse.daily_steps
+        monkeypatch.setattr(app_module.warehouse, "daily_steps",
+                            lambda *args: reads.append(args[1:]) or daily_steps(*args))
+        fitbit_client.get("/api/steps?date=2025-01-15")
+        today = app_module.TODAY_DATE
+        assert reads == [(today, today)]
+
+    @pytest.mark.parametrize("url", ["/api/steps?date=2025-01-15", "/api/sleep?date=2025-01-15"])
+    def test_today_and_charts_synced_together(self, fitbit_client, mock_fitbit_api, monkeypatch, url):
+        """A miss syncs today's total and the chart windows in one call; a hit syncs only today."""
+        syncs = []
+        sync = app_module.warehouse.sync
+        monkeypatch.setattr(app_module.warehouse, "sync",
+                            lambda fitbit_id, token, windows: syncs.append(windows) or sync(fitbit_id, token, windows))
+        fitbit_client.get(url)
+        fitbit_client.get(url)
+        today = app_module.TODAY_DATE
+        assert len(syncs) == 2
+        assert len(syncs[0]) > 1 and syncs[0][0][1:] == (today, today)
+        assert [w[1:] for w in syncs[1]] == [(today, today)]
@@ -0,0 +1,86 @@
+"""Tests: chat history is stored in chat_messages and paged through /chat/history."""
+
+import pytest
+import src.llm_service as llm_service
+from app import chat_store
+
+
+class _Reply:
+    def __init__(self, content):
+        self.content = content
+
+
+class _EchoLLM:
+    def invoke(self, messages):
+        return _Reply("re: " + messages[-1][1])
+
+
+@pytest.fixture()
+def llm(monkeypatch):
+    monkeypatch.setattr(llm_service, "get_llm", lambda: _EchoLLM())
+
+
+def _fill(username, turns):
+    for i in range(turns):
+        chat_store.append_turn(username, f"q{i}", f"a{i}")
+
+
+class TestChatStore:
+    """Turns are appended, paged newest-first and kept per user."""
+
+    def test_newest_page_in_order(self, app):
+        _fill("testuser", 5)
+        page = chat_store.page("testuser", limit=4)
+        assert [m["content"] for m in page] == ["q3", "a3", "q4", "a4"]
+
+    def test_pages_before_cursor(self, app):
+        _fill("testuser", 5)
+        newest = chat_store.page("testuser", limit=4)
+        older = chat_store.page("testuser", before=newest[0]["id"], limit=4)
+        assert [m["content"] for m in older] == ["q1", "a1", "q2", "a2"]
+
+    def test_users_are_separate(self, app):
+        _fill("testuser", 2)
+        chat_store.append_turn("fitbituser", "other", "reply")
+        assert [m["content"] for m in chat_store.recent("fitbituser")] == ["other", "reply"]
+
+    def test_history_not_capped_at_twenty(self, app):
+        _fill("testuser", 30)
+        assert len(chat_store.page("testuser", limit=100)) == 60
+
+
+class TestChatEndpoints:
+    """The chat routes read and write the table instead of the session."""
+
+    def test_chat_appends_turn(self, no_fitbit_client, llm):
+        no_fitbit_client.post("/chat", json={"message": "How many steps?"})
+        assert chat_store.recent("testuser") == [
+            {"role": "user", "content": "How many steps?"},
+            {"role": "assistant", "content": "re: How many steps?"},
+        ]
+
+    def test_history_not_in_session(self, no_fitbit_client, llm):
+        no_fitbit_client.post("/chat", json={"message": "Hi"})
+        with no_fitbit_client.session_transaction() as sess:
+            assert "chat_history" not in sess
+
+    def test_history_endpoint_pages(self, no_fitbit_client):
+        _fill("testuser", 3)
+        first = no_fitbit_client.get("/chat/history?limit=4").get_json()
+        assert [m["content"] for m in first["messages"]] == ["q1", "a1", "q2", "a2"]
+        rest = no_fitbit_client.get(f"/chat/history?limit=4&before={first['next']}").get_json()
+        assert [m["content"] for m in rest["messages"]] == ["q0", "a0"]
+        assert rest["next"] is None
+
+    def test_history_endpoint_empty(self, no_fitbit_client):
+        assert no_fitbit_client.get("/chat/history").get_json() == {"messages": [], "next": None}
+
+    def test_clear_deletes_only_own_messages(self, no_fitbit_client):
+        _fill("testuser", 2)
+        _fill("fitbituser", 1)
+        no_fitbit_client.post("/chat/clear")
+        assert chat_store.recent("testuser") == []
+        assert len(chat_store.recent("fitbituser")) == 2
+
+    def test_login_required(self, client):
+        assert client.get("/chat/history").status_code == 302
@@ -0,0 +1,97 @@
+"""Tests: /chat/stream sends the answer as Server-Sent Events and saves it to the history."""
+
+import json
+
+import pytest
+import src.llm_service as llm_service
+from app import chat_store
+
+
+class _Chunk:
+    def __init__(self, content):
+        self.content = content
+
+
+class _FakeLLM:
+    """Streams a canned answer in chunks and records the prompts it was sent."""
+
+    def __init__(self, chunks=("You walked ", "", "10,500 steps."), error=None):
+        self.chunks = chunks
+        self.error = error
+        self.prompts = []
+
+    def stream(self, messages):
+        self.prompts.append(messages)
+        for chunk in self.chunks:
+            yield _Chunk(chunk)
+        if self.error:
+            raise self.error
+
+    def invoke(self, messages):
+        self.prompts.append(messages)
+        return _Chunk("".join(self.chunks))
+
+
+@pytest.fixture()
+def fake_llm(monkeypatch):
+    llm = _FakeLLM()
+    monkeypatch.setattr(llm_service, "get_llm", lambda: llm)
+    return llm
+
+
+def _events(resp):
+    """(event, data) pairs of an SSE response body."""
+    events = []
+    for frame in resp.get_data(as_text=True).split("\n\n"):
+        if frame:
+            fields = dict(line.split(": ", 1) for line in frame.splitlines())
+            events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+def _history(username="testuser"):
+    return chat_store.recent(username)
+
+
+class TestChatStream:
+    """Tokens are streamed, then the full reply is stored."""
+
+    def test_streams_tokens_then_done(self, no_fitbit_client, fake_llm):
+        resp = no_fitbit_client.post("/chat/stream", json={"message": "How many steps?"})
+        assert resp.mimetype == "text/event-stream"
+        events = _events(resp)
+        assert events[:-1] == [("token", {"text": "You walked "}), ("token", {"text": "10,500 steps."})]
+        assert events[-1][0] == "done"
+        assert events[-1][1]["prompt_tokens"] > 0
+
+    def test_reply_saved_to_history(self, no_fitbit_client, fake_llm):
+        no_fitbit_client.post("/chat/stream", json={"message": "How many steps?"}).get_data()
+        assert _history() == [
+            {"role": "user", "content": "How many steps?"},
+            {"role": "assistant", "content": "You walked 10,500 steps."},
+        ]
+
+    def test_history_sent_with_next_message(self, no_fitbit_client, fake_llm):
+        no_fitbit_client.post("/chat/stream", json={"message": "How many steps?"}).get_data()
+        no_fitbit_client.post("/chat/stream", json={"message": "And yesterday?"}).get_data()
+        assert ("assistant", "You walked 10,500 steps.") in fake_llm.prompts[-1]
+
+    def test_error_mid_stream(self, no_fitbit_client, fake_llm):
+        fake_llm.error = RuntimeError("connection reset")
+        events = _events(no_fitbit_client.post("/chat/stream", json={"message": "Hi"}))
+        assert events[-1][0] == "error"
+        assert _history() == []
+
+    def test_empty_message(self, no_fitbit_client, fake_llm):
+        resp = no_fitbit_client.post("/chat/stream", json={"message": "  "})
+        assert resp.status_code == 400
+
+    def test_not_configured(self, no_fitbit_client, monkeypatch):
+        monkeypatch.delenv("GITHUB_TOKEN", raising=False)
+        monkeypatch.setattr(llm_service, "_llm_key", None)
+        resp = no_fitbit_client.post("/chat/stream", json={"message": "Hi"})
+        assert resp.status_code == 503
+        assert "GITHUB_TOKEN" in resp.get_json()["error"]
+
+    def test_login_required(self, client):
+        assert client.post("/chat/stream", json={"message": "Hi"}).status_code == 302
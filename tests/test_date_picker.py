@@ -72,6 +72,14 @@ class TestSleepDatePicker:
         resp = fitbit_client.get("/sleep?date=bad", follow_redirects=True)
         assert resp.status_code == 200
 
+    def test_week_fetched_in_one_request(self, fitbit_client, mock_fitbit_api):
+        """The week chart comes from a single date-range request."""
+        resp = fitbit_client.get("/sleep?date=2025-01-15", follow_redirects=True)
+        assert resp.status_code == 200
+        sleep_urls = [u for u in mock_fitbit_api if "/sleep/" in u]
+        assert len(sleep_urls) == 2  # today's total + the week range
+        assert any("/sleep/date/2025-01-08/2025-01-15" in u for u in sleep_urls)
+
     # -- No-Fitbit date picker tests --
 
     def test_no_fitbit_default_date(self, no_fitbit_client):
@@ -0,0 +1,116 @@
+"""Tests: the demo data store loads each table once and slices it by index."""
+
+import numpy as np
+import pandas as pd
+import pytest
+from pandas.io.parsers import read_csv
+from src.demo_store import DemoStore, DemoTable
+
+
+def _heart_frame():
+    return pd.DataFrame({
+        "Id": [2, 2, 1, 1, 1],
+        "Time": ["4/13/2016 1:00:00 AM", "4/12/2016 1:00:00 AM",
+                 "4/13/2016 9:00:00 AM", "4/12/2016 11:00:00 PM", "4/12/2016 8:00:00 AM"],
+        "Value": [60, 61, 70, 71, 72],
+    })
+
+
+class TestDemoTable:
+    """Index lookups on a single table."""
+
+    def test_first_id_keeps_file_order(self):
+        """The default user is the first Id in the file, not the smallest."""
+        table = DemoTable.from_frame(_heart_frame(), "Time")
+        assert table.first_id == 2
+        assert sorted(table.user_ids) == [1, 2]
+
+    def test_user_rows_sorted_by_time(self):
+        table = DemoTable.from_frame(_heart_frame(), "Time")
+        rows = table.user_rows(1)
+        assert list(rows.Value) == [72, 71, 70]
+
+    def test_between_is_half_open_day_slice(self):
+        """A day slice includes midnight and excludes the next midnight."""
+        table = DemoTable.from_frame(_heart_frame(), "Time")
+        day = table.between(1, "2016-04-12", "2016-04-13")
+        assert list(day.Value) == [72, 71]
+        assert (day.Id == 1).all()
+
+    def test_day_reads_one_partition(self):
+        """day() returns exactly the rows of one (user, day) partition."""
+        table = DemoTable.from_frame(_heart_frame(), "Time")
+        assert list(table.day(1, "2016-04-12").Value) == [72, 71]
+        assert list(table.day(2, "2016-04-13").Value) == [60]
+        assert table.day(1, "2016-04-20").empty
+
+    def test_daily_stats(self):
+        table = DemoTable.from_frame(_heart_frame(), "Time")
+        stats = table.daily_stats(1, "Value")
+        assert list(stats["mean"]) == [71.5, 70.0]
+        assert list(stats["min"]) == [71, 70]
+        assert list(stats["max"]) == [72, 70]
+
+    def test_unknown_user_is_empty(self):
+        table = DemoTable.from_frame(_heart_frame(), "Time")
+        assert table.between(99, "2016-04-12", "2016-04-13").empty
+
+
+class TestDemoStore:
+    """Tables are read once per process."""
+
+    def test_table_read_once(self, monkeypatch):
+        calls = []
+        fake_read_csv = pd.read_csv
+
+        def _counting_read_csv(path, *args, **kwargs):
+            calls.append(str(path))
+            return fake_read_csv(path, *args, **kwargs)
+
+        monkeypatch.setattr(pd, "read_csv", _counting_read_csv)
+        store = DemoStore(engine=None, db_path="sqlite://")
+        store.table("daily_steps")
+        store.table("daily_steps")
+        assert len(calls) == 1
+        assert "dailySteps" in calls[0]
+
+
+class TestColumnarCache:
+    """CSVs are converted once to memory-mapped columns and rebuilt on change."""
+
+    @pytest.fixture(autouse=True)
+    def real_read_csv(self, monkeypatch):
+        """These tests write real CSVs, so undo the conftest read_csv patch."""
+        monkeypatch.setattr(pd, "read_csv", read_csv)
+
+    def _store(self, tmp_path):
+        return DemoStore(engine=None, db_path="sqlite://", data_dir=str(tmp_path / "fitbit_apr"),
+                         cache_dir=str(tmp_path / "cache"))
+
+    def _write_csv(self, tmp_path, df):
+        data_dir = tmp_path / "fitbit_apr"
+        data_dir.mkdir(exist_ok=True)
+        df.to_csv(data_dir / "heartrate_seconds_merged.csv", index=False)
+
+    def test_cached_columns_are_memory_mapped(self, tmp_path):
+        self._write_csv(tmp_path, _heart_frame())
+        self._store(tmp_path).table("heart")
+        # A fresh store (as in another worker) reads the cache, not the CSV
+        table = self._store(tmp_path).table("heart")
+        assert isinstance(table.columns["Value"], np.memmap)
+        # Heart rate is stored in the smallest integer type that fits
+        assert table.columns["Value"].dtype == np.uint8
+        assert table.first_id == 2
+        assert list(table.between(1, "2016-04-12", "2016-04-13").Value) == [72, 71]
+        assert list(table.day(1, "2016-04-13").Value) == [70]
+
+    def test_cache_rebuilt_when_csv_changes(self, tmp_path):
+        self._write_csv(tmp_path, _heart_frame())
+        store = self._store(tmp_path)
+        assert len(store.table("heart").user_rows(1)) == 3
+        df = _heart_frame()
+        df.loc[len(df)] = [1, "4/14/2016 1:00:00 AM", 80]
+        self._write_csv(tmp_path, df)
+        assert len(store.table("heart").user_rows(1)) == 4
+        # Only the entry for the current CSV is kept
+        assert len(list((tmp_path / "cache").iterdir())) == 1
@@ -0,0 +1,91 @@
+"""Tests: heart-rate day series are thinned with LTTB or min/max before charting."""
+
+import numpy as np
+import pytest
+from src.downsample import downsample_series, lttb_indices, minmax_indices
+
+# a 5-second day with one short spike, like the demo data
+_DT = np.arange(17280) * 5
+_Y = (70 + 10 * np.sin(_DT / 3000)).round()
+_Y[5000] = 180
+
+# mock_fitbit_api's intraday heart rate: one sample an hour, 70 + hour
+DAY_SAMPLES, DAY_MAX = 24, 93
+
+
+def _lttb_reference(x, y, n):
+    """Straightforward LTTB, one bucket at a time."""
+    every = (len(x) - 2) / (n - 2)
+    kept, a = [0], 0
+    for i in range(n - 2):
+        start, end = int(i * every) + 1, int((i + 1) * every) + 1
+        if i == n - 3:
+            avg_x, avg_y = x[-1], y[-1]
+        else:
+            nxt = slice(end, min(int((i + 2) * every) + 1, len(x)))
+            avg_x, avg_y = x[nxt].mean(), y[nxt].mean()
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        kept.append(a)
+    return kept + [len(x) - 1]
+
+
+class TestLTTB:
+    def test_matches_reference(self):
+        assert lttb_indices(_DT, _Y, 500).tolist() == _lttb_reference(_DT.astype(float), _Y, 500)
+
+    def test_keeps_count_ends_and_peak(self):
+        kept = lttb_indices(_DT, _Y, 1000)
+        assert len(kept) == 1000
+        assert kept[0] == 0 and kept[-1] == len(_DT) - 1
+        assert 5000 in kept
+        assert np.all(np.diff(kept) > 0)
+
+    def test_short_series_unchanged(self):
+        assert lttb_indices(_DT[:50], _Y[:50], 100).tolist() == list(range(50))
+
+
+class TestMinMax:
+    def test_keeps_extremes(self):
+        kept = minmax_indices(_Y, 1000)
+        assert len(kept) <= 1000
+        assert 5000 in kept
+        assert _Y[kept].min() == _Y.min()
+        assert np.all(np.diff(kept) > 0)
+
+
+class TestSeries:
+    def test_none_keeps_everything(self):
+        series = {"t0": 0, "dt": _DT.tolist(), "y": _Y.astype(int).tolist()}
+        assert downsample_series(series, 100, "none") is series
+
+    def test_points_keep_their_times(self):
+        series = {"t0": 7, "dt": _DT.tolist(), "y": _Y.astype(int).tolist()}
+        thin = downsample_series(series, 200, "lttb")
+        assert thin["t0"] == 7
+        assert all(series["y"][dt // 5] == y for dt, y in zip(thin["dt"], thin["y"]))
+
+
+class TestHeartRateAPI:
+    """The day chart is thinned per request options; the week chart is untouched."""
+
+    @pytest.mark.parametrize("method", ["lttb", "minmax"])
+    def test_points_parameter(self, fitbit_client, mock_fitbit_api, method):
+        data = fitbit_client.get(f"/api/heart-rate?date=2025-01-15&points=10&downsample={method}").get_json()
+        assert 2 < len(data["day"]["y"]) <= 10
+        assert max(data["day"]["y"]) == DAY_MAX
+        assert len(data["week"]["y"]) == 7
+
+    def test_default_keeps_short_day(self, fitbit_client, mock_fitbit_api):
+        data = fitbit_client.get("/api/heart-rate?date=2025-01-15").get_json()
+        assert len(data["day"]["y"]) == DAY_SAMPLES
+
+    def test_invalid_options_use_defaults(self, fitbit_client, mock_fitbit_api):
+        data = fitbit_client.get("/api/heart-rate?date=2025-01-15&points=abc&downsample=bogus").get_json()
+        assert len(data["day"]["y"]) == DAY_SAMPLES
+
+    def test_options_cached_separately(self, fitbit_client, mock_fitbit_api):
+        thin = fitbit_client.get("/api/heart-rate?date=2025-01-15&points=10").get_json()
+        full = fitbit_client.get("/api/heart-rate?date=2025-01-15&downsample=none").get_json()
+        assert len(thin["day"]["y"]) == 10
+        assert len(full["day"]["y"]) == DAY_SAMPLES
@@ -0,0 +1,53 @@
+"""Tests: a page's Fitbit calls are deduplicated and fetched concurrently."""
+
+import threading
+
+from src.fetch_planner import FetchPlan
+
+
+class _FakeRetrieve:
+    """Records retrieve_data calls and returns a canned steps response."""
+
+    def __init__(self, barrier=None):
+        self.calls = []
+        self.barrier = barrier
+        self._lock = threading.Lock()
+
+    def __call__(self, data_type, user_id, access_token, date, period="", detail="", version=1):
+        with self._lock:
+            self.calls.append((data_type, str(date), period, detail))
+        if self.barrier:
+            self.barrier.wait(timeout=5)
+        days = [f"2025-01-{d:02d}" for d in range(9, 16)] if period == "7d" else [str(date)]
+        return {f"activities-{data_type}": [{"dateTime": d, "value": "100"} for d in days]}
+
+
+class TestFetchPlan:
+    """Deduplication and concurrency."""
+
+    def test_duplicates_fetched_once(self):
+        retrieve = _FakeRetrieve()
+        plan = FetchPlan("U1", "T", retrieve=retrieve)
+        plan.add("a", "heart", "2025-01-15", period="7d")
+        plan.add("b", "heart", "2025-01-15", period="7d")
+        data = plan.run()
+        assert len(retrieve.calls) == 1
+        assert data["a"] == data["b"]
+
+    def test_calls_run_concurrently(self):
+        """Both calls must be in flight at once for the barrier to release."""
+        retrieve = _FakeRetrieve(barrier=threading.Barrier(2))
+        plan = FetchPlan("U1", "T", retrieve=retrieve)
+        plan.add("day", "heart", "2025-01-15", period="1d", detail="1min")
+        plan.add("week", "heart", "2025-01-15", period="7d")
+        plan.run()
+        assert len(retrieve.calls) == 2
+
+
+class TestPlannedRoutes:
+    """Dashboard routes fetch through a plan."""
+
+    def test_steps_page_makes_three_calls(self, fitbit_client, mock_fitbit_api):
+        resp = fitbit_client.get("/?date=2025-01-15", follow_redirects=True)
+        assert resp.status_code == 200
+        assert len(mock_fitbit_api) == 3
@@ -0,0 +1,36 @@
+"""Tests: plotly.js is served once as a cached static file, not inlined per figure."""
+
+import pytest
+from src.figures import PLOTLY_JS
+
+
+class TestPageWeight:
+    """Dashboard pages carry figure JSON only."""
+
+    @pytest.mark.parametrize("path", ["/", "/sleep", "/heart-rate"])
+    def test_bundle_not_inlined(self, no_fitbit_client, path):
+        resp = no_fitbit_client.get(path, follow_redirects=True)
+        assert resp.status_code == 200
+        assert len(resp.data) < 200_000  # the inlined bundle alone is ~4.5 MB
+        assert f'src="/static/{PLOTLY_JS}"'.encode() in resp.data
+        assert b'src="/static/charts.js"' in resp.data
+
+    def test_non_chart_page_does_not_load_plotly(self, no_fitbit_client):
+        resp = no_fitbit_client.get("/profile")
+        assert PLOTLY_JS.encode() not in resp.data
+
+
+class TestPlotlyAsset:
+    """The versioned bundle is served with a long cache lifetime."""
+
+    def test_served_immutable(self, client):
+        resp = client.get(f"/static/{PLOTLY_JS}")
+        assert resp.status_code == 200
+        assert "max-age=31536000" in resp.headers["Cache-Control"]
+        assert b"plotly" in resp.data[:2000].lower()
+        resp.close()
+
+    def test_other_static_files_unchanged(self, client):
+        resp = client.get("/static/styles.css")
+        assert "immutable" not in resp.headers.get("Cache-Control", "")
+        resp.close()
@@ -0,0 +1,119 @@
+"""Tests: Fitbit API responses are cached with immutable-past-day semantics."""
+
+import datetime
+
+import pytest
+import src.utils
+from src.cache import LRUCache, SQLiteCache
+from src.fitbit_client import FitbitAuthError, get_fitbit_client
+from src.utils import is_finalized, retrieve_data
+
+
+class _CountingFitbit:
+    """Stands in for the Fitbit client's HTTP session and counts GET calls."""
+
+    def __init__(self):
+        self.urls = []
+        self.status = 200
+        self.data = {"activities-steps": [{"dateTime": "2025-01-15", "value": "8500"}]}
+
+    def get(self, url, **kwargs):
+        self.urls.append(url)
+        status, data = self.status, self.data
+
+        class FakeResponse:
+            status_code = status
+            headers = {}
+
+            def json(self):
+                return data
+
+        return FakeResponse()
+
+
+@pytest.fixture()
+def fitbit(monkeypatch):
+    fake = _CountingFitbit()
+    monkeypatch.setattr(get_fitbit_client().session, "get", fake.get)
+    monkeypatch.setattr(src.utils, "response_cache", LRUCache())
+    return fake
+
+
+class TestFinalization:
+    """Which requests cover only finished days."""
+
+    TODAY = datetime.date(2025, 1, 15)
+
+    def test_today_not_finalized(self):
+        assert not is_finalized("2025-01-15", "1d", today=self.TODAY)
+
+    def test_yesterday_within_lag(self):
+        assert not is_finalized("2025-01-14", today=self.TODAY)
+
+    def test_older_day_finalized(self):
+        assert is_finalized("2025-01-10", "7d", today=self.TODAY)
+
+    def test_range_ending_today_not_finalized(self):
+        assert not is_finalized("2025-01-01", "2025-01-15", today=self.TODAY)
+
+
+class TestRetrieveDataCache:
+    """retrieve_data only calls the API on a cache miss."""
+
+    def test_past_day_served_from_cache(self, fitbit):
+        first = retrieve_data("steps", "U1", "TOKEN", "2020-01-01", period="1d")
+        second = retrieve_data("steps", "U1", "TOKEN", "2020-01-01", period="1d")
+        assert first == second
+        assert len(fitbit.urls) == 1
+
+    def test_key_includes_detail(self, fitbit):
+        retrieve_data("steps", "U1", "TOKEN", "2020-01-01", period="1d")
+        retrieve_data("steps", "U1", "TOKEN", "2020-01-01", period="1d", detail="1min")
+        assert len(fitbit.urls) == 2
+
+    def test_today_expires_after_ttl(self, fitbit, monkeypatch):
+        monkeypatch.setattr(src.utils, "FITBIT_CACHE_TTL", 0)
+        today = datetime.date.today()
+        retrieve_data("steps", "U1", "TOKEN", today, period="1d")
+        retrieve_data("steps", "U1", "TOKEN", today, period="1d")
+        assert len(fitbit.urls) == 2
+
+    def test_errors_not_cached(self, fitbit):
+        fitbit.status = 401
+        fitbit.data = {"errors": [{"errorType": "expired_token"}]}
+        for _ in range(2):
+            with pytest.raises(FitbitAuthError):
+                retrieve_data("steps", "U1", "TOKEN", "2020-01-01", period="1d")
+        assert len(fitbit.urls) == 2
+
+
+class TestCacheBackends:
+    """LRU and size limits, in memory and in SQLite."""
+
+    def test_lru_evicts_least_recently_used(self):
+        cache = LRUCache(max_entries=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        assert cache.get("a") == 1
+        assert cache.get("b") is None
+
+    def test_lru_byte_limit(self):
+        cache = LRUCache(max_bytes=10)
+        cache.set("a", "x", size=6)
+        cache.set("b", "y", size=6)
+        assert cache.get("a") is None
+        assert cache.get("b") == "y"
+
+    def test_sqlite_persists_across_instances(self, tmp_path):
+        path = str(tmp_path / "cache.db")
+        SQLiteCache(path).set(("U1", "steps"), {"value": 1})
+        assert SQLiteCache(path).get(("U1", "steps")) == {"value": 1}
+
+    def test_sqlite_evicts_beyond_max_entries(self, tmp_path):
+        cache = SQLiteCache(str(tmp_path / "cache.db"), max_entries=2)
+        for i in range(3):
+            cache.set(("k", i), i)
+        assert len(cache) == 2
+        assert cache.get(("k", 0)) is None
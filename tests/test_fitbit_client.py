@@ -0,0 +1,104 @@
+"""Tests: the pooled Fitbit client retries transient failures and raises typed errors."""
+
+import pytest
+import requests
+import src.fitbit_client
+from src.fitbit_client import (
+    FitbitAuthError,
+    FitbitClient,
+    FitbitRateLimitError,
+    FitbitServerError,
+)
+
+
+class _ScriptedSession:
+    """Returns a scripted sequence of (status, headers) responses."""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = []
+
+    def get(self, url, **kwargs):
+        self.calls.append(kwargs)
+        item = self.responses.pop(0)
+        if isinstance(item, Exception):
+            raise item
+        status, headers = item
+
+        class FakeResponse:
+            status_code = status
+
+            def json(self):
+                return {"status": status}
+
+        FakeResponse.headers = headers
+        return FakeResponse()
+
+
+@pytest.fixture()
+def sleeps(monkeypatch):
+    """Record backoff delays instead of sleeping."""
+    delays = []
+    monkeypatch.setattr(src.fitbit_client.time, "sleep", delays.append)
+    return delays
+
+
+def _client(session, **kwargs):
+    client = FitbitClient(**kwargs)
+    client.session = session
+    return client
+
+
+class TestFitbitClient:
+    """Timeouts, retries and typed errors."""
+
+    def test_success_uses_timeouts(self, sleeps):
+        session = _ScriptedSession((200, {}))
+        client = _client(session, connect_timeout=1, read_timeout=2)
+        assert client.get("/1/user/-/profile.json", "TOKEN") == {"status": 200}
+        assert session.calls[0]["timeout"] == (1, 2)
+        assert session.calls[0]["headers"]["Authorization"] == "Bearer TOKEN"
+
+    def test_server_error_retried(self, sleeps):
+        session = _ScriptedSession((503, {}), (200, {}))
+        assert _client(session).get("/x.json", "T") == {"status": 200}
+        assert len(sleeps) == 1
+
+    def test_connection_error_retried(self, sleeps):
+        session = _ScriptedSession(requests.ConnectionError("reset"), (200, {}))
+        assert _client(session).get("/x.json", "T") == {"status": 200}
+
+    def test_short_retry_after_honoured(self, sleeps):
+        session = _ScriptedSession((429, {"Retry-After": "2"}), (200, {}))
+        _client(session, backoff=0.5).get("/x.json", "T")
+        assert 2 <= sleeps[0] <= 2.5
+
+    def test_long_retry_after_fails_fast(self, sleeps):
+        session = _ScriptedSession((429, {"Retry-After": "1800"}))
+        with pytest.raises(FitbitRateLimitError) as exc:
+            _client(session).get("/x.json", "T")
+        assert exc.value.retry_after == 1800
+        assert sleeps == []
+
+    def test_gives_up_after_max_retries(self, sleeps):
+        session = _ScriptedSession((500, {}), (500, {}), (500, {}))
+        with pytest.raises(FitbitServerError):
+            _client(session, max_retries=2).get("/x.json", "T")
+        assert len(session.calls) == 3
+
+    def test_unauthorised_not_retried(self, sleeps):
+        session = _ScriptedSession((401, {}))
+        with pytest.raises(FitbitAuthError):
+            _client(session).get("/x.json", "T")
+        assert len(session.calls) == 1
+
+
+class TestFitbitErrorsInRoutes:
+    """Dashboard routes turn typed errors into redirects or error pages."""
+
+    def test_expired_token_redirects_to_authenticate(self, fitbit_client, monkeypatch):
+        session = _ScriptedSession((401, {}))
+        monkeypatch.setattr(src.fitbit_client.get_fitbit_client(), "session", session)
+        resp = fitbit_client.get("/")
+        assert resp.status_code == 302
+        assert "/authenticate" in resp.headers["Location"]
@@ -0,0 +1,77 @@
+"""Tests: goals are served from memory, written through by /profile and invalidated across processes."""
+
+import pytest
+from sqlalchemy import event
+from app import engine, goal_store
+from src.goals import Goals, GoalStore
+
+
+@pytest.fixture()
+def profile_queries():
+    """SQL statements that read the profile table while the test runs."""
+    queries = []
+
+    def record(conn, cursor, statement, *args):
+        if "FROM profile" in statement:
+            queries.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    yield queries
+    event.remove(engine, "before_cursor_execute", record)
+
+
+class TestGoals:
+    """The 'Create one' placeholder is parsed once."""
+
+    def test_parse_placeholder(self):
+        assert Goals.from_row("Create one", "Create one") == Goals(None, None)
+
+    def test_parse_values(self):
+        goals = Goals.from_row("10000", "7.5")
+        assert goals == Goals(10000, 7.5)
+        assert (goals.step_text, goals.sleep_text) == ("10000", "7.5")
+
+
+class TestGoalCache:
+    """Only the first read of a user's goals queries the database."""
+
+    def test_pages_read_profile_once(self, no_fitbit_client, profile_queries):
+        for url in ("/api/steps?date=2016-04-12", "/api/sleep?date=2016-04-15", "/profile", "/api/steps"):
+            no_fitbit_client.get(url)
+        assert len(profile_queries) == 1
+
+    def test_profile_post_writes_through(self, no_fitbit_client, profile_queries):
+        no_fitbit_client.get("/profile")
+        no_fitbit_client.post("/profile", data={"step": "9000", "sleep": "7"})
+        assert goal_store.get("testuser") == Goals(9000, 7.0)
+        assert no_fitbit_client.get("/api/steps?date=2016-04-12").get_json()["goal"] == 9000
+        assert len(profile_queries) == 1
+
+    def test_unknown_user(self, app):
+        assert goal_store.get("nobody") is None
+
+
+class TestVersionInvalidation:
+    """A write from another process drops this process's cached goals."""
+
+    def test_other_process_write_seen(self, app):
+        other = GoalStore(engine, check_interval=0)
+        mine = GoalStore(engine, check_interval=0)
+        assert mine.get("testuser") == Goals(None, None)
+        other.set("testuser", Goals(12000, 8.0))
+        assert mine.get("testuser") == Goals(12000, 8.0)
+
+    def test_own_write_keeps_cache(self, app, profile_queries):
+        mine = GoalStore(engine, check_interval=0)
+        mine.get("testuser")
+        mine.get("fitbituser")
+        mine.set("testuser", Goals(5000, None))
+        mine.get("fitbituser")
+        assert len(profile_queries) == 2
+
+    def test_version_checked_at_interval(self, app):
+        other = GoalStore(engine, check_interval=0)
+        mine = GoalStore(engine, check_interval=3600)
+        mine.get("testuser")
+        other.set("testuser", Goals(12000, None))
+        assert mine.get("testuser") == Goals(None, None)
@@ -0,0 +1,85 @@
+"""Tests: chat health context sections are built in parallel and cached."""
+
+import datetime
+import threading
+
+from app import DB_PATH, engine
+from src.goals import Goals, get_goal_store
+from src.health_context import build_health_context
+
+
+class _FakeRetrieve:
+    """Records retrieve_data calls and returns data for the last few days."""
+
+    def __init__(self, barrier=None, fail=()):
+        self.calls = []
+        self.barrier = barrier
+        self.fail = fail
+        self._lock = threading.Lock()
+
+    def __call__(self, data_type, user_id, access_token, date, period="", detail="", version=1):
+        with self._lock:
+            self.calls.append((data_type, str(date)))
+        if self.barrier:
+            self.barrier.wait(timeout=5)
+        if data_type in self.fail:
+            raise RuntimeError("API down")
+        today = datetime.date.today()
+        days = [str(today - datetime.timedelta(days=i)) for i in range(3)]
+        if data_type == "steps":
+            return {"activities-steps": [{"dateTime": d, "value": "9000"} for d in days]}
+        if data_type == "sleep":
+            return {"sleep": [{"dateOfSleep": d, "minutesAsleep": 420} for d in days]}
+        return {"activities-heart": [{"dateTime": d, "value": {"restingHeartRate": 61}} for d in days]}
+
+
+LIVE_SESSION = {"user_id": "fitbituser", "fitbit_id": "FAKE_FITBIT_ID", "access_token": "T"}
+DEMO_SESSION = {"user_id": "testuser", "fitbit_id": "no_fitbit"}
+
+
+class TestLiveContext:
+    """Fitbit users: parallel fetches, cached sections."""
+
+    def test_follow_up_makes_no_api_calls(self, app):
+        retrieve = _FakeRetrieve()
+        first = build_health_context(LIVE_SESSION, engine, DB_PATH, retrieve)
+        calls = len(retrieve.calls)
+        second = build_health_context(LIVE_SESSION, engine, DB_PATH, retrieve)
+        assert first == second
+        assert len(retrieve.calls) == calls
+
+    def test_sections_fetched_concurrently(self, app):
+        """All three sections must be in flight at once for the barrier to release."""
+        retrieve = _FakeRetrieve(barrier=threading.Barrier(3))
+        context = build_health_context(LIVE_SESSION, engine, DB_PATH, retrieve)
+        assert "Data unavailable" not in context
+
+    def test_recent_data_needs_no_year_fetch(self, app):
+        retrieve = _FakeRetrieve()
+        build_health_context(LIVE_SESSION, engine, DB_PATH, retrieve)
+        month_ago = str(datetime.date.today() - datetime.timedelta(days=29))
+        assert len(retrieve.calls) == 3
+        assert all(start >= month_ago for _, start in retrieve.calls)
+
+    def test_failed_section_not_cached(self, app):
+        build_health_context(LIVE_SESSION, engine, DB_PATH, _FakeRetrieve(fail=("sleep",)))
+        retrieve = _FakeRetrieve()
+        context = build_health_context(LIVE_SESSION, engine, DB_PATH, retrieve)
+        assert "Data unavailable" not in context
+        assert [c[0] for c in retrieve.calls] == ["sleep"]
+
+
+class TestDemoContext:
+    """Demo users: sections come from the demo store."""
+
+    def test_sections_present(self, app):
+        context = build_health_context(DEMO_SESSION, engine, DB_PATH)
+        assert "### Steps (data from 2016-04-12 to 2016-04-18)" in context
+        assert "### Sleep (data from 2016-04-13 to 2016-04-17)" in context
+        assert "### Heart Rate (data from 2016-04-12 to 2016-04-12)" in context
+
+    def test_goal_change_reflected_immediately(self, app):
+        build_health_context(DEMO_SESSION, engine, DB_PATH)
+        get_goal_store(engine).set("testuser", Goals(12000, None))
+        context = build_health_context(DEMO_SESSION, engine, DB_PATH)
+        assert "**Step goal:** 12000" in context
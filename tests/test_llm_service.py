@@ -0,0 +1,55 @@
+"""Tests: the LLM client is built once per process and reused across chat turns."""
+
+import pytest
+import src.llm_service as llm_service
+from src.llm_service import get_llm
+
+
+@pytest.fixture()
+def llm_env(monkeypatch):
+    """A token in the environment and no client built yet."""
+    monkeypatch.setenv("GITHUB_TOKEN", "TOKEN_A")
+    monkeypatch.delenv("LLM_MODEL", raising=False)
+    monkeypatch.setattr(llm_service, "_llm", None)
+    monkeypatch.setattr(llm_service, "_llm_key", None)
+    monkeypatch.setattr(llm_service, "_http_client", None)
+    return monkeypatch
+
+
+class TestSharedClient:
+    """get_llm returns one client until the model or token changes."""
+
+    def test_reused_between_calls(self, llm_env):
+        assert get_llm() is get_llm()
+
+    def test_rebuilt_when_model_changes(self, llm_env):
+        first = get_llm()
+        llm_env.setenv("LLM_MODEL", "gpt-4o")
+        second = get_llm()
+        assert second is not first
+        assert second.model_name == "gpt-4o"
+
+    def test_rebuilt_when_token_changes(self, llm_env):
+        first = get_llm()
+        llm_env.setenv("GITHUB_TOKEN", "TOKEN_B")
+        assert get_llm() is not first
+
+    def test_replaced_client_closed(self, llm_env):
+        get_llm()
+        old_client = llm_service._http_client
+        llm_env.setenv("GITHUB_TOKEN", "TOKEN_B")
+        get_llm()
+        assert old_client.is_closed
+        assert not llm_service._http_client.is_closed
+
+    def test_timeout_and_retries_from_env(self, llm_env):
+        llm_env.setenv("LLM_TIMEOUT", "12")
+        llm_env.setenv("LLM_MAX_RETRIES", "5")
+        llm = get_llm()
+        assert llm.request_timeout == 12
+        assert llm.max_retries == 5
+
+    def test_missing_token(self, llm_env):
+        llm_env.delenv("GITHUB_TOKEN")
+        with pytest.raises(EnvironmentError):
+            get_llm()
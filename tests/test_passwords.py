@@ -0,0 +1,120 @@
+"""Tests: passwords are hashed on the bounded pool and old hashes are upgraded at login."""
+
+import os
+import subprocess
+import sys
+
+import pytest
+from sqlalchemy import text
+from werkzeug.security import generate_password_hash
+import src.passwords as passwords
+from app import engine
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture()
+def small_pool(monkeypatch):
+    """A one-process pool with no wait queue, stopped after the test."""
+    passwords.shutdown()
+    monkeypatch.setattr(passwords, "PASSWORD_WORKERS", 1)
+    monkeypatch.setattr(passwords, "PASSWORD_QUEUE", 0)
+    yield
+    passwords.shutdown()
+
+
+def _stored_hash(username):
+    with engine.connect() as db:
+        return db.execute(text("SELECT hash FROM users WHERE username = :u"), {"u": username}).scalar()
+
+
+class TestPool:
+    """Hashing runs in the pool and refuses work beyond its queue."""
+
+    def test_round_trip(self, small_pool):
+        pwhash = passwords.hash_password("secret")
+        assert pwhash.startswith(passwords.PASSWORD_METHOD + "$")
+        assert passwords.verify_password(pwhash, "secret")
+        assert not passwords.verify_password(pwhash, "wrong")
+
+    def test_busy_pool_rejects(self, small_pool):
+        _, slots = passwords._get_pool()
+        slots.acquire()
+        try:
+            with pytest.raises(passwords.PasswordPoolBusy):
+                passwords.hash_password("secret")
+        finally:
+            slots.release()
+
+    def test_inline_without_workers(self, monkeypatch):
+        monkeypatch.setattr(passwords, "PASSWORD_WORKERS", 0)
+        monkeypatch.setattr(passwords, "_get_pool", None)  # must not be used
+        assert passwords.verify_password(passwords.hash_password("secret"), "secret")
+
+
+class TestRehash:
+    """Hashes made with another method or cost are flagged."""
+
+    def test_current_method(self):
+        assert not passwords.needs_rehash(generate_password_hash("x", passwords.PASSWORD_METHOD))
+
+    def test_default_parameters_match(self, monkeypatch):
+        monkeypatch.setattr(passwords, "PASSWORD_METHOD", "scrypt")
+        assert not passwords.needs_rehash(generate_password_hash("x", "scrypt:32768:8:1"))
+
+    def test_other_cost(self):
+        assert passwords.needs_rehash(generate_password_hash("x", "pbkdf2:sha256:1000"))
+
+
+class TestRoutes:
+    """/login and /register use the pool and upgrade old hashes."""
+
+    def test_login_upgrades_old_hash(self, client):
+        with engine.connect() as db:
+            db.execute(text("UPDATE users SET hash = :h WHERE username = 'testuser'"),
+                       {"h": generate_password_hash("testpass", "pbkdf2:sha256:1000")})
+            db.commit()
+        assert client.post("/login", data={"username": "testuser", "password": "testpass"}).status_code == 302
+        assert not passwords.needs_rehash(_stored_hash("testuser"))
+        client.get("/logout")
+        assert client.post("/login", data={"username": "testuser", "password": "testpass"}).status_code == 302
+
+    def test_wrong_password_not_upgraded(self, client):
+        old = generate_password_hash("testpass", "pbkdf2:sha256:1000")
+        with engine.connect() as db:
+            db.execute(text("UPDATE users SET hash = :h WHERE username = 'testuser'"), {"h": old})
+            db.commit()
+        resp = client.post("/login", data={"username": "testuser", "password": "nope"})
+        assert b"Invalid username or password" in resp.data
+        assert _stored_hash("testuser") == old
+
+    def test_busy_login_returns_503(self, client, small_pool):
+        _, slots = passwords._get_pool()
+        slots.acquire()
+        try:
+            resp = client.post("/login", data={"username": "testuser", "password": "testpass"})
+        finally:
+            slots.release()
+        assert resp.status_code == 503
+        assert resp.headers["Retry-After"] == "1"
+        assert b"Too many sign-ins" in resp.data
+
+    def test_register_hashes_with_current_method(self, client):
+        client.post("/register", data={"username": "newuser", "password": "pw", "confirmation": "pw"})
+        assert not passwords.needs_rehash(_stored_hash("newuser"))
+
+
+class TestWorkerProcess:
+    """A spawned hashing process re-runs app.py as __mp_main__ without its side effects."""
+
+    def test_no_background_threads(self, tmp_path):
+        env = dict(os.environ, DB_PATH=f"sqlite:///{tmp_path / 'users.db'}",
+                   FITBIT_CACHE="sqlite", FITBIT_CACHE_PATH=str(tmp_path / "fitbit_cache.db"),
+                   PREFETCH_INTERVAL="60", DEMO_PRELOAD="1")
+        code = ("import runpy, threading; runpy.run_path('app.py', run_name='__mp_main__'); "
+                "print(sorted(t.name for t in threading.enumerate()))")
+        result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env,
+                                capture_output=True, text=True, check=True)
+        assert "fitbit-prefetch" not in result.stdout
+        assert "demo-preload" not in result.stdout
+        assert list(tmp_path.iterdir()) == []  # no database, session table or cache file
@@ -0,0 +1,88 @@
+"""Tests: active Fitbit users' current-day data is refreshed in the background."""
+
+import datetime
+
+import app as app_module
+from app import engine
+from src.fitbit_client import FitbitAuthError, FitbitRateLimitError
+from src.prefetch import PrefetchScheduler
+from src.warehouse import Warehouse
+
+
+class _FakeRetrieve:
+    """Records retrieve_data calls; answers with empty data or raises `error`."""
+
+    def __init__(self, error=None):
+        self.calls = []
+        self.error = error
+
+    def __call__(self, data_type, user_id, access_token, date, period="", detail="", version=1):
+        self.calls.append((user_id, data_type, str(date), str(period), detail))
+        if self.error:
+            raise self.error
+        return {}
+
+
+def _scheduler(retrieve, **kwargs):
+    return PrefetchScheduler(Warehouse(engine), interval=0, retrieve=retrieve, **kwargs)
+
+
+class TestPrefetchScheduler:
+    """Which users are refreshed, and how often."""
+
+    def test_active_user_refreshed_once_while_fresh(self, app):
+        retrieve = _FakeRetrieve()
+        scheduler = _scheduler(retrieve)
+        scheduler.touch("U1", "T")
+        scheduler.run_once()
+        assert len(retrieve.calls) == 5
+        scheduler.run_once()
+        assert len(retrieve.calls) == 5
+
+    def test_inactive_user_skipped(self, app):
+        retrieve = _FakeRetrieve()
+        scheduler = _scheduler(retrieve, active_window=-1)
+        scheduler.touch("U1", "T")
+        scheduler.run_once()
+        assert retrieve.calls == []
+        assert scheduler.active_users() == []
+
+    def test_hourly_budget_respected(self, app):
+        retrieve = _FakeRetrieve()
+        scheduler = _scheduler(retrieve, hourly_budget=4)
+        scheduler.touch("U1", "T")
+        scheduler.run_once()
+        assert retrieve.calls == []
+
+    def test_rate_limited_user_paused(self, app):
+        retrieve = _FakeRetrieve(error=FitbitRateLimitError("limit", retry_after=600))
+        scheduler = _scheduler(retrieve)
+        scheduler.touch("U1", "T")
+        scheduler.run_once()
+        calls = len(retrieve.calls)
+        scheduler.run_once()
+        assert len(retrieve.calls) == calls
+
+    def test_rejected_token_drops_user(self, app):
+        scheduler = _scheduler(_FakeRetrieve(error=FitbitAuthError("expired", 401)))
+        scheduler.touch("U1", "T")
+        scheduler.run_once()
+        assert scheduler.active_users() == []
+
+
+class TestPrefetchInApp:
+    """Requests register users, and prefetched data spares the page an API call."""
+
+    def test_request_marks_user_active(self, fitbit_client, mock_fitbit_api):
+        fitbit_client.get("/profile")
+        assert "FAKE_FITBIT_ID" in app_module.prefetcher.active_users()
+
+    def test_page_uses_prefetched_day(self, fitbit_client, mock_fitbit_api):
+        scheduler = PrefetchScheduler(Warehouse(engine), interval=0)
+        scheduler.touch("FAKE_FITBIT_ID", "FAKE_ACCESS_TOKEN")
+        scheduler.run_once()
+        mock_fitbit_api.clear()
+        resp = fitbit_client.get("/heart-rate", follow_redirects=True)
+        assert resp.status_code == 200
+        today = str(datetime.date.today())
+        assert not any(f"/date/{today}/1d/1min" in u for u in mock_fitbit_api)
@@ -0,0 +1,83 @@
+"""Tests: chat prompts are assembled within a fixed token budget."""
+
+import pytest
+import src.prompt_builder as prompt_builder
+from app import DB_PATH, engine
+from src.health_context import build_health_context
+from src.prompt_builder import build_prompt, count_tokens
+
+CONTEXT = (
+    "## User: testuser\n**Step goal:** 10000"
+    "\n### Steps (data from 2025-01-09 to 2025-01-15)\nDate,Steps\n" + "2025-01-15,9000\n" * 20
+    + "\n### Sleep (data from 2025-01-09 to 2025-01-15)\nDate,Minutes Asleep\n" + "2025-01-15,420\n" * 20
+)
+
+
+@pytest.fixture(autouse=True)
+def estimated_tokens(monkeypatch):
+    """Count tokens with the 4-characters-per-token estimate so budgets are exact."""
+    monkeypatch.setattr(prompt_builder, "_encoding", lambda: None)
+
+
+def _turns(n, words=30):
+    history = []
+    for i in range(n):
+        history.append({"role": "user", "content": f"question {i} " + "word " * words})
+        history.append({"role": "assistant", "content": f"answer {i} " + "word " * words})
+    return history
+
+
+class TestHistoryBudget:
+    """Recent turns are kept; older ones are summarised."""
+
+    def test_short_history_kept_whole(self):
+        prompt = build_prompt("sys", _turns(2), "hi", history_budget=1000)
+        assert len(prompt.messages) == 6
+
+    def test_oldest_turns_summarised(self):
+        prompt = build_prompt("sys", _turns(10), "hi", history_budget=200)
+        history = prompt.messages[1:-1]
+        assert history[0][0] == "system"
+        assert history[0][1].startswith("Earlier in this conversation the user asked: question 0")
+        assert history[-1] == ("assistant", _turns(10)[-1]["content"])
+        assert prompt.tokens["history"] <= 200
+
+    def test_history_tokens_bounded(self):
+        for n in (5, 50, 500):
+            assert build_prompt("sys", _turns(n), "hi", history_budget=300).tokens["history"] <= 300
+
+
+class TestMetricsBudget:
+    """Goals are always sent; data sections while they fit."""
+
+    def test_all_sections_fit(self):
+        system = build_prompt("sys", [], "hi", CONTEXT, metrics_budget=1000).messages[0][1]
+        assert "### Steps" in system and "### Sleep" in system
+
+    def test_later_sections_dropped(self):
+        prompt = build_prompt("sys", [], "hi", CONTEXT, metrics_budget=120)
+        system = prompt.messages[0][1]
+        assert "**Step goal:** 10000" in system
+        assert "### Steps" in system
+        assert "### Sleep" not in system
+        assert "further data omitted" in system
+        assert prompt.tokens["metrics"] <= 120
+
+
+class TestTokenReport:
+    """Every part of the prompt is counted."""
+
+    def test_long_message_clipped(self):
+        prompt = build_prompt("sys", [], "word " * 5000)
+        assert count_tokens(prompt.messages[-1][1]) <= prompt_builder.CHAT_MESSAGE_TOKENS + 1
+
+    def test_total_is_sum_of_parts(self):
+        prompt = build_prompt("sys", _turns(3), "hi", CONTEXT)
+        assert set(prompt.tokens) == {"system", "goals", "metrics", "history", "message"}
+        assert prompt.total_tokens == sum(prompt.tokens.values())
+        text_tokens = sum(count_tokens(content) for _, content in prompt.messages)
+        assert abs(prompt.total_tokens - text_tokens) <= prompt_builder.MESSAGE_OVERHEAD * len(prompt.messages) + 4
+
+    def test_health_sections_rendered_as_csv(self, app):
+        context = build_health_context({"user_id": "testuser", "fitbit_id": "no_fitbit"}, engine, DB_PATH)
+        assert "Date,Steps\n2016-04-12," in context
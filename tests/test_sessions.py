@@ -0,0 +1,107 @@
+"""Tests: server-side sessions are written only when they change."""
+
+import datetime
+import time
+
+import pytest
+from flask import Flask, session
+from src.sessions import MemorySessionStore, SQLSessionStore, StoredSessionInterface
+
+
+@pytest.fixture()
+def writes(app, monkeypatch):
+    """Session IDs written to the app's session store, in order."""
+    store = app.session_interface.store
+    saved = []
+    save = store.save
+    monkeypatch.setattr(store, "save", lambda sid, data, expires_at: saved.append(sid) or save(sid, data, expires_at))
+    return saved
+
+
+class TestAppSessions:
+    """The app's SQL-backed sessions."""
+
+    def test_login_writes_once(self, client, writes):
+        client.post("/login", data={"username": "testuser", "password": "testpass"})
+        assert len(writes) == 1
+
+    def test_page_views_do_not_write(self, no_fitbit_client, writes):
+        for url in ("/profile", "/api/steps?date=2016-04-12", "/heart-rate?date=2016-04-12"):
+            assert no_fitbit_client.get(url).status_code == 200
+        assert writes == []
+
+    def test_change_is_written(self, fitbit_client, mock_fitbit_api, writes):
+        fitbit_client.get("/heart-rate?date=2025-01-10")
+        assert len(writes) == 1
+        with fitbit_client.session_transaction() as sess:
+            assert sess["heart_date"] == "2025-01-10"
+
+    def test_logout_deletes_session(self, app, no_fitbit_client):
+        with no_fitbit_client.session_transaction() as sess:
+            sid = sess.sid
+        no_fitbit_client.get("/logout")
+        assert app.session_interface.store.load(sid) is None
+
+    def test_anonymous_request_sets_no_cookie(self, client, writes):
+        resp = client.get("/login")
+        assert "Set-Cookie" not in resp.headers
+        assert writes == []
+
+
+def _app(store):
+    app = Flask(__name__)
+    app.secret_key = "test"
+    app.session_interface = StoredSessionInterface(store)
+
+    @app.route("/set/<value>")
+    def set_value(value):
+        session["value"] = value
+        session["day"] = datetime.date(2025, 1, 15)
+        return "ok"
+
+    @app.route("/get")
+    def get_value():
+        return f"{session.get('value')} {session.get('day')!r}"
+
+    return app
+
+
+@pytest.fixture(params=["sql", "memory"])
+def store(request, app):
+    if request.param == "memory":
+        return MemorySessionStore(max_entries=10)
+    from app import engine
+    store = SQLSessionStore(engine, table="sessions_test")
+    store.create_table()
+    store.clear()
+    return store
+
+
+class TestStores:
+    """Both backends behave the same."""
+
+    def test_round_trip_with_date(self, store):
+        client = _app(store).test_client()
+        client.get("/set/a")
+        assert client.get("/get").get_data(as_text=True) == "a datetime.date(2025, 1, 15)"
+
+    def test_sessions_are_separate(self, store):
+        app = _app(store)
+        first, second = app.test_client(), app.test_client()
+        first.get("/set/a")
+        second.get("/set/b")
+        assert first.get("/get").get_data(as_text=True).startswith("a ")
+
+    def test_expired_session_not_loaded(self, store):
+        store.save("old", "{}", time.time() - 1)
+        assert store.load("old") is None
+
+    def test_stale_session_refreshed(self, store):
+        app = _app(store)
+        client = app.test_client()
+        client.get("/set/a")
+        sid = client.get_cookie("session").value
+        data, _ = store.load(sid)
+        store.save(sid, data, time.time() + 60)  # nearly expired
+        client.get("/get")
+        assert store.load(sid)[1] > time.time() + app.permanent_session_lifetime.total_seconds() / 2
@@ -0,0 +1,42 @@
+"""Tests: importing the app stays fast and leaves heavy dependencies unloaded."""
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules only the dashboards and chat need; importing app must not load them
+HEAVY_MODULES = ("numpy", "pandas", "plotly", "langchain_openai", "langchain_core", "openai")
+
+# Cumulative `import app` time allowed, in ms (about 0.6 s on a laptop)
+IMPORT_BUDGET_MS = int(os.environ.get("APP_IMPORT_BUDGET_MS", 1500))
+
+
+@pytest.fixture(scope="module")
+def import_times(tmp_path_factory):
+    """{module: cumulative µs} from `python -X importtime -c "import app"` in a fresh interpreter."""
+    db = tmp_path_factory.mktemp("startup") / "users.db"
+    env = dict(os.environ, DB_PATH=f"sqlite:///{db}", PREFETCH_INTERVAL="0", DEMO_PRELOAD="0")
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app"],
+                            cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _, cumulative, name = line[len("import time:"):].split("|")
+            if cumulative.strip().isdigit():
+                times[name.strip()] = int(cumulative)
+    return times
+
+
+class TestImportBudget:
+    """`python -X importtime -c "import app"` as a cold-start check."""
+
+    @pytest.mark.parametrize("module", HEAVY_MODULES)
+    def test_heavy_module_not_imported(self, import_times, module):
+        assert module not in import_times
+
+    def test_within_budget(self, import_times):
+        assert import_times["app"] / 1000 < IMPORT_BUDGET_MS
@@ -0,0 +1,120 @@
+"""Tests: Fitbit data is synced into SQL incrementally and routes read it from there."""
+
+import datetime
+import threading
+
+import src.warehouse
+from app import engine
+from src.warehouse import MAX_RANGE_DAYS, Warehouse
+
+
+class _FakeRetrieve:
+    """Records retrieve_data calls and answers every requested day."""
+
+    def __init__(self, sleep_minutes=(400,)):
+        self.calls = []
+        self.sleep_minutes = sleep_minutes
+        self._lock = threading.Lock()
+
+    def __call__(self, data_type, user_id, access_token, date, period="", detail="", version=1):
+        with self._lock:
+            self.calls.append((data_type, str(date), str(period), detail))
+        try:
+            end = datetime.date.fromisoformat(str(period))
+        except ValueError:
+            end = datetime.date.fromisoformat(str(date))
+        start = datetime.date.fromisoformat(str(date))
+        days = [str(start + datetime.timedelta(days=i)) for i in range((end - start).days + 1)]
+        if data_type == "sleep":
+            return {"sleep": [{"logId": f"{d}-{i}", "dateOfSleep": d, "minutesAsleep": m}
+                              for d in days for i, m in enumerate(self.sleep_minutes)]}
+        if detail:
+            return {f"activities-{data_type}-intraday": {"dataset": [{"time": "08:00:00", "value": 90}]}}
+        if data_type == "heart":
+            return {"activities-heart": [{"dateTime": d, "value": {"restingHeartRate": 60}} for d in days]}
+        return {"activities-steps": [{"dateTime": d, "value": "5000"} for d in days]}
+
+
+def _sync(retrieve, *windows):
+    Warehouse(engine).sync("U1", "T", list(windows), retrieve=retrieve)
+
+
+class TestIncrementalSync:
+    """Only days that are missing or may still change are requested."""
+
+    def test_finalized_days_synced_once(self, app):
+        retrieve = _FakeRetrieve()
+        _sync(retrieve, ("steps", "2025-01-01", "2025-01-07"))
+        _sync(retrieve, ("steps", "2025-01-01", "2025-01-07"))
+        assert retrieve.calls == [("steps", "2025-01-01", "2025-01-07", "")]
+        assert Warehouse(engine).daily_steps("U1", "2025-01-01", "2025-01-07").Steps.tolist() == [5000] * 7
+
+    def test_only_new_days_requested(self, app):
+        retrieve = _FakeRetrieve()
+        _sync(retrieve, ("steps", "2025-01-01", "2025-01-07"))
+        _sync(retrieve, ("steps", "2025-01-05", "2025-01-10"))
+        assert retrieve.calls[-1] == ("steps", "2025-01-08", "2025-01-10", "")
+
+    def test_today_resynced_when_stale(self, app, monkeypatch):
+        retrieve = _FakeRetrieve()
+        today = datetime.date.today()
+        _sync(retrieve, ("heart", today, today))
+        _sync(retrieve, ("heart", today, today))
+        assert len(retrieve.calls) == 1
+        monkeypatch.setattr(src.warehouse, "FITBIT_CACHE_TTL", -1)
+        _sync(retrieve, ("heart", today, today))
+        assert len(retrieve.calls) == 2
+
+    def test_overlapping_windows_merged(self, app):
+        """Today and the week ending today are one request, not two."""
+        retrieve = _FakeRetrieve()
+        today = datetime.date.today()
+        week_start = today - datetime.timedelta(days=6)
+        _sync(retrieve, ("steps", today, today), ("steps", week_start, today))
+        assert retrieve.calls == [("steps", str(week_start), str(today), "")]
+
+    def test_long_gap_split_into_ranges(self, app):
+        retrieve = _FakeRetrieve()
+        _sync(retrieve, ("sleep", "2024-01-01", "2024-12-31"))
+        assert len(retrieve.calls) == -(-366 // MAX_RANGE_DAYS)
+
+    def test_intraday_requested_per_day(self, app):
+        retrieve = _FakeRetrieve()
+        _sync(retrieve, ("heart-intraday", "2025-01-14", "2025-01-15"))
+        assert [c[3] for c in retrieve.calls] == ["1min", "1min"]
+        assert Warehouse(engine).intraday("U1", "heart", "2025-01-15").value.tolist() == [90]
+
+
+class TestSleepSessions:
+    """Sleep logs are replaced per synced range and summed per night."""
+
+    def test_nights_summed(self, app):
+        _sync(_FakeRetrieve(sleep_minutes=(400, 30)), ("sleep", "2025-01-01", "2025-01-02"))
+        df = Warehouse(engine).sleep_minutes("U1", "2025-01-01", "2025-01-02")
+        assert df["Minutes Asleep"].tolist() == [430, 430]
+
+    def test_resync_drops_deleted_logs(self, app, monkeypatch):
+        today = datetime.date.today()
+        _sync(_FakeRetrieve(sleep_minutes=(400, 30)), ("sleep", today, today))
+        monkeypatch.setattr(src.warehouse, "FITBIT_CACHE_TTL", -1)
+        _sync(_FakeRetrieve(sleep_minutes=(400,)), ("sleep", today, today))
+        assert Warehouse(engine).sleep_minutes("U1", today, today)["Minutes Asleep"].tolist() == [400]
+
+
+class TestRoutesReadWarehouse:
+    """Dashboards are served from the warehouse once it is synced."""
+
+    def test_repeat_view_makes_no_api_calls(self, fitbit_client, mock_fitbit_api):
+        fitbit_client.get("/?date=2025-01-15", follow_redirects=True)
+        calls = len(mock_fitbit_api)
+        resp = fitbit_client.get("/?date=2025-01-15", follow_redirects=True)
+        assert resp.status_code == 200
+        assert len(mock_fitbit_api) == calls
+
+    def test_overlapping_week_fetches_only_new_days(self, fitbit_client, mock_fitbit_api):
+        fitbit_client.get("/heart-rate?date=2025-01-15", follow_redirects=True)
+        mock_fitbit_api.clear()
+        fitbit_client.get("/heart-rate?date=2025-01-17", follow_redirects=True)
+        week_urls = [u for u in mock_fitbit_api if "1min" not in u]
+        assert len(week_urls) == 1
+        assert "/date/2025-01-16/2025-01-17" in week_urls[0]